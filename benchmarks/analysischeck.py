@@ -0,0 +1,188 @@
+"""
+Check of the analyses of analysis.py and of their invalidation
+every function of generated programs (see progen.py) goes through the ssa and tac passes of a pipeline as in
+PassManager.lower, with every analysis computed before each pass. After the pass, what the AnalysisManager
+kept must be what the analyses give when computed again, and postdominators, loops and reaching-defs must
+agree with their definitions, checked path by path on the graph.
+
+    python -m benchmarks.analysischeck
+    python -m benchmarks.analysischeck -n 50 -O 1
+"""
+import argparse
+import sys
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.analysis import ANALYSES, CFG_ANALYSES, NO_ANALYSES, AnalysisManager
+from minidecaf.compiler import Compiler
+from minidecaf.passes import PassManager
+from minidecaf.ssa import from_ssa, to_ssa
+from minidecaf.tac import lower
+
+
+def facts(name: str, result):
+    """
+    :return: what result says, in terms of block labels, to compare results computed apart
+    """
+    if name == "rpo":
+        return [block.label for block in result]
+    if name == "dominators":
+        return {block.label: result.idom[block].label for block in result.order}
+    if name == "frontiers":
+        return {block.label: [f.label for f in frontier] for block, frontier in result.items()}
+    if name == "postdominators":
+        return {block.label: ipdom.label for block, ipdom in result.ipdom.items()}
+    if name == "loops":
+        return [(loop.header.label, sorted(block.label for block in loop.blocks), loop.depth)
+                for loop in result.loops]
+    if name == "liveness":
+        return ({block.label: live for block, live in result.liveIn.items()},
+                {block.label: live for block, live in result.liveOut.items()})
+    return {block.label: sorted(map(id, result.reaching(block))) for block in result.reachIn}
+
+
+def reach(starts, succs, removed=None):
+    """
+    :return: the blocks reachable from starts without going through removed
+    """
+    seen = set()
+    work = [block for block in starts if block is not removed]
+    while work:
+        block = work.pop()
+        if block not in seen:
+            seen.add(block)
+            work.extend(succ for succ in succs(block) if succ is not removed)
+    return seen
+
+
+def check_postdominators(func, pdt):
+    returning = {block for block in func.blocks if not block.succs}
+    exiting = reach(returning, lambda block: block.preds)
+    if set(pdt.ipdom) != exiting:
+        return "postdominators: not the blocks a path returns from"
+    for b in exiting:
+        for a in func.blocks:
+            # a postdominates b iff no path from b returns without going through a
+            expected = a is b or not reach([b], lambda block: block.succs, a) & returning
+            if pdt.postdominates(a, b) != expected:
+                return f"postdominators: {a.label} postdominates {b.label} is {not expected}"
+    return None
+
+
+def check_loops(func, info):
+    entry = func.blocks[0]
+    reachable = reach([entry], lambda block: block.succs)
+
+    def dominates(a, b):
+        return a is b or a is entry or b not in reach([entry], lambda block: block.succs, a)
+
+    loops = {}
+    for block in reachable:
+        for succ in block.succs:
+            if dominates(succ, block):
+                body = loops.setdefault(succ, {succ})
+                body |= reach([block], lambda member: [p for p in member.preds if p in reachable], succ)
+    expected = {header.label: sorted(block.label for block in body) for header, body in loops.items()}
+    if {loop.header.label: sorted(block.label for block in loop.blocks) for loop in info.loops} != expected:
+        return "loops: not the natural loops of the back edges"
+    for block in reachable:
+        depth = sum(block in body for body in loops.values())
+        if info.depth(block) != depth:
+            return f"loops: {block.label} has depth {info.depth(block)}, expected {depth}"
+    return None
+
+
+def check_reaching_defs(func, rd):
+    expected = {block: set() for block in rd.reachIn}
+    for block in rd.reachIn:
+        for i, instr in enumerate(block.instrs):
+            reg = instr.dst
+            if reg is None or any(later.dst == reg for later in block.instrs[i + 1:]):
+                continue
+            # on to every block entered before reg is defined again
+            seen = set()
+            work = list(block.succs)
+            while work:
+                succ = work.pop()
+                if succ in seen:
+                    continue
+                seen.add(succ)
+                expected[succ].add(id(instr))
+                if all(other.dst != reg for other in succ.instrs):
+                    work.extend(succ.succs)
+    for block, defs in expected.items():
+        if set(map(id, rd.reaching(block))) != defs:
+            return f"reaching-defs: wrong definitions reaching {block.label}"
+    return None
+
+
+CHECKS = {"postdominators": check_postdominators, "loops": check_loops, "reaching-defs": check_reaching_defs}
+
+
+def check_state(func, analyses: AnalysisManager, after: str):
+    """
+    :return: None if the kept analyses are right, otherwise a description of what is wrong
+    """
+    for name, result in list(analyses.results.items()):
+        if facts(name, result) != facts(name, ANALYSES[name](func, AnalysisManager(func))):
+            return f"{name} kept after {after} is stale"
+    for name, check in CHECKS.items():
+        problem = check(func, analyses.get(name))
+        if problem is not None:
+            return f"after {after}, {problem}"
+    for name in ANALYSES:
+        analyses.get(name)  # so that the next pass has all of them to keep or drop
+    return None
+
+
+def check_function(passes: PassManager, func):
+    """
+    :return: None if the analyses are right all along, otherwise a description of what is wrong
+    """
+    tac_func = lower(passes.run_ir(func))
+    if tac_func is None:
+        return None
+    analyses = AnalysisManager(tac_func)
+    problem = check_state(tac_func, analyses, "lower")
+    if problem is not None:
+        return problem
+    steps = ["to_ssa"] + passes.passes["ssa"] + ["from_ssa"] + passes.passes["tac"]
+    for step in steps:
+        if step == "to_ssa":
+            to_ssa(tac_func, analyses)
+            analyses.invalidate(CFG_ANALYSES)
+        elif step == "from_ssa":
+            from_ssa(tac_func)
+            analyses.invalidate(NO_ANALYSES)
+        else:
+            analyses.invalidate(step.run(tac_func, analyses))
+        problem = check_state(tac_func, analyses, step if isinstance(step, str) else step.name)
+        if problem is not None:
+            return problem
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check the analyses and what the passes say they preserve")
+    parser.add_argument("-n", "--programs", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first program")
+    parser.add_argument("-O", type=int, choices=[1, 2], default=2, dest="opt_level")
+    parser.add_argument("--funcs", type=int, default=3)
+    parser.add_argument("--stmts", type=int, default=6)
+    args = parser.parse_args()
+    compiler = Compiler()
+    passes = PassManager.for_level(args.opt_level)
+    functions = failures = 0
+    for seed in range(args.seed, args.seed + args.programs):
+        src = ProgramGenerator(funcs=args.funcs, stmts=args.stmts, seed=seed).generate()
+        for func in compiler.compile_to_ir(src).funcs:
+            functions += 1
+            problem = check_function(passes, func)
+            if problem is not None:
+                failures += 1
+                print(f"seed {seed}, {func.name}: {problem}")
+    print(f"{functions} functions, {failures} failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Generated code benchmark
+compiles a fixed set of generated programs (see progen.py), runs them on the RV32IM simulator and
+prints the exit code and the dynamic instruction, load and store counts of each. The counts do not
+depend on the machine, so a baseline can be compared exactly, e.g. in CI:
+
+    python -m benchmarks.bench_code --save-baseline     # before an optimization
+    python -m benchmarks.bench_code --compare           # after: exit 1 if a count grew or an exit code changed
+    python -m benchmarks.bench_code -O2 --compare       # what the -O2 pipeline (see passes.py) saves over -O0
+"""
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.compiler import Compiler
+from minidecaf.passes import PassManager
+from minidecaf.rvsim import run_asm
+
+PROGRAMS = {  # name -> generator axes
+    "small": {"funcs": 2, "stmts": 6},
+    "default": {},
+    "calls": {"funcs": 8, "stmts": 6, "nesting": 1},
+    "loops": {"funcs": 2, "stmts": 6, "nesting": 3},
+    "exprs": {"funcs": 2, "stmts": 6, "expr_depth": 5},
+    "arrays": {"funcs": 2, "stmts": 8, "array_size": 32},
+}
+COUNTS = ["instructions", "loads", "stores"]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_baseline.json")
+
+
+def run_programs(seeds, opt_level=0):
+    """
+    :return: "name/seed" -> {"exit_code", "instructions", "loads", "stores"}
+    """
+    compiler = Compiler(passes=PassManager.for_level(opt_level) if opt_level else None)
+    results = {}
+    for name, axes in PROGRAMS.items():
+        for seed in range(seeds):
+            result = run_asm(compiler.compile_string(ProgramGenerator(seed=seed, **axes).generate()))
+            results[f"{name}/{seed}"] = {"exit_code": result.exit_code, "instructions": result.instructions,
+                                         "loads": result.loads, "stores": result.stores}
+    return results
+
+
+def print_results(results, out=sys.stdout):
+    print(f"{'program':<16}{'exit':>6}" + "".join(f"{c:>16}" for c in COUNTS), file=out)
+    for name, r in results.items():
+        print(f"{name:<16}{r['exit_code']:>6}" + "".join(f"{r[c]:>16}" for c in COUNTS), file=out)
+    print(f"{'total':<16}{'':>6}" + "".join(f"{sum(r[c] for r in results.values()):>16}" for c in COUNTS),
+          file=out)
+
+
+def compare(results, baseline, out=sys.stdout):
+    """
+    :return: number of programs that got worse or compute something else than in the baseline
+    """
+    bad = 0
+    for name, r in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if r["exit_code"] != old["exit_code"]:
+            bad += 1
+            print(f"WRONG {name}: exit code {old['exit_code']} -> {r['exit_code']}", file=out)
+        changes = [f"{c} {old[c]} -> {r[c]} ({(r[c] / old[c] - 1) * 100:+.1f}%)"
+                   for c in COUNTS if r[c] != old[c] and old[c]]
+        if any(r[c] > old[c] for c in COUNTS):
+            bad += 1
+            print(f"WORSE {name}: " + ", ".join(changes), file=out)
+        elif changes:
+            print(f"better {name}: " + ", ".join(changes), file=out)
+    totals = [(sum(baseline[n][c] for n in results if n in baseline),
+               sum(results[n][c] for n in results if n in baseline)) for c in COUNTS]
+    print("total: " + ", ".join(f"{c} {old} -> {new}" for c, (old, new) in zip(COUNTS, totals)), file=out)
+    return bad
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="dynamic instruction counts of the generated code")
+    parser.add_argument("--seeds", type=int, default=3, help="programs per generator setting")
+    parser.add_argument("-O", type=int, choices=[0, 1, 2], default=0, dest="opt_level", metavar="LEVEL",
+                        help="compile with this optimization level")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="FILE",
+                        help=f"store the counts (default: {DEFAULT_BASELINE})")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="FILE",
+                        help="compare the counts against a stored baseline, exit 1 if a program got worse")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = run_programs(args.seeds, args.opt_level)
+    print_results(results)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Compiler throughput benchmark
+compiles generated programs (see progen.py) of growing size along one axis at a time, times every phase
+and prints a scaling table per axis. Below each table are the log-log slopes of the source size and of every
+phase time against the axis value: a phase whose slope is well above the one of the source size grows
+super-linearly in the size of its input and is flagged.
+
+    python -m benchmarks.bench_compile                      # all axes
+    python -m benchmarks.bench_compile --axis nesting -r 5
+    python -m benchmarks.bench_compile --save-baseline      # remember the timings of this machine
+    python -m benchmarks.bench_compile --compare            # exit 1 on a regression against them
+"""
+import argparse
+import io
+import json
+import math
+import os
+import sys
+
+import antlr4
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.instrument import Instrument
+from minidecaf.main import compile_ir, gen_asm
+from minidecaf.startup import use_parser_cache
+
+PHASES = ["lex", "parse", "lower", "name_parse", "check_type", "gen_ir", "gen_asm"]
+BASE = {"funcs": 2, "stmts": 4, "expr_depth": 2, "nesting": 1, "array_size": 4, "globals": 2}
+AXES = {
+    "funcs": [1, 2, 4, 8, 16],
+    "stmts": [4, 8, 16, 32, 64],
+    "expr_depth": [1, 2, 3, 4, 5],
+    "nesting": [1, 2, 4, 8, 16],
+    "array_size": [4, 16, 64, 256, 1024],
+    "globals": [2, 8, 32, 128, 512],
+}
+SUPER_LINEAR = 0.25  # a phase is flagged when its slope exceeds the one of the source size by this much
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def time_phases(src: str, repeat: int):
+    """
+    compile src repeat times
+
+    :return: phase -> best wall time in seconds
+    """
+    best = {}
+    for _ in range(repeat):
+        instrument = Instrument()
+        ir = compile_ir(antlr4.InputStream(src), instrument)
+        with instrument.phase("gen_asm"):
+            gen_asm(ir, io.StringIO(), instrument)
+        for record in instrument.records:
+            if record["function"] is None and record["phase"] in PHASES:
+                best[record["phase"]] = min(best.get(record["phase"], math.inf), record["wall"])
+    return best
+
+
+def slope(xs, ys):
+    """
+    least squares slope of log(ys) against log(xs)
+    """
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len(points) < 2:
+        return float("nan")
+    mx = sum(x for x, _ in points) / len(points)
+    my = sum(y for _, y in points) / len(points)
+    var = sum((x - mx) ** 2 for x, _ in points)
+    if var == 0:
+        return float("nan")
+    return sum((x - mx) * (y - my) for x, y in points) / var
+
+
+def bench_axis(axis: str, values, repeat: int, seed: int):
+    """
+    :return: one dict per value: value, bytes, phases (phase -> seconds)
+    """
+    rows = []
+    for value in values:
+        src = ProgramGenerator(seed=seed, **dict(BASE, **{axis: value})).generate()
+        rows.append({"value": value, "bytes": len(src), "phases": time_phases(src, repeat)})
+    return rows
+
+
+def print_axis(axis: str, rows, out=sys.stdout):
+    print(f"== {axis}", file=out)
+    print(f"{axis:>12}{'bytes':>9}" + "".join(f"{p:>12}" for p in PHASES) + f"{'total':>12}", file=out)
+    for row in rows:
+        times = [row["phases"].get(p, 0) for p in PHASES]
+        print(f"{row['value']:>12}{row['bytes']:>9}" + "".join(f"{t * 1000:>12.2f}" for t in times) +
+              f"{sum(times) * 1000:>12.2f}", file=out)
+    values = [row["value"] for row in rows]
+    size_slope = slope(values, [row["bytes"] for row in rows])
+    slopes = [slope(values, [row["phases"].get(p, 0) for row in rows]) for p in PHASES]
+    slopes.append(slope(values, [sum(row["phases"].values()) for row in rows]))
+    print(f"{'slope':>12}{size_slope:>9.2f}" + "".join(f"{s:>12.2f}" for s in slopes), file=out)
+    flagged = [p for p, s in zip(PHASES, slopes) if s > size_slope + SUPER_LINEAR]
+    if flagged:
+        print(f"super-linear in {axis}: {', '.join(flagged)}", file=out)
+    print(file=out)
+
+
+def compare(results, baseline, threshold: float, out=sys.stdout):
+    """
+    report every phase of every point that got slower than the baseline by more than threshold
+
+    :return: number of regressions
+    """
+    regressions = 0
+    for axis, rows in results.items():
+        old_rows = {row["value"]: row for row in baseline.get(axis, [])}
+        for row in rows:
+            old = old_rows.get(row["value"])
+            if old is None or old["bytes"] != row["bytes"]:
+                continue  # the generator changed, the programs are not comparable
+            for phase, new_t in row["phases"].items():
+                old_t = old["phases"].get(phase)
+                if old_t is None or new_t - old_t < 0.001:  # ignore sub-millisecond noise
+                    continue
+                if new_t > old_t * (1 + threshold):
+                    regressions += 1
+                    print(f"REGRESSION {axis}={row['value']} {phase}: "
+                          f"{old_t * 1000:.2f} ms -> {new_t * 1000:.2f} ms (+{(new_t / old_t - 1) * 100:.0f}%)",
+                          file=out)
+    print(f"{regressions} regression(s) against the baseline", file=out)
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MiniDecaf compiler throughput benchmark")
+    parser.add_argument("--axis", action="append", choices=list(AXES),
+                        help="axis to scale, can be repeated (default: all)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="compilations per point, the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="only the first three points of every axis")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="FILE",
+                        help=f"store the results (default: {DEFAULT_BASELINE})")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="FILE",
+                        help="compare the results against a stored baseline, exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown reported as a regression (default: 0.25)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    use_parser_cache(None)  # every run starts from the same cold parser
+    time_phases(ProgramGenerator(seed=args.seed, **BASE).generate(), 1)  # warm up imports and the DFA
+    results = {}
+    for axis in args.axis or list(AXES):
+        values = AXES[axis][:3] if args.quick else AXES[axis]
+        results[axis] = bench_axis(axis, values, args.repeat, args.seed)
+        print_axis(axis, results[axis])
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Incremental compilation benchmark
+compiles a generated program (see progen.py) once with --incremental to fill the store, then makes one edit
+to it and compiles it again, for a few kinds of edit, and prints the time of the incremental build next to
+the one of a clean build, together with how many functions were reused, rebased and generated (see
+incremental.py). The output of every incremental build is checked to be the same as the one of the clean build.
+
+    python -m benchmarks.bench_incremental
+    python -m benchmarks.bench_incremental --funcs 400 --frontend antlr
+"""
+import argparse
+import math
+import sys
+import tempfile
+import time
+
+import antlr4
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.cache import CompileCache
+from minidecaf.incremental import compile_incremental, incremental_counters
+from minidecaf.main import FRONTENDS, compile_ir, render_asm
+
+
+def edit_none(src: str, func: str):
+    return src
+
+
+def edit_body(src: str, func: str):
+    """
+    add an if to the body of func, which moves the labels of every function after it
+    """
+    lines = src.split("\n")
+    at = next(i for i, line in enumerate(lines) if line.startswith(f"int {func}("))
+    lines.insert(at + 2, "    if (acc) acc = acc + 1;")
+    return "\n".join(lines)
+
+
+def edit_global(src: str, func: str):
+    """
+    add a global before func, which every function after it may depend on
+    """
+    at = src.index(f"\nint {func}(") + 1
+    return f"{src[:at]}int gnew = 1;\n{src[at:]}"
+
+
+EDITS = {"none": edit_none, "body": edit_body, "global": edit_global}
+
+
+def clean_build(src: str, frontend: str):
+    return render_asm(compile_ir(antlr4.InputStream(src), frontend=frontend))
+
+
+def best_of(build, repeat: int):
+    """
+    :return: (best seconds, the output of the last run)
+    """
+    best, text = math.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = build()
+        best = min(best, time.perf_counter() - start)
+    return best, text
+
+
+def bench(funcs: int, frontend: str, repeat: int, seed: int, out=sys.stdout):
+    """
+    :return: number of edits whose incremental build differs from the clean one
+    """
+    src = ProgramGenerator(funcs=funcs, seed=seed).generate()
+    func = f"f{funcs // 2}"  # the edits go to the middle of the program
+    print(f"{funcs} functions, {len(src) // 1024} KiB, edits in {func}", file=out)
+    print(f"{'edit':>8}{'clean ms':>10}{'incr ms':>10}{'speedup':>9}{'reused':>8}{'rebased':>9}{'generated':>11}",
+          file=out)
+    mismatches = 0
+    for name, edit in EDITS.items():
+        edited = edit(src, func)
+        clean_seconds, expected = best_of(lambda: clean_build(edited, frontend), repeat)
+        seconds = math.inf
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as store_dir:
+                store = CompileCache(store_dir)
+                compile_incremental(src, store, frontend=frontend)
+                incremental_counters.update(dict.fromkeys(incremental_counters, 0))
+                start = time.perf_counter()
+                text = compile_incremental(edited, store, frontend=frontend)
+                seconds = min(seconds, time.perf_counter() - start)
+        if text != expected:
+            mismatches += 1
+            print(f"MISMATCH: the incremental build after the {name} edit differs from the clean one", file=out)
+        counts = incremental_counters
+        print(f"{name:>8}{clean_seconds * 1000:>10.1f}{seconds * 1000:>10.1f}{clean_seconds / seconds:>8.2f}x"
+              f"{counts['reused']:>8}{counts['rebased']:>9}{counts['generated']:>11}", file=out)
+    return mismatches
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MiniDecaf incremental compilation benchmark")
+    parser.add_argument("--funcs", type=int, default=200, help="functions of the generated program")
+    parser.add_argument("--frontend", choices=FRONTENDS, default="fast")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs per edit, the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if bench(args.funcs, args.frontend, args.repeat, args.seed):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
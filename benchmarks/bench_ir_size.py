@@ -0,0 +1,83 @@
+"""
+IR size benchmark
+compiles generated programs (see progen.py) of growing size to IR, once with the instructions of every
+function as a list of IRStr instances and once packed (see ircode.py), and prints the memory the IR keeps per
+instruction in both forms, measured with tracemalloc, next to the time render_asm takes on it. The assembly
+of both forms is checked to be the same.
+
+    python -m benchmarks.bench_ir_size
+    python -m benchmarks.bench_ir_size --funcs 50 100 200 --stmts 40
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+import antlr4
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.main import compile_ir, render_asm
+
+
+def retained(src: str, compact: bool):
+    """
+    :return: (the IRContainer of src, the bytes still allocated once it is built)
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        ir = compile_ir(antlr4.InputStream(src), frontend="fast", compact_ir=compact)
+        gc.collect()
+        return ir, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def render_time(ir, repeat: int):
+    """
+    :return: (best seconds, the assembly)
+    """
+    best, asm = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        asm = render_asm(ir)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, asm
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MiniDecaf IR size benchmark")
+    parser.add_argument("--funcs", type=int, nargs="+", default=[10, 40, 160])
+    parser.add_argument("--stmts", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs of render_asm, the best is kept")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print(f"{'funcs':>8}{'instrs':>10}{'list B/instr':>14}{'packed B/instr':>16}{'ratio':>8}"
+          f"{'list asm ms':>13}{'packed asm ms':>15}")
+    retained(ProgramGenerator(funcs=1, stmts=1).generate(), True)  # the imports are not counted
+    failed = False
+    for funcs in args.funcs:
+        src = ProgramGenerator(funcs=funcs, stmts=args.stmts, seed=args.seed).generate()
+        listed, listed_bytes = retained(src, False)
+        packed, packed_bytes = retained(src, True)
+        count = sum(len(func.instructions) for func in listed.funcs)
+        listed_time, listed_asm = render_time(listed, args.repeat)
+        packed_time, packed_asm = render_time(packed, args.repeat)
+        if listed_asm != packed_asm:
+            print(f"{funcs} funcs: the assembly of the packed IR differs", file=sys.stderr)
+            failed = True
+        print(f"{funcs:>8}{count:>10}{listed_bytes / count:>14.1f}{packed_bytes / count:>16.1f}"
+              f"{listed_bytes / packed_bytes:>8.1f}{listed_time * 1000:>13.1f}{packed_time * 1000:>15.1f}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
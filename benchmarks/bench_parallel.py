@@ -0,0 +1,87 @@
+"""
+Parallel parsing benchmark
+parses and lowers generated programs (see progen.py) with many functions serially (fastparser.py) and with
+parse_parallel of parallel.py over growing numbers of worker processes, and prints the best time of each and
+the speedup over the serial path. The IR of every parallel parse is checked to be the same as the serial one.
+The workers are started before the timing, as a compile server or batch run would have them already.
+
+    python -m benchmarks.bench_parallel
+    python -m benchmarks.bench_parallel --funcs 2000 --jobs 1 2 4 8
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+from benchmarks.frontcheck import ir_text
+from benchmarks.progen import ProgramGenerator
+from minidecaf.fastparser import fast_parse
+from minidecaf.main import check_type, gen_ir, name_parse
+from minidecaf.parallel import parse_parallel
+from minidecaf.syntax import lower
+
+
+def serial(src: str, jobs: int):
+    return lower(fast_parse(src))
+
+
+def parallel(src: str, jobs: int):
+    return parse_parallel(src, jobs)
+
+
+def best_of(parse, src: str, jobs: int, repeat: int):
+    """
+    :return: (best seconds, the Program of the last run)
+    """
+    best, program = math.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        program = parse(src, jobs)
+        best = min(best, time.perf_counter() - start)
+    return best, program
+
+
+def ir_of(program):
+    name_manager = name_parse(program)
+    return ir_text(gen_ir(program, name_manager, check_type(program, name_manager), release=True))
+
+
+def bench(funcs: int, jobs_list, repeat: int, seed: int, out=sys.stdout):
+    """
+    :return: number of job counts giving a different IR than the serial path
+    """
+    src = ProgramGenerator(funcs=funcs, seed=seed).generate()
+    print(f"{funcs} functions, {len(src) // 1024} KiB, {os.cpu_count()} cpus", file=out)
+    print(f"{'jobs':>6}{'ms':>10}{'speedup':>9}", file=out)
+    serial_seconds, program = best_of(serial, src, 1, repeat)
+    expected = ir_of(program)
+    print(f"{'serial':>6}{serial_seconds * 1000:>10.1f}{1:>8.2f}x", file=out)
+    mismatches = 0
+    for jobs in jobs_list:
+        parse_parallel(src, jobs)  # starts the workers
+        seconds, program = best_of(parallel, src, jobs, repeat)
+        if ir_of(program) != expected:
+            mismatches += 1
+            print(f"MISMATCH: the IR of --parse-jobs {jobs} differs from the serial one", file=out)
+        print(f"{jobs:>6}{seconds * 1000:>10.1f}{serial_seconds / seconds:>8.2f}x", file=out)
+    return mismatches
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MiniDecaf parallel parsing benchmark")
+    parser.add_argument("--funcs", type=int, default=500, help="functions of the generated program")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[2, 4, 8], help="worker counts to try")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs per worker count, the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if bench(args.funcs, args.jobs, args.repeat, args.seed):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Parse throughput benchmark
+parses generated programs (see progen.py) of growing size with every parse mode of my_parser and prints
+the tokens per second, cold (the DFA caches of the parser just thrown away) and warm (the best of the
+following parses), together with how often the sll mode had to fall back to full LL.
+The trees of all the modes are checked to be the same.
+
+    python -m benchmarks.bench_parse
+    python -m benchmarks.bench_parse --expr-depth 4 -r 5
+"""
+import argparse
+import math
+import sys
+import time
+
+import antlr4
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.main import PARSE_MODES, my_lexer, my_parser, parse_counters
+from minidecaf.startup import reset_parser_dfa, use_parser_cache
+
+SIZES = [2, 4, 8, 16, 32]  # functions per program
+
+
+def tokens_of(src: str):
+    token_stream = my_lexer(antlr4.InputStream(src))
+    token_stream.fill()
+    return token_stream
+
+
+def time_parse(src: str, mode: str, repeat: int):
+    """
+    :return: (cold seconds, best warm seconds, fallbacks, tree text)
+    """
+    reset_parser_dfa()
+    fallbacks = parse_counters["ll_fallback"]
+    cold, warm, tree = None, math.inf, None
+    for i in range(repeat + 1):
+        token_stream = tokens_of(src)
+        start = time.perf_counter()
+        tree = my_parser(token_stream, mode)
+        seconds = time.perf_counter() - start
+        if i == 0:
+            cold = seconds
+        else:
+            warm = min(warm, seconds)
+    return cold, warm, parse_counters["ll_fallback"] - fallbacks, tree.toStringTree()
+
+
+def bench(sizes, repeat: int, seed: int, expr_depth: int, out=sys.stdout):
+    """
+    :return: number of programs whose trees differ between the modes
+    """
+    print(f"{'funcs':>6}{'tokens':>8}" + "".join(f"{m + ' cold':>14}{m + ' warm':>14}" for m in PARSE_MODES) +
+          f"{'fallbacks':>11}{'speedup':>9}", file=out)
+    print(f"{'':>14}" + "".join(f"{'tok/s':>14}{'tok/s':>14}" for _ in PARSE_MODES), file=out)
+    mismatches = 0
+    for funcs in sizes:
+        src = ProgramGenerator(funcs=funcs, expr_depth=expr_depth, seed=seed).generate()
+        tokens = len(tokens_of(src).tokens)
+        results = {mode: time_parse(src, mode, repeat) for mode in PARSE_MODES}
+        if len({result[3] for result in results.values()}) != 1:
+            mismatches += 1
+            print(f"MISMATCH: the parse modes build different trees for funcs={funcs}", file=out)
+        line = f"{funcs:>6}{tokens:>8}"
+        for mode in PARSE_MODES:
+            cold, warm, _, _ = results[mode]
+            line += f"{tokens / cold:>14.0f}{tokens / warm:>14.0f}"
+        speedup = results["ll"][1] / results["sll"][1]
+        print(line + f"{results['sll'][2]:>11}{speedup:>8.2f}x", file=out)
+    return mismatches
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MiniDecaf parse throughput benchmark")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="warm parses per program, the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--expr-depth", type=int, default=3, help="expression depth of the generated programs")
+    parser.add_argument("--quick", action="store_true", help="only the first three sizes")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    use_parser_cache(None)
+    if bench(SIZES[:3] if args.quick else SIZES, args.repeat, args.seed, args.expr_depth):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
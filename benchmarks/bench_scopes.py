@@ -0,0 +1,111 @@
+"""
+Scope scaling benchmark
+times name resolution (name_parse, and the fused pass of semantic.py) of the function f of programs with
+thousands of globals and deeply nested compound statements in f, one axis at a time, and prints the log-log
+slope of the time against the axis value next to the one of the size of f. Entering and leaving a scope
+must not depend on the number of visible names, so a slope well above the one of the size is flagged, as
+in bench_compile.
+
+    python -m benchmarks.bench_scopes
+    python -m benchmarks.bench_scopes --axis depth -r 5
+"""
+import argparse
+import math
+import sys
+
+from benchmarks.bench_compile import SUPER_LINEAR, slope
+from minidecaf.fastparser import fast_parse
+from minidecaf.instrument import Instrument
+from minidecaf.main import check_semantics, name_parse
+from minidecaf.syntax import lower
+
+BASE = {"globals": 1000, "depth": 64, "blocks": 16}
+AXES = {
+    "globals": [500, 1000, 2000, 4000, 8000],
+    "depth": [16, 32, 64, 128, 256],
+    "blocks": [4, 8, 16, 32, 64],
+}
+PASSES = {"name_parse": name_parse, "semantic": check_semantics}
+
+
+def scope_program(globals: int, depth: int, blocks: int):
+    """
+    :param globals: number of global variables
+    :param depth: nesting depth of the compound statements of every block
+    :param blocks: number of nests of compound statements in f
+    :return: the source
+    """
+    lines = [f"int g{i};" for i in range(globals)]
+    lines.append("int f(int p) {")
+    lines.append("int s = p;")
+    for block in range(blocks):
+        for level in range(depth):
+            g = (block * depth + level) % globals
+            lines.append(f"{{ int v{level} = s + g{g}; s = v{level};")
+        lines.append("}" * depth)
+    lines.append("return s;")
+    lines.append("}")
+    lines.append("int main() { return f(1); }")
+    return "\n".join(lines) + "\n"
+
+
+def time_passes(src: str, repeat: int):
+    """
+    :return: pass -> best seconds spent in f
+    """
+    program = lower(fast_parse(src))
+    best = {}
+    for name, run in PASSES.items():
+        for _ in range(repeat):
+            instrument = Instrument()
+            run(program, instrument)
+            seconds = sum(r["wall"] for r in instrument.records if r["function"] == "f")
+            best[name] = min(best.get(name, math.inf), seconds)
+    return best
+
+
+def bench_axis(axis: str, values, repeat: int, out=sys.stdout):
+    """
+    :return: number of passes flagged as super-linear
+    """
+    print(f"== {axis}", file=out)
+    print(f"{axis:>12}{'f bytes':>10}" + "".join(f"{name + ' ms':>16}" for name in PASSES), file=out)
+    sizes, times = [], {name: [] for name in PASSES}
+    for value in values:
+        src = scope_program(**dict(BASE, **{axis: value}))
+        size = len(src) - src.index("int f(")
+        best = time_passes(src, repeat)
+        sizes.append(size)
+        for name in PASSES:
+            times[name].append(best[name])
+        print(f"{value:>12}{size:>10}" + "".join(f"{best[name] * 1000:>16.2f}" for name in PASSES), file=out)
+    size_slope = slope(values, sizes)
+    slopes = {name: slope(values, times[name]) for name in PASSES}
+    print(f"{'slope':>12}{size_slope:>10.2f}" + "".join(f"{slopes[name]:>16.2f}" for name in PASSES), file=out)
+    flagged = [name for name in PASSES if slopes[name] > size_slope + SUPER_LINEAR]
+    if flagged:
+        print(f"super-linear in {axis}: {', '.join(flagged)}", file=out)
+    print(file=out)
+    return len(flagged)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MiniDecaf scope scaling benchmark")
+    parser.add_argument("--axis", action="append", choices=list(AXES),
+                        help="axis to scale, can be repeated (default: all)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs per point, the best is kept")
+    parser.add_argument("--quick", action="store_true", help="only the first three points of every axis")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    flagged = 0
+    for axis in args.axis or list(AXES):
+        flagged += bench_axis(axis, AXES[axis][:3] if args.quick else AXES[axis], args.repeat)
+    if flagged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
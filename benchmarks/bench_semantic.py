@@ -0,0 +1,105 @@
+"""
+Semantic pass benchmark
+runs name_parse + check_type (--semantic=split) and the fused pass of semantic.py (--semantic=fused) on
+generated programs (see progen.py) of growing size and prints the best time of each and the time the fused
+pass saves. The FuncInfo and TypeInfo of both are checked to be the same.
+
+    python -m benchmarks.bench_semantic
+    python -m benchmarks.bench_semantic --expr-depth 4 -r 5
+"""
+import argparse
+import math
+import sys
+import time
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.IRStr import BaseIRStr
+from minidecaf.fastparser import fast_parse
+from minidecaf.main import check_semantics, check_type, name_parse
+from minidecaf.syntax import lower
+
+SIZES = [2, 4, 8, 16, 32]  # functions per program
+
+
+def split(program):
+    name_manager = name_parse(program)
+    return name_manager, check_type(program, name_manager)
+
+
+def fused(program):
+    return check_semantics(program)
+
+
+def summary(name_manager, type_info):
+    """
+    everything the later passes get from name_manager and type_info, comparable with ==
+    the nodes are given by their nid (see syntax.py), the nodes in the locations are kept as they are, the
+    results compared are of the same tree
+    """
+    def ty(t):
+        return type(t).__name__, str(t)
+
+    def loc(steps):
+        return [str(step) if isinstance(step, BaseIRStr) else step for step in steps]
+
+    return {
+        "functions": {name: (info.term2Var.items(), info.blockSlots.items())
+                      for name, info in name_manager.nameManager.items()},
+        "params": {name: info.vars for name, info in name_manager.paramInfos.items()},
+        "globals": {var: (info.size, info.init) for var, info in name_manager.globInfos.items()},
+        "types": {name: [(nid, ty(t)) for nid, t in types.items()] for name, (types, _) in type_info.tables.items()},
+        "locs": {name: [(nid, loc(steps)) for nid, steps in locs.items()]
+                 for name, (_, locs) in type_info.tables.items()},
+        "funcTypes": {name: (ty(info.retTy), [ty(t) for t in info.paramTy]) for name, info in type_info.funcs.items()},
+    }
+
+
+def best_of(run, program, repeat: int):
+    """
+    :return: (best seconds, the result of the last run)
+    """
+    best, result = math.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run(program)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench(sizes, repeat: int, seed: int, expr_depth: int, out=sys.stdout):
+    """
+    :return: number of programs the two modes give different results for
+    """
+    print(f"{'funcs':>6}{'nodes':>9}{'split ms':>11}{'fused ms':>11}{'saved':>8}", file=out)
+    mismatches = 0
+    for funcs in sizes:
+        src = ProgramGenerator(funcs=funcs, expr_depth=expr_depth, seed=seed).generate()
+        program = lower(fast_parse(src))
+        split_seconds, split_result = best_of(split, program, repeat)
+        fused_seconds, fused_result = best_of(fused, program, repeat)
+        if summary(*split_result) != summary(*fused_result):
+            mismatches += 1
+            print(f"MISMATCH: the semantic modes give different results for funcs={funcs}", file=out)
+        nodes = sum(len(types) for types, _ in split_result[1].tables.values())
+        print(f"{funcs:>6}{nodes:>9}{split_seconds * 1000:>11.2f}{fused_seconds * 1000:>11.2f}"
+              f"{1 - fused_seconds / split_seconds:>8.0%}", file=out)
+    return mismatches
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MiniDecaf split vs fused semantic pass benchmark")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs per program and mode, the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--expr-depth", type=int, default=3, help="expression depth of the generated programs")
+    parser.add_argument("--quick", action="store_true", help="only the first three sizes")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if bench(SIZES[:3] if args.quick else SIZES, args.repeat, args.seed, args.expr_depth):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Check of the keys of the compile cache (see cache.py and main.cached_main)
+generated programs (see progen.py) are compiled with several sets of options, each without the cache, then
+twice over through one cache dir shared by all of them; every cached output must be the uncached output of
+its own options, so two sets of options giving different output must never share an entry.
+
+    python -m benchmarks.cachecheck
+    python -m benchmarks.cachecheck -n 20 --seed 100
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.main import parse_args, run
+
+VARIANTS = [
+    [], ["-O1"], ["-O2"], ["--ssa"], ["-O1", "--ssa"],
+    ["-ir"], ["-ir", "--ssa"], ["-O1", "-ir"], ["-O1", "-ir", "--ssa"], ["-O2", "-ir", "--ssa"],
+    ["--frontend", "fast"], ["--semantic", "fused"], ["--parse-mode", "ll"],
+]
+
+
+def compile_with(options):
+    """
+    :return: what the command line of options prints
+    """
+    argv = sys.argv
+    sys.argv = ["minidecaf", "--no-parser-cache"] + options
+    try:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            run(parse_args())
+        return out.getvalue()
+    finally:
+        sys.argv = argv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check that the cache keeps apart the outputs of other options")
+    parser.add_argument("-n", "--programs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first program")
+    args = parser.parse_args()
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for seed in range(args.seed, args.seed + args.programs):
+            src = os.path.join(tmp, f"p{seed}.c")
+            with open(src, 'w') as f:
+                f.write(ProgramGenerator(funcs=2, stmts=5, seed=seed).generate())
+            expected = [compile_with(options + [src]) for options in VARIANTS]
+            cache_dir = os.path.join(tmp, f"cache{seed}")
+            for nth in ["first", "second"]:
+                for options, want in zip(VARIANTS, expected):
+                    if compile_with(["--cache-dir", cache_dir] + options + [src]) != want:
+                        failures += 1
+                        print(f"seed {seed}: {' '.join(options) or 'no options'} on the {nth} run through the cache differs")
+    print(f"{args.programs} programs, {len(VARIANTS)} sets of options, {failures} failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Differential testing on generated programs
+every program (see progen.py) is compiled once, then its IR is run by the IR evaluator (irexec.py) and
+its assembly by the RV32IM simulator (rvsim.py); the two must return the same value. With --ssa the
+assembly generated through SSA form (see ssa.py) is run as well, and with -O the assembly of that
+optimization pipeline (see passes.py).
+
+    python -m benchmarks.difftest -n 500 --seed 1000
+    python -m benchmarks.difftest -n 200 --ssa -O1 -O2
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.compiler import Compiler
+from minidecaf.irexec import IRMachine
+from minidecaf.main import render_asm
+from minidecaf.passes import PassManager
+from minidecaf.rvsim import run_asm
+
+
+def check(compiler: Compiler, src: str, asm: bool, pipelines=None):
+    """
+    :param pipelines: name -> PassManager, whose assembly is run as well
+    :return: None if every run agrees, otherwise a description of the difference
+    """
+    ir = compiler.compile_to_ir(src)
+    expected = IRMachine(ir).run()
+    if asm:
+        got = run_asm(render_asm(ir)).exit_code
+        if got != expected:
+            return f"ir returns {expected}, asm returns {got}"
+    for name, passes in (pipelines or {}).items():
+        got = run_asm(render_asm(ir, passes)).exit_code
+        if got != expected:
+            return f"ir returns {expected}, asm {name} returns {got}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="differential testing of the IR against the assembly")
+    parser.add_argument("-n", "--programs", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first program")
+    parser.add_argument("--no-asm", action="store_true", help="only run the IR (to time the evaluator)")
+    parser.add_argument("--ssa", action="store_true", help="also run the assembly generated through SSA form")
+    parser.add_argument("-O", type=int, choices=[1, 2], action="append", default=[], dest="opt_levels",
+                        metavar="LEVEL", help="also run the assembly of this -O level, can be given more than once")
+    parser.add_argument("--funcs", type=int, default=3)
+    parser.add_argument("--stmts", type=int, default=6)
+    args = parser.parse_args()
+    compiler = Compiler()
+    pipelines = {f"-O{level}": PassManager.for_level(level) for level in args.opt_levels}
+    if args.ssa:
+        pipelines["through SSA"] = PassManager(ssa=True)
+    failures = 0
+    start = time.perf_counter()
+    for seed in range(args.seed, args.seed + args.programs):
+        src = ProgramGenerator(funcs=args.funcs, stmts=args.stmts, seed=seed).generate()
+        diff = check(compiler, src, not args.no_asm, pipelines)
+        if diff is not None:
+            failures += 1
+            print(f"seed {seed}: {diff}")
+    elapsed = time.perf_counter() - start
+    print(f"{args.programs} programs, {failures} failed, {args.programs / elapsed * 60:.0f} programs/min")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Check of the hand-written frontend (fastparser.py) against the ANTLR one
+every source is compiled with both frontends, the IR of every function, the globals and the assembly must be
+the same, and a source one of them rejects must be rejected by the other too. The time of lexing + parsing
+with each frontend is summed up on the way.
+
+    python -m benchmarks.frontcheck examples/ more.c   # .c files, dirs are searched recursively
+    python -m benchmarks.frontcheck -n 50 --seed 100   # generated programs (see progen.py)
+"""
+import argparse
+import os
+import sys
+import time
+
+import antlr4
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.batch import collect_sources
+from minidecaf.fastparser import FastParser, tokenize
+from minidecaf.main import check_type, gen_ir, my_lexer, my_parser, name_parse, render_asm
+from minidecaf.syntax import lower
+
+
+def ir_text(ir):
+    """
+    everything the backend gets from the IR, as text
+    """
+    lines = [f"global {glob.var.name} {glob.size} {glob.init}" for glob in ir.globs]
+    lines += [f"decl {name}" for name in ir.funcDecl]
+    for func in ir.funcs:
+        lines.append(f"{func.name}({func.paramInfo.paramNum}):")
+        lines += [f"\t{instruction}" for instruction in func.instructions]
+    return "\n".join(lines)
+
+
+def antlr_tree(src: str):
+    token_stream = my_lexer(antlr4.InputStream(src))
+    token_stream.fill()
+    return my_parser(token_stream)
+
+
+def fast_tree(src: str):
+    return FastParser(tokenize(src)).parse()
+
+
+def compile_with(parse, src: str):
+    """
+    :return: (IR text + assembly, or the error, seconds spent lexing and parsing)
+    """
+    start = time.perf_counter()
+    try:
+        tree = parse(src)
+    except Exception as e:
+        return f"error: {type(e).__name__}", time.perf_counter() - start
+    seconds = time.perf_counter() - start
+    try:
+        program = lower(tree)
+        name_manager = name_parse(program)
+        ir = gen_ir(program, name_manager, check_type(program, name_manager), release=True)
+        return ir_text(ir) + "\n" + render_asm(ir), seconds
+    except Exception as e:
+        return f"error: {type(e).__name__}: {e}", seconds
+
+
+def check(src: str, times):
+    """
+    :return: None if both frontends agree, otherwise a description of the difference
+    """
+    expected, seconds = compile_with(antlr_tree, src)
+    times["antlr"] += seconds
+    got, seconds = compile_with(fast_tree, src)
+    times["fast"] += seconds
+    if expected.startswith("error: ") and got.startswith("error: "):
+        return None  # the syntax errors are worded differently
+    if expected != got:
+        for i, (old, new) in enumerate(zip(expected.split("\n"), got.split("\n"))):
+            if old != new:
+                return f"line {i + 1} of the output: antlr {old!r}, fast {new!r}"
+        return "antlr and fast outputs differ in length"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check the fast frontend against the ANTLR one")
+    parser.add_argument("paths", nargs="*", help=".c files or dirs of them")
+    parser.add_argument("-n", "--programs", type=int, default=0, help="also check this many generated programs")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first generated program")
+    parser.add_argument("--funcs", type=int, default=4)
+    parser.add_argument("--stmts", type=int, default=8)
+    args = parser.parse_args()
+    sources = []
+    for path in args.paths:
+        for name in collect_sources(path) if os.path.isdir(path) else [path]:
+            with open(name) as f:
+                sources.append((name, f.read()))
+    for seed in range(args.seed, args.seed + args.programs):
+        sources.append((f"seed {seed}", ProgramGenerator(funcs=args.funcs, stmts=args.stmts, seed=seed).generate()))
+    times = {"antlr": 0.0, "fast": 0.0}
+    failures = 0
+    for name, src in sources:
+        diff = check(src, times)
+        if diff is not None:
+            failures += 1
+            print(f"{name}: {diff}")
+    print(f"{len(sources)} sources, {failures} differ; lex + parse: antlr {times['antlr']:.2f} s, "
+          f"fast {times['fast']:.2f} s ({times['antlr'] / max(times['fast'], 1e-9):.0f}x)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
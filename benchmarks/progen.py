@@ -0,0 +1,190 @@
+"""
+MiniDecaf program generator
+generates valid, terminating MiniDecaf programs whose size grows along independent axes:
+
+    funcs       number of functions besides main
+    stmts       statements per function body
+    expr_depth  depth of the generated expression trees
+    nesting     how deep for/while/if statements are nested
+    array_size  length of the local and global arrays
+    globals     number of global variables
+
+functions only call earlier functions that do not call anything themselves, and every loop has a
+constant trip count, so the programs also terminate (quickly) when they are run.
+"""
+import random
+
+
+class ProgramGenerator:
+    """
+    generate one program per generate() call, deterministic for a given seed
+    """
+    LOOP_TRIPS = 3  # trip count of nested loops, kept small so run time stays bounded
+    BLOCK_STMTS = 3  # statements per nested block, only the first one nests further
+
+    def __init__(self, funcs=4, stmts=8, expr_depth=3, nesting=2, array_size=4, globals=4, seed=0):
+        self.funcs = funcs
+        self.stmts = stmts
+        self.exprDepth = expr_depth
+        self.nesting = nesting
+        self.arraySize = max(array_size, 1)
+        self.globals = globals
+        self.seed = seed
+        self.rand = random.Random(seed)
+
+    def generate(self):
+        self.lines = []
+        self.globalNames = [f"g{i}" for i in range(self.globals)]
+        self.leafFuncs = []  # (name, number of params) of the functions that call nothing
+        for name in self.globalNames:
+            init = f" = {self.rand.randint(0, 9)}" if self.rand.random() < 0.5 else ""
+            self.lines.append(f"int {name}{init};")
+        self.lines.append(f"int garr[{self.arraySize}];")
+        for i in range(self.funcs):
+            self.function(f"f{i}")
+        self.function("main")
+        return "\n".join(self.lines) + "\n"
+
+    def emit(self, depth: int, line: str):
+        self.lines.append("    " * depth + line)
+
+    def function(self, name: str):
+        self.rand = random.Random(f"{self.seed}-{name}")  # more funcs leave the earlier ones unchanged
+        n_params = 0 if name == "main" else self.rand.randint(0, 3)
+        params = [f"p{i}" for i in range(n_params)]
+        self.lines.append(f"int {name}({', '.join('int ' + p for p in params)}) {{")
+        self.scopes = [list(params)]
+        self.loopVars = []
+        self.counter = 0
+        self.makesCalls = False
+        self.emit(1, f"int acc = {self.rand.randint(0, 9)};")
+        self.emit(1, f"int arr[{self.arraySize}];")
+        self.scopes[-1].append("acc")
+        for i in range(self.stmts):
+            self.statement(1, self.nesting, nest=(i == 0))
+        self.emit(1, f"return acc % 256;")
+        self.lines.append("}")
+        if name != "main" and not self.makesCalls:
+            self.leafFuncs.append((name, n_params))
+
+    def fresh(self, prefix: str):
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def visible(self):
+        return [v for scope in self.scopes for v in scope] + self.globalNames
+
+    def statement(self, depth: int, nesting: int, nest=False):
+        """
+        :param nest: pick a nesting statement if nesting allows, so the nesting depth is always reached
+        """
+        nested = ["for", "while", "if", "block"] if nesting > 0 else []
+        kind = self.rand.choice(nested if nest and nested else ["decl", "assign", "assign", "array", "call"] + nested)
+        if kind == "decl":
+            var = self.fresh("v")
+            self.emit(depth, f"int {var} = {self.expr(self.exprDepth)};")
+            self.scopes[-1].append(var)
+        elif kind == "assign":
+            self.emit(depth, f"{self.target()} = {self.expr(self.exprDepth)};")
+        elif kind == "array":
+            arr = self.rand.choice(["arr", "garr"])
+            self.emit(depth, f"{arr}[{self.index()}] = {self.expr(self.exprDepth)};")
+        elif kind == "call":
+            self.emit(depth, f"acc = acc + {self.call()};")
+        elif kind == "for":
+            var = self.fresh("i")
+            trips = self.arraySize if nesting == self.nesting else self.LOOP_TRIPS
+            self.emit(depth, f"for (int {var} = 0; {var} < {trips}; {var} = {var} + 1) {{")
+            self.body(depth, nesting, [var], loop_var=(var, trips))
+        elif kind == "while":
+            var = self.fresh("w")
+            self.emit(depth, f"int {var} = 0;")
+            self.scopes[-1].append(var)
+            self.emit(depth, f"while ({var} < {self.LOOP_TRIPS}) {{")
+            self.emit(depth + 1, f"{var} = {var} + 1;")
+            self.body(depth, nesting, [], hidden=var)
+        elif kind == "if":
+            self.emit(depth, f"if ({self.expr(self.exprDepth)} > {self.rand.randint(-5, 5)}) {{")
+            self.body(depth, nesting, [])
+            if self.rand.random() < 0.5:
+                self.lines[-1] += " else {"
+                self.body(depth, 1, [])  # flat, or the program would double in size per nesting level
+        else:
+            self.emit(depth, "{")
+            self.body(depth, nesting, [])
+
+    def body(self, depth: int, nesting: int, new_vars, loop_var=None, hidden=None):
+        """
+        a nested block; the loop counters of enclosing loops are readable but never assigned
+        only its first statement nests further, so the program grows linearly with the nesting
+        """
+        self.scopes.append(list(new_vars))
+        if loop_var is not None:
+            self.loopVars.append(loop_var)
+        if hidden is not None:
+            self.loopVars.append((hidden, None))
+        for i in range(self.BLOCK_STMTS):
+            self.statement(depth + 1, nesting - 1 if i == 0 else 0, nest=(i == 0))
+        if loop_var is not None or hidden is not None:
+            self.loopVars.pop()
+        self.scopes.pop()
+        self.emit(depth, "}")
+
+    def target(self):
+        frozen = {var for var, _ in self.loopVars}
+        candidates = [v for v in self.visible() if v not in frozen and not v.startswith("p")]
+        return self.rand.choice(candidates)
+
+    def index(self):
+        """
+        an array index that is always in bounds
+        """
+        in_range = [var for var, trips in self.loopVars if trips is not None and trips <= self.arraySize]
+        if in_range and self.rand.random() < 0.7:
+            return self.rand.choice(in_range)
+        return str(self.rand.randrange(self.arraySize))
+
+    def call(self):
+        if not self.leafFuncs:
+            return str(self.rand.randint(0, 9))
+        self.makesCalls = True
+        name, n_params = self.rand.choice(self.leafFuncs)
+        return f"{name}({', '.join(self.expr(1) for _ in range(n_params))})"
+
+    def expr(self, depth: int):
+        if depth <= 0 or self.rand.random() < 0.2:
+            return self.atom()
+        kind = self.rand.random()
+        if kind < 0.55:
+            op = self.rand.choice(["+", "-", "*", "+", "-", "<", "<=", ">", ">=", "==", "!=", "&&", "||"])
+            return f"({self.expr(depth - 1)} {op} {self.expr(depth - 1)})"
+        if kind < 0.7:
+            op = self.rand.choice(["/", "%"])
+            return f"({self.expr(depth - 1)} {op} {self.rand.randint(1, 9)})"
+        if kind < 0.8:
+            return f"{self.rand.choice(['-', '!', '~'])}{self.atom()}"
+        if kind < 0.9:
+            return f"({self.expr(depth - 1)} ? {self.expr(depth - 1)} : {self.expr(depth - 1)})"
+        return f"{self.rand.choice(['arr', 'garr'])}[{self.index()}]"
+
+    def atom(self):
+        if self.rand.random() < 0.4:
+            return str(self.rand.randint(0, 100))
+        return self.rand.choice(self.visible())
+
+
+def generate(seed=0, **axes):
+    """
+    shortcut: generate(seed, funcs=..., stmts=..., ...) -> program text
+    """
+    return ProgramGenerator(seed=seed, **axes).generate()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="generate a MiniDecaf program")
+    for axis, default in [("funcs", 4), ("stmts", 8), ("expr-depth", 3), ("nesting", 2),
+                          ("array-size", 4), ("globals", 4), ("seed", 0)]:
+        parser.add_argument(f"--{axis}", type=int, default=default)
+    args = parser.parse_args()
+    print(generate(**{k: v for k, v in vars(args).items()}), end="")
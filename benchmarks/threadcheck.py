@@ -0,0 +1,72 @@
+"""
+Check of the thread safety of the library API (compiler.py)
+generated programs (see progen.py) are compiled one after the other, then again several times over by a pool
+of threads sharing one Compiler; every threaded compilation must give the assembly of the serial one. The
+threads also race to make the same new types (see types.py), which must come out as one object each.
+
+    python -m benchmarks.threadcheck
+    python -m benchmarks.threadcheck -n 50 --threads 16 --frontend antlr -O 2
+"""
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.progen import ProgramGenerator
+from minidecaf.compiler import Compiler
+from minidecaf.main import FRONTENDS
+from minidecaf.passes import PassManager
+from minidecaf.types import INT, TYPES, ArrayType, PtrType
+
+
+def check_types(threads: int, count=2000):
+    """
+    :return: whether threads making the same new types at the same time all got the same objects
+    """
+    first = len(TYPES) + 1000000  # array lengths no program used yet
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # so that the threads switch inside _intern
+    try:
+        with ThreadPoolExecutor(threads) as pool:
+            made = list(pool.map(lambda _: [PtrType(ArrayType(INT, n)) for n in range(first, first + count)],
+                                 range(threads)))
+    finally:
+        sys.setswitchinterval(old)
+    return all(ty is made[0][i] for types in made for i, ty in enumerate(types)) and \
+        all(TYPES[ty.tid] is ty for ty in TYPES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check that threads sharing a Compiler get the serial output")
+    parser.add_argument("-n", "--programs", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first program")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3, help="times every program is compiled by the threads")
+    parser.add_argument("--frontend", choices=FRONTENDS, default="fast")
+    parser.add_argument("-O", type=int, choices=[0, 1, 2], default=0, dest="opt_level")
+    args = parser.parse_args()
+    passes = PassManager.for_level(args.opt_level) if args.opt_level else None
+    compiler = Compiler(frontend=args.frontend, passes=passes)
+    sources = [ProgramGenerator(funcs=3, stmts=6, seed=seed).generate()
+               for seed in range(args.seed, args.seed + args.programs)]
+    expected = [compiler.compile_string(src) for src in sources]
+    failures = 0
+    with ThreadPoolExecutor(args.threads) as pool:
+        futures = [pool.submit(compiler.compile_string, src) for src in sources * args.rounds]
+        for i, future in enumerate(futures):
+            seed = args.seed + i % len(sources)
+            try:
+                if future.result() != expected[i % len(sources)]:
+                    failures += 1
+                    print(f"seed {seed}: the assembly differs from the serial one")
+            except Exception as e:
+                failures += 1
+                print(f"seed {seed}: {type(e).__name__}: {e}")
+    if not check_types(args.threads):
+        failures += 1
+        print("threads making the same types got different objects")
+    print(f"{len(futures)} compilations on {args.threads} threads, {failures} failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
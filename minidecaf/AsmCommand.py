@@ -39,10 +39,7 @@ class AsmInstructionList(AsmCommand):
 
     def __str__(self):
         # self.s is a list of str
-        local_s = ''
-        for string in self.s:
-            local_s += '\t' + string + '\n'
-        return local_s
+        return ''.join(['\t' + string + '\n' for string in self.s])
 
 
 class AsmDirective(AsmCommand):
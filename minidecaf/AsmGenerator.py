@@ -1,3 +1,5 @@
+import io
+
 from minidecaf.AsmCommand import AsmDirective
 from minidecaf.AsmCommand import AsmInstruction
 from minidecaf.AsmCommand import AsmInstructionList
@@ -13,8 +15,13 @@ class AsmGenerator:
     generate asm commands from IR
     """
 
-    def __init__(self, asm_writer: AsmWriter):
+    def __init__(self, asm_writer: AsmWriter, passes=None):
+        """
+        :param passes: the PassManager run on every function (see passes.py), None for none at all
+        """
         self.writer = asm_writer
+        self.ir = None
+        self.passes = passes
 
     def check_conflict(self, globs, funcs, func_decl):
         var_name_list = [glob.var.name for glob in globs]
@@ -24,8 +31,40 @@ class AsmGenerator:
             raise Exception('conflict naming between global var and func')
 
     def generate(self, ir: IRContainer):
-        self.ir = ir
         self.check_conflict(ir.globs, ir.funcs, ir.funcDecl)
+        self.generate_globals(ir)
+        for func in ir.funcs:
+            self.generate_function(func)
+        self.writer.flush()
+
+        # self.generateHeader('main')
+        # self.generateFromIR(ir)
+        # self.generateEpilogue("main")
+
+    def stream_function(self, ir: IRContainer, func):
+        """
+        streaming mode: called by the IRContainer as soon as func is generated, see IRContainer.onFunction
+        the globals are written before the first function
+        """
+        if self.ir is None:
+            self.start_stream(ir)
+        self.generate_function(func)
+
+    def finish_stream(self, ir: IRContainer):
+        if self.ir is None:
+            self.start_stream(ir)
+        self.writer.flush()
+
+    def start_stream(self, ir: IRContainer):
+        """
+        check the globals against every function of the program, so that nothing is written on a conflict,
+        then write them
+        """
+        self.check_conflict(ir.globs, [], ir.funcNames)
+        self.generate_globals(ir)
+
+    def generate_globals(self, ir: IRContainer):
+        self.ir = ir
         for glob in ir.globs:
             if glob.init is None:
                 self.writer.write_list([AsmDirective(f".comm {glob.var.name},{glob.size},4")])
@@ -38,42 +77,81 @@ class AsmGenerator:
                     AsmLabel(f"{glob.var.name}"),
                     AsmDirective(f".quad {glob.init}")])
 
-        for func in ir.funcs:
-            self.curFunc = func.name
-            self.generate_header(f"{func.name}", func.paramInfo)
-            self.generate_from_ir_list(func.instructions)
-            self.generate_epilogue(f"{func.name}")
+    def generate_function(self, func):
+        passes = self.passes
+        if passes is None or not passes.has("asm"):
+            self._generate_function(func)
+            return
+        writer = self.writer
+        buf = io.StringIO()
+        self.writer = AsmWriter(buf)
+        try:
+            self._generate_function(func)
+            self.writer.flush()
+        finally:
+            self.writer = writer
+        lines = passes.run("asm", func.name, buf.getvalue().splitlines())
+        writer.write_text(''.join([f'{line}\n' for line in lines]))
 
-        # self.generateHeader('main')
-        # self.generateFromIR(ir)
-        # self.generateEpilogue("main")
+    def _generate_function(self, func):
+        passes = self.passes
+        if passes is not None:
+            func = passes.run_ir(func)
+            if passes.lowers:
+                tac_func = passes.lower(func)
+                if tac_func is not None:
+                    self.generate_tac_function(tac_func)
+                    return
+        self.curFunc = func.name
+        self.generate_header(f"{func.name}", func.paramInfo)
+        self.generate_from_ir_list(func.instructions)
+        self.generate_epilogue(f"{func.name}")
+
+    def generate_tac_function(self, func):
+        """
+        generate a TACFunc (see tac.py), its registers live in frame slots under the ones of the IR stack
+        """
+        from minidecaf.tac import Frame, TERMINATORS, fp_addr
+        self.curFunc = func.name
+        frame = Frame(func)
+        self.generate_header(f"{func.name}", func.paramInfo)
+        self.writer.write_list([AsmInstructionList(fp_addr("sp", -frame.size))])
+        blocks = func.blocks
+        for i, block in enumerate(blocks):
+            next_block = blocks[i + 1] if i + 1 < len(blocks) else None
+            commands = [AsmLabel(block.label)]
+            for instr in block.instrs:
+                lines = instr.gen_asm(frame, next_block) if isinstance(instr, TERMINATORS) else instr.gen_asm(frame)
+                if lines:
+                    commands.append(AsmInstructionList(lines))
+            self.writer.write_list(commands)
+        self.generate_epilogue(f"{func.name}")
 
     def generate_header(self, func_name: str, param_info):
         self.writer.write_list([
                                   AsmDirective(".text"),
                                   AsmDirective(f".globl {func_name}"),
-                                  AsmLabel(f'{func_name}')] +
-                               AsmInstructionList(push_reg('ra')).__str__().split('\n') +
-                               AsmInstructionList(push_reg('fp')).__str__().split('\n') +
-                               [AsmInstruction('mv fp, sp')])
+                                  AsmLabel(f'{func_name}'),
+                                  AsmInstructionList(push_reg('ra')),
+                                  AsmInstructionList(push_reg('fp')),
+                                  AsmInstruction('mv fp, sp')])
 
         for i in range(param_info.paramNum):
             fr, to = 4 * (i + 2), - 8 * (i + 1)
             self.writer.write_list([
-                                      AsmInstruction(f"lw t1, {fr}(fp)")] +
-                                   AsmInstructionList(push_reg('t1')).__str__().split('\n'))
+                                      AsmInstruction(f"lw t1, {fr}(fp)"),
+                                      AsmInstructionList(push_reg('t1'))])
 
     def generate_epilogue(self, func: str):
-        self.writer.write_list(
-            AsmInstructionList(push_int(0)).__str__().split('\n') +  # push 0 for no return status, default return 0
-            [
-                AsmLabel(f"{func}_exit"),
-                AsmInstruction("lw a0, 0(sp)"),
-                AsmInstruction("mv sp, fp")] +
-            AsmInstructionList(pop("fp")).__str__().split('\n') +
-            AsmInstructionList(pop('ra')).__str__().split('\n') + [
-                AsmInstruction("jr ra"),
-            ])
+        self.writer.write_list([
+            AsmInstructionList(push_int(0)),  # push 0 for no return status, default return 0
+            AsmLabel(f"{func}_exit"),
+            AsmInstruction("lw a0, 0(sp)"),
+            AsmInstruction("mv sp, fp"),
+            AsmInstructionList(pop("fp")),
+            AsmInstructionList(pop('ra')),
+            AsmInstruction("jr ra"),
+        ])
 
     def generate_from_ir_list(self, ir_list):
         command_list = [AsmInstructionList(ir.gen_asm()) for ir in ir_list]
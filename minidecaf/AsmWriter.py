@@ -5,17 +5,39 @@ class AsmWriter:
     """
     a writer for asm commands
     self.f can be sys.stdout or a file handler
+    the commands are rendered into a buffer, which goes to self.f in one write once it holds bufferSize
+    characters, and on flush()
     """
+    bufferSize = 256 * 1024
 
     def __init__(self, out_file):
         self.f = out_file
+        self._buf = []
+        self._buffered = 0
 
     def write(self, command: AsmCommand):
-        print(f'{command}', file=self.f)
+        self._append(f'{command}\n')
 
     def write_list(self, commands: [AsmCommand]):
-        for command in commands:
-            self.write(command)
+        self._append(''.join([f'{command}\n' for command in commands]))
+
+    def write_text(self, text: str):
+        """
+        write text rendered before, lines of commands ending with a newline
+        """
+        self._append(text)
+
+    def _append(self, text: str):
+        self._buf.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.bufferSize:
+            self.flush()
+
+    def flush(self):
+        self.f.write(''.join(self._buf))
+        self._buf = []
+        self._buffered = 0
 
     def close(self):
+        self.flush()
         self.f.close()
@@ -7,15 +7,22 @@ class IRContainer:
     """
     A List Containing IR string, with add method
     __str__ method returns the string representation of IR
+
+    with on_function, every finished IRFunc is handed to on_function(container, func) instead of being kept
+    in funcs, so the backend can write it out and drop it right away (see AsmGenerator.stream_function)
+    with compact, the instructions of every function kept in funcs are packed (see ircode.py)
     """
 
-    def __init__(self):
+    def __init__(self, on_function=None, compact=False):
+        self.onFunction = on_function
+        self.compact = compact
         self.current_instructions = []
         self.curName = None
         self.curParamInfo = None
         self.funcs = []
         self.globs = []
         self.funcDecl = []
+        self.funcNames = []  # every function the program declares or defines, known before any is generated
 
     def __str__(self):
         return "main:\n\t" + '\n\t'.join(map(str, self.current_instructions))
@@ -39,7 +46,22 @@ class IRContainer:
         self.current_instructions = []
 
     def exit_function(self):
-        self.funcs.append(IRFunc(self.curName, self.curParamInfo, self.current_instructions))
+        func = IRFunc(self.curName, self.curParamInfo, self.current_instructions)
+        if self.onFunction is not None:
+            self.onFunction(self, func)
+        else:
+            if self.compact:
+                from minidecaf.ircode import pack
+                func.instructions = pack(func.instructions)
+            self.funcs.append(func)
+
+    def add_function(self, func):
+        """
+        add an IRFunc made before, as if it had just been generated (see incremental.py)
+        """
+        self.enter_function(func.name, func.paramInfo)
+        self.current_instructions = func.instructions
+        self.exit_function()
 
     def get_ir(self):
         return "main:\n\t" + '\n\t'.join(map(str, self.funcs))
@@ -51,6 +73,9 @@ class IRFunc:
     """
 
     def __init__(self, name: str, param_info: ParamInfo, instructions: [BaseIRStr]):
+        """
+        :param instructions: a list, or a PackedIR (see ircode.py)
+        """
         self.name = name
         self.paramInfo = param_info
         self.instructions = instructions
@@ -1,23 +1,29 @@
 import minidecaf.IRStr as IRStr
+import minidecaf.syntax as syntax
 from .IRStr import Unary, Binary, Const, BaseIRStr
 from .NameParser import Variable
-from .generated.MiniDecafParser import MiniDecafParser
-from .generated.MiniDecafVisitor import MiniDecafVisitor
-from .types import ArrayType, PtrType
+from .syntax import NodeVisitor
+from .types import ArrayType, PtrType, ZeroType
 
 
-class IRGenerator(MiniDecafVisitor):
+class IRGenerator(NodeVisitor):
     """
-    A visitor for going through the whole ast, inherited from MiniDecafVisitor
-    The accept method in different node uses the vistor's different methods, that is the visitor pattern.
+    A visitor for going through the whole syntax tree (see syntax.py)
+    visit(node) dispatches on the class of the node to the visit method of that class, that is the visitor pattern.
+    The methods emitting the IR of a node with children are generators yielding the children, see NodeVisitor.
     """
 
-    def __init__(self, ir_container, name_manager, type_info):
+    def __init__(self, ir_container, name_manager, type_info, release=False):
+        """
+        :param release: drop every function from the syntax tree, name_manager and type_info once its IR is
+            generated, for a caller that has no further use for them
+        """
         self._container = ir_container
         self.labelManager = LabelManager()
         self.nameManager = name_manager
         self._curFuncNameInfo = None
         self.typeInfo = type_info
+        self.release = release
 
     def _var(self, term):
         return self._curFuncNameInfo[term]
@@ -40,7 +46,7 @@ class IRGenerator(MiniDecafVisitor):
 
     def loop(self, name, init, cond, body, post):
         """
-        general loop structure
+        general loop structure, a generator for the visit methods of the loops to yield from
         """
         entry_label = self.labelManager.new_label(f"{name}_entry")
         if post is not None:  # have statement like incrementation
@@ -51,257 +57,234 @@ class IRGenerator(MiniDecafVisitor):
 
         self.labelManager.enter_loop(continue_label, exit_label)
         if init is not None:
-            init.accept(self)
-            if isinstance(init, MiniDecafParser.ExprContext):
-                self._container.add(IRStr.Pop())
+            yield init
+            if isinstance(init, syntax.Expr):
+                self._container.add(IRStr.POP)
         self._container.add(IRStr.Label(entry_label))
         if cond is not None:
-            cond.accept(self)  # check loop condition
+            yield cond  # check loop condition
         else:
             self._container.add(IRStr.Const(1))  # loop forever
         self._container.add(IRStr.Branch("beqz", exit_label))  # if cond is not satisfied (stack top == 0), then exit
-        body.accept(self)  # calculate body part
+        yield body  # calculate body part
 
         if post is not None:
             self._container.add(IRStr.Label(continue_label))  # go to post
-            post.accept(self)  # calculate post
-            if isinstance(post, MiniDecafParser.ExprContext):
-                self._container.add(IRStr.Pop())
+            yield post  # calculate post
+            if isinstance(post, syntax.Expr):
+                self._container.add(IRStr.POP)
 
         self._container.add(IRStr.Branch("br", entry_label))  # go to entry, loop!
         self._container.add(IRStr.Label(exit_label))  # exit label
 
         self.labelManager.exit_loop()
 
-    def visitForDeclStmt(self, ctx: MiniDecafParser.ForDeclStmtContext):
-        self.loop("for", ctx.init, ctx.ctrl, ctx.stmt(), ctx.post)
-        self._container.add_list([IRStr.Pop()] * self._curFuncNameInfo.blockSlots[ctx])
-
-    def visitForStmt(self, ctx: MiniDecafParser.ForStmtContext):
-        self.loop("for", ctx.init, ctx.ctrl, ctx.stmt(), ctx.post)
+    def visitFor(self, node: syntax.For):
+        yield from self.loop("for", node.init, node.ctrl, node.body, node.post)
+        if isinstance(node.init, syntax.Declaration):  # the loop is a scope of its own
+            self._container.add_list([IRStr.POP] * self._curFuncNameInfo.blockSlots[node])
 
-    def visitWhileStmt(self, ctx: MiniDecafParser.WhileStmtContext):
-        self.loop("while", None, ctx.expr(), ctx.stmt(), None)
+    def visitWhile(self, node: syntax.While):
+        yield from self.loop("while", None, node.cond, node.body, None)
 
-    def visitDoWhileStmt(self, ctx: MiniDecafParser.DoWhileStmtContext):
-        self.loop("dowhile", ctx.stmt(), ctx.expr(), ctx.stmt(), None)
+    def visitDoWhile(self, node: syntax.DoWhile):
+        yield from self.loop("dowhile", node.body, node.cond, node.body, None)
 
-    def visitBreakStmt(self, ctx: MiniDecafParser.BreakStmtContext):
+    def visitBreak(self, node: syntax.Break):
         self._container.add(IRStr.Branch("br", self.labelManager.break_label()))
 
-    def visitContinueStmt(self, ctx: MiniDecafParser.ContinueStmtContext):
+    def visitContinue(self, node: syntax.Continue):
         self._container.add(IRStr.Branch("br", self.labelManager.continue_label()))
 
-    def visitReturnStmt(self, ctx: MiniDecafParser.ReturnStmtContext):
-        self.visitChildren(ctx)
-        self._container.add(IRStr.Ret())
+    def visitReturn(self, node: syntax.Return):
+        yield node.expr
+        self._container.add(IRStr.RET)
 
-    def visitExprStmt(self, ctx: MiniDecafParser.ExprStmtContext):
-        self.visitChildren(ctx)
-        if ctx.expr() is not None:
+    def visitExprStmt(self, node: syntax.ExprStmt):
+        if node.expr is not None:
+            yield node.expr
             # empty expression shouldn't be popped (step 8 empty expr won't pass without this)
             # non-empty expression should be popped (int i = 0; i = 3; see the ir output)
-            self._container.add(IRStr.Pop())
+            self._container.add(IRStr.POP)
 
-    def visitExpr(self, ctx: MiniDecafParser.ExprContext):
-        self.visitChildren(ctx)
-
-    def visitDeclaration(self, ctx: MiniDecafParser.DeclarationContext):
-        var = self.nameManager.term2Var[ctx.Ident()]
-        if ctx.expr() is not None:
-            ctx.expr().accept(self)
+    def visitDeclaration(self, node: syntax.Declaration):
+        var = self._var(node)
+        if node.init is not None:
+            yield node.init
         else:
             self._container.add_list([Const(0)] * (var.size // 4))
 
-    def visitDeclExternalDecl(self, ctx: MiniDecafParser.DeclExternalDeclContext):
+    def visitGlobalDecl(self, node: syntax.GlobalDecl):
         pass
 
-    def visitCompound(self, ctx: MiniDecafParser.CompoundContext):
+    def visitCompound(self, node: syntax.Compound):
         """
         visit block here
         pop the variables defined in the block
         """
-        self.visitChildren(ctx)
-        self._container.add_list([IRStr.Pop()] * self._curFuncNameInfo.blockSlots[ctx])
+        for item in node.items:
+            yield item
+        self._container.add_list([IRStr.POP] * self._curFuncNameInfo.blockSlots[node])
 
-    def visitWithAsgn(self, ctx: MiniDecafParser.WithAsgnContext):
-        ctx.assignment().accept(self)
-        self.emit_loc(ctx.unary())
-        self._container.add(IRStr.Store())
+    def visitAssign(self, node: syntax.Assign):
+        yield node.rhs
+        yield from self.emit_loc(node.lhs)
+        self._container.add(IRStr.STORE)
 
-    def visitIfStmt(self, ctx: MiniDecafParser.IfStmtContext):
+    def visitIf(self, node: syntax.If):
         """
         Referenced to TA implementation
         """
-        ctx.expr().accept(self)  # calculate condition first
+        yield node.cond  # calculate condition first
         end_label = self.labelManager.new_label("if_end")
         else_label = self.labelManager.new_label("if_else")
-        if ctx.el is not None:
+        if node.el is not None:
             self._container.add(IRStr.Branch("beqz", else_label))
-            ctx.th.accept(self)
+            yield node.th
             self._container.add_list([IRStr.Branch("br", end_label), IRStr.Label(else_label)])
-            ctx.el.accept(self)
+            yield node.el
             self._container.add(IRStr.Label(end_label))
         else:  # no else statement here
             self._container.add(IRStr.Branch("beqz", end_label))
-            ctx.th.accept(self)
+            yield node.th
             self._container.add(IRStr.Label(end_label))
 
-    def visitWithCond(self, ctx: MiniDecafParser.WithCondContext):
+    def visitCond(self, node: syntax.Cond):
         """
         Reference to TA implementation
         """
-        ctx.logicalOr().accept(self)  # calc CLor first
+        yield node.cond  # calc CLor first
         exit_label = self.labelManager.new_label("cond_end")
         else_label = self.labelManager.new_label("cond_else")
         self._container.add(IRStr.Branch("beqz", else_label))  # if false, go to else
-        ctx.expr().accept(self)  # if true, do expr
+        yield node.th  # if true, do expr
         self._container.add_list([IRStr.Branch("br", exit_label), IRStr.Label(else_label)])
-        ctx.conditional().accept(self)
+        yield node.el
         self._container.add(IRStr.Label(exit_label))
 
-    def visitAtomIdent(self, ctx: MiniDecafParser.AtomIdentContext):
-        offset = self.get_position(ctx.Ident())
+    def visitIdent(self, node: syntax.Ident):
+        offset = self.get_position(node)
         if offset is None:
-            self._container.add(IRStr.GlobalSymbol(self.get_ident(ctx.Ident())))
+            self._container.add(IRStr.GlobalSymbol(self.get_ident(node)))
         else:
             self._container.add(IRStr.FrameSlot(offset))  # get position from nameManager
-        if not isinstance(self.typeInfo[ctx], ArrayType):
-            self._container.add(IRStr.Load())
-
-    def visitCUnary(self, ctx: MiniDecafParser.CUnaryContext):
-        if ctx.unaryOp() is not None:
-            op = ctx.unaryOp().getText()
-            if op == '&':
-                self.emit_loc(ctx.cast())
-            elif op == '*':
-                self.visitChildren(ctx)
-                self._container.add(IRStr.Load())
-            else:
-                self.visitChildren(ctx)
-                self._container.add(Unary(op))
-
-    def visitAtomInteger(self, ctx: MiniDecafParser.AtomIntegerContext):
-        # no children in atomInteger branch, get the Integer DIRECTLY
-        if ctx.Integer() is not None:
-            v = int(ctx.Integer().getText())
-            self._container.add(IRStr.Const(v))
-
-    def visitCAdd(self, ctx: MiniDecafParser.CAddContext):
-        if ctx.addOp() is not None:
-            self._add_expr(ctx, ctx.addOp().getText(), ctx.additive(), ctx.multiplicative())
-
-    def visitCMul(self, ctx: MiniDecafParser.CMulContext):
-        self.visitChildren(ctx)
-        if ctx.mulOp() is not None:
-            self._container.add(IRStr.Binary(ctx.mulOp().getText()))
-
-    def visitCLand(self, ctx: MiniDecafParser.CLandContext):
-        self.visitChildren(ctx)
-        if ctx.andOp() is not None:
-            self._container.add(IRStr.Binary(ctx.andOp().getText()))
-
-    def visitCLor(self, ctx: MiniDecafParser.CLorContext):
-        self.visitChildren(ctx)
-        if ctx.orOp() is not None:
-            self._container.add(IRStr.Binary(ctx.orOp().getText()))
-
-    def visitCRel(self, ctx: MiniDecafParser.CRelContext):
-        self.visitChildren(ctx)
-        if ctx.relOp() is not None:
-            self._container.add(IRStr.Binary(ctx.relOp().getText()))
-
-    def visitCEq(self, ctx: MiniDecafParser.CEqContext):
-        self.visitChildren(ctx)
-        if ctx.eqOp() is not None:
-            self._container.add(IRStr.Binary(ctx.eqOp().getText()))
-
-    def visitFuncDef(self, ctx: MiniDecafParser.FuncDefContext):
-        if ctx.Ident() is not None:
-            func = ctx.Ident().getText()
-            self._curFuncNameInfo = self.nameManager.nameManager[func]
-
-            param_info = self.nameManager.paramInfos[func]
-
-            self._container.enter_function(func, param_info)
-            ctx.compound().accept(self)
-            self._container.exit_function()
-
-    def visitMainFunc(self, ctx: MiniDecafParser.MainFuncContext):
-        func = 'main'
+        if not isinstance(self.typeInfo[node], ArrayType):
+            self._container.add(IRStr.LOAD)
+
+    def visitUnary(self, node: syntax.Unary):
+        op = node.op
+        if op == '&':
+            yield from self.emit_loc(node.operand)
+        elif op == '*':
+            yield node.operand
+            self._container.add(IRStr.LOAD)
+        else:
+            yield node.operand
+            self._container.add(Unary(op))
+
+    def visitCast(self, node: syntax.Cast):
+        yield node.operand
+
+    def visitIntLit(self, node: syntax.IntLit):
+        self._container.add(IRStr.Const(node.value))
+
+    def visitBinary(self, node: syntax.Binary):
+        if node.op in ('+', '-'):
+            yield from self._add_expr(node, node.op, node.lhs, node.rhs)
+        else:
+            yield node.lhs
+            yield node.rhs
+            self._container.add(IRStr.Binary(node.op))
+
+    def visitFuncDef(self, node: syntax.FuncDef):
+        func = node.name
         self._curFuncNameInfo = self.nameManager.nameManager[func]
+        self.typeInfo.enter(node)
+
         param_info = self.nameManager.paramInfos[func]
+
         self._container.enter_function(func, param_info)
-        ctx.compound().accept(self)
+        self.visit(node.body)
         self._container.exit_function()
 
-    def visitFuncDecl(self, ctx: MiniDecafParser.FuncDeclContext):
-        # self.visitChildren(ctx)
-        if ctx.Ident() is not None:
-            self._container.add_func_decl(ctx.Ident().getText())
+    def visitFuncDecl(self, node: syntax.FuncDecl):
+        self._container.add_func_decl(node.name)
 
-    def visitPostfixCall(self, ctx: MiniDecafParser.PostfixContext):
-        args = ctx.argList().expr()
+    def visitCall(self, node: syntax.Call):
         arg_cnt = 0
-        for arg in reversed(args):  # push into stack in a reversed way
-            arg.accept(self)
+        for arg in reversed(node.args):  # push into stack in a reversed way
+            yield arg
             arg_cnt += 1
 
-        call_func_param_num = self.nameManager.paramInfos[ctx.Ident().getText()].paramNum
+        call_func_param_num = self.nameManager.paramInfos[node.name].paramNum
         assert arg_cnt == call_func_param_num
-        if ctx.Ident() is not None:
-            func = ctx.Ident().getText()
-            self._container.add(IRStr.Call(func, self.nameManager.paramInfos[func].paramNum))
+        self._container.add(IRStr.Call(node.name, call_func_param_num))
 
-    def visitProg(self, ctx: MiniDecafParser.ProgContext):
+    def visitProgram(self, node: syntax.Program):
         """
         when visiting programs, visit global variables first
-        :param ctx:
+        :param node:
         :return:
         """
         for globInfo in self.nameManager.globInfos.values():
             self._container.add_global(globInfo)
-        self.visitChildren(ctx)
+        self._container.funcNames = list(self.nameManager.paramInfos)
+        decls = node.decls
+        for i, decl in enumerate(decls):
+            if decl.__class__ is syntax.FuncDef:
+                self.visitFuncDef(decl)  # looked up on self, so that an instrument can watch it
+                if self.release:
+                    decls[i] = None
+                    del self.nameManager.nameManager[decl.name]
+                    self.typeInfo.release(decl.name)
+                    self._curFuncNameInfo = None
+            else:
+                self.visit(decl)
 
-    def _add_expr(self, ctx, op, lhs, rhs):
-        if isinstance(self.typeInfo[lhs], PtrType):
+    def _is_ptr(self, expr):
+        ty = self.typeInfo[expr]
+        return isinstance(ty, PtrType) and not isinstance(ty, ZeroType)  # a literal 0 is an int here
+
+    def _add_expr(self, node, op, lhs, rhs):
+        if self._is_ptr(lhs):
             sz = self.typeInfo[lhs].sizeof()
-            if isinstance(self.typeInfo[rhs], PtrType):  # ptr - ptr
-                lhs.accept(self)
-                rhs.accept(self)
+            if self._is_ptr(rhs):  # ptr - ptr
+                yield lhs
+                yield rhs
                 self._container.add_list([Binary(op)])
                 self._container.add_list([Const(sz), Binary('/')])
             else:  # ptr +- int
-                lhs.accept(self)
-                rhs.accept(self)
+                yield lhs
+                yield rhs
                 self._container.add_list([Const(sz), Binary('*')])
                 self._container.add_list([Binary(op)])
         else:
             sz = self.typeInfo[rhs].sizeof()
-            if isinstance(self.typeInfo[rhs], PtrType):  # int +- ptr
-                lhs.accept(self)
+            if self._is_ptr(rhs):  # int +- ptr
+                yield lhs
                 self._container.add_list([Const(sz), Binary('*')])
-                rhs.accept(self)
+                yield rhs
                 self._container.add_list([Binary(op)])
             else:  # int +- int
-                self.visitChildren(ctx)
+                yield lhs
+                yield rhs
                 self._container.add_list([Binary(op)])
 
-    def emit_loc(self, lvalue: MiniDecafParser.ExprContext):
+    def emit_loc(self, lvalue: syntax.Expr):
         loc = self.typeInfo.lvalueLoc(lvalue)
         for locStep in loc:
             if isinstance(locStep, BaseIRStr):
                 self._container.add_list([locStep])
             else:
-                locStep.accept(self)
+                yield locStep
 
-    def visitPostfixArray(self, ctx: MiniDecafParser.PostfixArrayContext):
-        fixup_mult = self.typeInfo[ctx.postfix()].base.sizeof()
-        ctx.postfix().accept(self)
-        ctx.expr().accept(self)
+    def visitIndex(self, node: syntax.Index):
+        fixup_mult = self.typeInfo[node.base].base.sizeof()
+        yield node.base
+        yield node.index
         self._container.add_list([Const(fixup_mult), Binary('*'), Binary('+')])
-        if not isinstance(self.typeInfo[ctx], ArrayType):
-            self._container.add_list([IRStr.Load()])
+        if not isinstance(self.typeInfo[node], ArrayType):
+            self._container.add_list([IRStr.LOAD])
 
 
 class LabelManager:
@@ -323,6 +306,20 @@ class LabelManager:
             self._labels[scope] += 1
         return f"{scope}_{self._labels[scope]}"
 
+    def counters(self):
+        """
+        :return: scope -> number of labels made in it so far
+        """
+        return dict(self._labels)
+
+    def advance(self, delta: dict):
+        """
+        count the labels a function made elsewhere (see incremental.py) as made here
+        :param delta: scope -> number of labels
+        """
+        for scope, n in delta.items():
+            self._labels[scope] = self._labels.get(scope, 0) + n
+
     def enter_loop(self, entry_label, exit_label):
         """
         add loop entry control
@@ -6,7 +6,10 @@ from minidecaf.utils import pop
 class BaseIRStr:
     """
     base class for different IR types, with genAsm() method to generate asm commands according to the IR type
+    the instances are never changed once made, so one instance can stand for every occurrence of an
+    instruction (see POP, LOAD, STORE, RET and ircode.py)
     """
+    __slots__ = ()
 
     def __repr__(self):
         return self.__str__()
@@ -19,6 +22,7 @@ class GlobalSymbol(BaseIRStr):
     """
     global symbol in step10
     """
+    __slots__ = ('sym',)
 
     def __init__(self, sym: str):
         self.sym = sym
@@ -34,6 +38,7 @@ class Call(BaseIRStr):
     """
     parameters are pushed onto stack from right to left before call instruction
     """
+    __slots__ = ('func', 'para_cnt')
 
     def __init__(self, func: str, para_cnt):
         self.func = func
@@ -50,13 +55,13 @@ class Const(BaseIRStr):
     """
     push an integer onto the ir stack
     """
+    __slots__ = ('v',)
+
+    MIN_INT = -2 ** 31
+    MAX_INT = 2 ** 31 - 1
 
     def __init__(self, v: int):
-        # range check
-        MIN_INT = -2 ** 31
-        MAX_INT = 2 ** 31 - 1
-        assert MIN_INT <= v
-        assert v <= MAX_INT
+        assert self.MIN_INT <= v <= self.MAX_INT  # range check
         self.v = v
 
     def __str__(self):
@@ -70,6 +75,7 @@ class Ret(BaseIRStr):
     """
     return an integer from the ir stack
     """
+    __slots__ = ()
 
     def __str__(self):
         return f"ret"
@@ -84,6 +90,7 @@ class Load(BaseIRStr):
     """
     load stack top address data to stack top
     """
+    __slots__ = ()
 
     def __str__(self):
         return 'load'
@@ -101,6 +108,7 @@ class Pop(BaseIRStr):
     """
     pop from the stack (add stack pointer) without reg changes
     """
+    __slots__ = ()
 
     def __str__(self):
         return 'pop'
@@ -117,6 +125,7 @@ class Store(BaseIRStr):
     """
     store stackTop + 4 data to 0(stackTop) address
     """
+    __slots__ = ()
 
     def __str__(self):
         return 'store'
@@ -134,6 +143,7 @@ class FrameSlot(BaseIRStr):
     """
     save the var's address to the stack top
     """
+    __slots__ = ('offset',)
 
     def __init__(self, fp_offset: int):
         assert fp_offset < 0
@@ -153,6 +163,7 @@ class Unary(BaseIRStr):
     """
     store unary operations
     """
+    __slots__ = ('op',)
     ir_unary_ops = {'!': 'lnot', '~': 'not', '-': 'neg'}
     asm_unary_ops = {'!': 'seqz', '~': 'not', '-': 'neg'}
 
@@ -169,11 +180,18 @@ class Unary(BaseIRStr):
     def gen_asm(self):
         return [f'lw t1, 0(sp)', f'{self.asm_unary_ops[self.op]} t1, t1', 'sw t1, 0(sp)']
 
+    def reg_asm(self):
+        """
+        the operation on t1 in place, for the three-address IR (see tac.py)
+        """
+        return [f'{self.asm_unary_ops[self.op]} t1, t1']
+
 
 class Branch(BaseIRStr):
     """
     Branch operations
     """
+    __slots__ = ('op', 'label')
     branchOps = ["br", "beqz", "bnez", "beq"]
 
     def __init__(self, op, label: str):
@@ -197,6 +215,7 @@ class Label(BaseIRStr):
     """
     label for branch
     """
+    __slots__ = ('label',)
 
     def __init__(self, label: str):
         self.label = label
@@ -212,6 +231,7 @@ class Binary(BaseIRStr):
     """
     store binary operations
     """
+    __slots__ = ('op',)
     binary_ops = {'+': 'add', '-': 'sub', '*': 'mul', '/': 'div', '%': 'rem',
                   '==': 'eq', '!=': 'ne',
                   '<': 'slt', '<=': 'le', '>': 'sgt', '>=': 'ge',
@@ -245,6 +265,20 @@ class Binary(BaseIRStr):
     def _trailer(self):
         return [self._add_stack(), self._store_t1()]
 
+    def reg_asm(self):
+        """
+        the operation on t1 and t2 into t1, for the three-address IR (see tac.py)
+        """
+        if self.op == '&&':
+            return ['snez t1, t1', 'snez t2, t2', 'and t1, t1, t2']
+        if self.op == '||':
+            return ['or t1, t1, t2', 'snez t1, t1']
+        if self.op in {'==', '!='}:
+            return ['sub t1, t1, t2', 'seqz t1, t1' if self.op == '==' else 'snez t1, t1']
+        if self.op in {'>=', '<='}:
+            return [f"{'slt' if self.op == '>=' else 'sgt'} t1, t1, t2", 'seqz t1, t1']
+        return [f'{self.binary_ops[self.op]} t1, t1, t2']
+
     def gen_asm(self):
         if self.op == '&&':
             result = self._header()
@@ -298,3 +332,10 @@ class Binary(BaseIRStr):
                 self._add_stack(),
                 self._store_t1()
                 ]
+
+
+# the instructions without operands, shared by every occurrence
+POP = Pop()
+LOAD = Load()
+STORE = Store()
+RET = Ret()
@@ -1,12 +1,7 @@
-from copy import deepcopy
+from minidecaf.syntax import Declaration, FuncDef, Node, NodeVisitor, SideTable
 
-import antlr4
 
-from .generated.MiniDecafParser import MiniDecafParser
-from .generated.MiniDecafVisitor import MiniDecafVisitor
-
-
-class NameParser(MiniDecafVisitor):
+class NameParser(NodeVisitor):
     """
     Name resolution process
     """
@@ -17,20 +12,27 @@ class NameParser(MiniDecafVisitor):
         self.totalVarCnt = 0  # totally defined variable count
         self.currentScopeInfo = None
         self.funcNameManager = FuncInfo() # the value to be returned from NameParse period
+        self.varCnt = 0  # number of Variables created, the id of the next one
+
+    def new_var(self, name: str, offset, size: int = 4):
+        """
+        create a new Variable with an id unique in this compilation
+        """
+        self.varCnt += 1
+        return Variable(name, offset, size, self.varCnt - 1)
 
-    def def_var(self, ctx, term, numInts=1):
+    def def_var(self, decl: Declaration, numInts=1):
         self.totalVarCnt += numInts  # define a new variable, totalVar += 1
-        variable = self.variableScope[term.getText()] = Variable(term.getText(), -4 * self.totalVarCnt, 4 * numInts)
-        self.currentScopeInfo.bind(term, variable)
+        variable = self.variableScope[decl.name] = self.new_var(decl.name, -4 * self.totalVarCnt, 4 * numInts)
+        self.currentScopeInfo.bind(decl, variable)
 
-    def use_var(self, ctx, term):
-        if term is not None:
-            variable = self.variableScope[term.getText()]
-            self.currentScopeInfo.bind(term, variable)
+    def use_var(self, node):
+        variable = self.variableScope[node.name]
+        self.currentScopeInfo.bind(node, variable)
 
-    def enter_scope(self, ctx, is_func=False, isMain=False):
+    def enter_scope(self, node, is_func=False, isMain=False):
         """
-        :param ctx:
+        :param node:
         :param is_func:
         :param isMain:
         :return:
@@ -38,39 +40,43 @@ class NameParser(MiniDecafVisitor):
         self.variableScope.push(is_func=is_func, isMain=isMain)  # push the ancestor var scope to current
         self.scopeVarCnt.append(self.totalVarCnt)  # update the var cnt till now
 
-    def exit_scope(self, ctx, ):
-        self.currentScopeInfo.blockSlots[ctx] = self.totalVarCnt - self.scopeVarCnt[
+    def exit_scope(self, node):
+        self.currentScopeInfo.blockSlots[node] = self.totalVarCnt - self.scopeVarCnt[
             -1]  # calculate the number of variables in current block (nowTotal - ancestorTotal)
         self.totalVarCnt = self.scopeVarCnt[-1]  # recover now totalVarCnt to ancestorVarCnt
         self.variableScope.pop()  # pop out current block scope
         self.scopeVarCnt.pop()  # pop out the ancestor var cnt pushed in enterScope()
 
-    def decl_n_elems(self, ctx: MiniDecafParser.DeclarationContext):
+    def decl_n_elems(self, decl: Declaration):
         def prod(l):
             s = 1
             for i in l:
                 s *= i
             return s
 
-        res = prod([int(x.getText()) for x in ctx.Integer()])
+        res = prod(decl.dims)
         MAX_INT = 2 ** 31 - 1
         if res <= 0 or res >= MAX_INT:
-            raise Exception(ctx, "array size <= 0 or too large")
+            raise Exception(decl, "array size <= 0 or too large")
         return res
 
-    def visitCompound(self, ctx: MiniDecafParser.CompoundContext):
+    def visitCompound(self, node):
         """
         Visiting a compound structure
         """
-        self.enter_scope(ctx)
-        self.visitChildren(ctx)
-        self.exit_scope(ctx)
+        self.enter_scope(node)
+        for item in node.items:
+            yield item
+        self.exit_scope(node)
 
-    def visitProg(self, ctx: MiniDecafParser.ProgContext):
-        self.visitChildren(ctx)
-        self.funcNameManager.freeze() # collect all the used variables
+    def visitProgram(self, node):
+        for decl in node.decls:
+            if decl.__class__ is FuncDef:
+                self.visitFuncDef(decl)  # looked up on self, so that an instrument can watch it
+            else:
+                self.visit(decl)
 
-    def visitDeclaration(self, ctx: MiniDecafParser.DeclarationContext):
+    def visitDeclaration(self, node):
         """
         in Minidecaf.g4
 
@@ -79,23 +85,28 @@ class NameParser(MiniDecafVisitor):
         ;
         """
 
-        if ctx.expr() is not None:
-            ctx.expr().accept(self)
-        if ctx.Ident() is not None:
-            var = ctx.Ident().getText()
-            if var in self.variableScope.current_scope_dict():
-                raise Exception(f"redefinition of {var}")  # redefinition of vars
-        self.def_var(ctx, ctx.Ident(), self.decl_n_elems(ctx))
+        if node.init is not None:
+            yield node.init
+        var = node.name
+        if self.variableScope.defined_in_current(var):
+            raise Exception(f"redefinition of {var}")  # redefinition of vars
+        self.def_var(node, self.decl_n_elems(node))
 
-    def visitForDeclStmt(self, ctx: MiniDecafParser.ForDeclStmtContext):
+    def visitFor(self, node):
         """
-        process for with declaration
+        process for, a for with declaration is a scope
         """
-        self.enter_scope(ctx)
-        self.visitChildren(ctx)
-        self.exit_scope(ctx)
+        scoped = isinstance(node.init, Declaration)
+        if scoped:
+            self.enter_scope(node)
+        for part in (node.init, node.ctrl, node.post):
+            if part is not None:
+                yield part
+        yield node.body
+        if scoped:
+            self.exit_scope(node)
 
-    def visitAtomIdent(self, ctx: MiniDecafParser.AtomIdentContext):
+    def visitIdent(self, node):
         """
         in Minidecaf.g4
 
@@ -106,91 +117,143 @@ class NameParser(MiniDecafVisitor):
             ;
 
         """
-        if ctx.Ident() is not None:
-            var = ctx.Ident().getText()
-            if var not in self.variableScope:
-                raise Exception(f"undefined reference to {var}")
-        self.use_var(ctx, ctx.Ident())
+        var = node.name
+        if var not in self.variableScope:
+            raise Exception(f"undefined reference to {var}")
+        self.use_var(node)
 
-    def func(self, ctx, type_name="def", is_main=False):
-        if is_main:
-            func = 'main' # main func do not have Ident() attribute
-        elif ctx.Ident() is not None:
-            func = ctx.Ident().getText()
+    def func(self, node, type_name="def"):
+        func = node.name
+        is_main = func == 'main'  # main is a keyword, no other function can have that name
 
         if type_name == "def":
             if func in self.funcNameManager.nameManager:  # redefinition of functions is prohibited
                 raise Exception(f"redefinition of function {func}")
-        current_scope = self.currentScopeInfo = NameManager()
-        self.enter_scope(ctx, is_func=True, isMain=is_main)
-        paramInfo = ParamInfo(ctx.paramList().accept(self))
+        current_scope = self.currentScopeInfo = NameManager(node.size)
+        self.enter_scope(node, is_func=True, isMain=is_main)
+        paramInfo = ParamInfo(self.param_list(node.params))
         if func in self.funcNameManager.paramInfos: # the function has been declared before
             if not paramInfo.compatible(self.funcNameManager.paramInfos[func]):
                 raise Exception(f"conflicting type for {func}")
         if type_name == "def":
             self.funcNameManager.enter_function(func, current_scope, paramInfo)
-            ctx.compound().accept(self)
+            self.visit(node.body)
         elif type_name == "decl":
             if func not in self.funcNameManager.nameManager:
                 self.funcNameManager.paramInfos[func] = paramInfo
-        self.exit_scope(ctx)
+        self.exit_scope(node)
 
-    def visitMainFunc(self, ctx: MiniDecafParser.MainFuncContext):
-        self.func(ctx, 'def', True)
+    def visitFuncDef(self, node):
+        self.func(node, "def")
 
-    def visitFuncDef(self, ctx: MiniDecafParser.FuncDefContext):
-        self.func(ctx, "def")
+    def visitFuncDecl(self, node):
+        self.func(node, "decl")
 
-    def visitFuncDecl(self, ctx: MiniDecafParser.FuncDeclContext):
-        self.func(ctx, "decl")
+    def param_list(self, params):
+        for declaration in params:
+            self.visit(declaration)
+        return [self.variableScope[declaration.name] for declaration in params]
 
-    def visitParamList(self, ctx: MiniDecafParser.ParamListContext):
-        self.visitChildren(ctx)
-
-        def f(declaration):
-            if declaration.Ident() is not None:
-                return self.variableScope[declaration.Ident().getText()]
-
-        return list(map(f, ctx.declaration()))
-
-    def global_initializer(self, ctx: MiniDecafParser.ExprContext):
+    def global_initializer(self, decl):
         """
         global variable init value getter
         """
 
-        if ctx is None:
+        if decl.init is None:
             return None
         try:
-            return eval(ctx.getText(), {}, {})
+            return eval(decl.initText, {}, {})
+        except (RecursionError, MemoryError):
+            raise Exception("global initializer nested too deep") from None
+        except SyntaxError as e:
+            if "too many nested" in str(e.msg):  # python's own parser limit
+                raise Exception("global initializer nested too deep") from None
+            raise Exception("global initializers must be constants")
         except:
             raise Exception("global initializers must be constants")
 
-    def visitDeclExternalDecl(self, ctx: MiniDecafParser.DeclExternalDeclContext):
+    def visitGlobalDecl(self, node):
         """
         global variable declarations
         """
-        ctx = ctx.declaration()
-        init = self.global_initializer(ctx.expr())  # try to get init value, maybe None or Int
-        if ctx.Ident() is not None:
-            varStr = ctx.Ident().getText()
-            var = Variable(varStr, None, 4 * self.decl_n_elems(ctx))
-            globInfo = GlobInfo(var, 4 * self.decl_n_elems(ctx), init)
-            if varStr in self.variableScope.current_scope_dict():
-                prevVar = self.variableScope[varStr]
-                prevGlobInfo = self.funcNameManager.globInfos[prevVar]
-                if not prevGlobInfo.compatible(globInfo):
-                    raise Exception(f"conflicting types for {varStr}")
-                if prevGlobInfo.init is not None:
-                    if globInfo.init is not None:
-                        raise Exception(f"redefinition of variable {varStr}")
-                    return
-                elif globInfo.init is not None:
-                    self.funcNameManager.globInfos[prevVar].init = init
-            else:
-                self.variableScope[varStr] = var
-                self.funcNameManager.globInfos[var] = globInfo
-                self.funcNameManager.globs[varStr] = globInfo
-                self.funcNameManager.globsTerm2Var[ctx.Ident()] = var
+        init = self.global_initializer(node)  # try to get init value, maybe None or Int
+        varStr = node.name
+        var = self.new_var(varStr, None, 4 * self.decl_n_elems(node))
+        globInfo = GlobInfo(var, 4 * self.decl_n_elems(node), init)
+        if self.variableScope.defined_in_current(varStr):
+            prevVar = self.variableScope[varStr]
+            prevGlobInfo = self.funcNameManager.globInfos[prevVar]
+            if not prevGlobInfo.compatible(globInfo):
+                raise Exception(f"conflicting types for {varStr}")
+            if prevGlobInfo.init is not None:
+                if globInfo.init is not None:
+                    raise Exception(f"redefinition of variable {varStr}")
+                return
+            elif globInfo.init is not None:
+                self.funcNameManager.globInfos[prevVar].init = init
+        else:
+            self.variableScope[varStr] = var
+            self.funcNameManager.globInfos[var] = globInfo
+            self.funcNameManager.globs[varStr] = globInfo
+
+    # the rest only goes down to the names used in expressions
+
+    def visitReturn(self, node):
+        yield node.expr
+
+    def visitExprStmt(self, node):
+        if node.expr is not None:
+            yield node.expr
+
+    def visitIf(self, node):
+        yield node.cond
+        yield node.th
+        if node.el is not None:
+            yield node.el
+
+    def visitWhile(self, node):
+        yield node.cond
+        yield node.body
+
+    def visitDoWhile(self, node):
+        yield node.body
+        yield node.cond
+
+    def visitBreak(self, node):
+        pass
+
+    def visitContinue(self, node):
+        pass
+
+    def visitIntLit(self, node):
+        pass
+
+    def visitUnary(self, node):
+        yield node.operand
+
+    def visitCast(self, node):
+        yield node.operand
+
+    def visitBinary(self, node):
+        yield node.lhs
+        yield node.rhs
+
+    def visitAssign(self, node):
+        yield node.lhs
+        yield node.rhs
+
+    def visitCond(self, node):
+        yield node.cond
+        yield node.th
+        yield node.el
+
+    def visitCall(self, node):
+        for arg in node.args:
+            yield arg
+
+    def visitIndex(self, node):
+        yield node.base
+        yield node.index
 
 
 class Variable:
@@ -199,19 +262,15 @@ class Variable:
     Variable with name, id, offset.
     Offset here is used for positioning variable place in stack
     """
-    _varTable = {}
 
-    def __init__(self, name: str, offset: int, size: int = 4):
+    def __init__(self, name: str, offset: int, size: int = 4, id: int = 0):
         """
         name : the name of the variable
         offset: the position offset of the variable  to fp (usually negative)
-        id: to identify different variable in different scopes with same name
+        size: the size of the variable in bytes
+        id: to identify different variable in different scopes with same name, given by NameParser.new_var
         """
-        if name not in self._varTable:
-            self._varTable[name] = 0
-        else:
-            self._varTable[name] += 1
-        self.id = self._varTable[name]  # a(0) and a(1) are different variables in different scopes
+        self.id = id  # a(0) and a(3) are different variables in different scopes
         self.name = name
         self.offset = offset
         self.size = size
@@ -231,22 +290,25 @@ class Variable:
 
 class NameManager:
     """
-    NameManager
+    NameManager of one function
     Referenced to TA's implementation
     """
 
-    def __init__(self):
-        self.term2Var = {}  # mappping from term -> Variable
-        self.blockSlots = {}  # mapping CompoundContext/ForDeclStmtContext -> int(cnt of variables in the block)
+    def __init__(self, size: int):
+        """
+        size: the size of the function, see syntax.py
+        """
+        self.term2Var = SideTable(size)  # mappping from term -> Variable
+        self.blockSlots = SideTable(size)  # mapping Compound/For/FuncDef node -> int(cnt of variables in the block)
 
-    def bind(self, term: antlr4.tree.Tree.TerminalNodeImpl, var: Variable):
+    def bind(self, term: Node, var: Variable):
         """
-        create mapping from term to variable
+        create mapping from term (a Declaration or Ident node) to variable
         """
         # print('bind', term, term.__repr__())
         self.term2Var[term] = var
 
-    def __getitem__(self, term: antlr4.tree.Tree.TerminalNodeImpl):
+    def __getitem__(self, term: Node):
         """
         return the corresponding variable of the term
         """
@@ -260,83 +322,94 @@ class StackedScopeManager:
     Scope Manager
     Reference to TA's implementation
 
+    one dict of the visible variables, updated in place: a definition logs the variable it shadows, and leaving
+    a scope undoes the definitions made in it, so entering and leaving a scope cost O(1) besides the
+    definitions themselves
     """
 
     def __init__(self):
-        """
-        contains 2 list of dict
-        the dict have variable name as key, the variable object as the value
-        """
-        self.globalScope = [{}]  # global var scope list (accumulative)
-        self.currentScope = [{}]  # local var scope list
-        self.isFuncList = []  # the list for if the current scope and previous scope is a function scope
-        self.isMainList = []  # the list for if the current scope and previous scope is a main function scope
+        self.visible = {}  # variable name -> the Variable it refers to now
+        self.undoLog = []  # (name, the Variable it referred to before or None) of every definition in a scope
+        self.marks = []  # length of undoLog when each scope was entered
+        self.defined = [set()]  # names defined in each scope, the first one is the global scope
+        self.isFuncList = [False]  # for each scope, if it is a function scope
+        self.isMainList = [False]  # for each scope, if it is the scope of main
+        self.inherits = [False]  # for each scope, if the names visible when it was entered count as defined in it
 
     def __repr__(self):
         return self.__str__()
 
     def __str__(self):
-        return '\nglobalScope: ' + str(self.globalScope) + '\n' + 'currentScope:' + str(self.currentScope)
+        return f"visible: {self.visible}\ndefined: {self.defined}"
 
     def __getitem__(self, name: str):
         """
         return the Variable object corresponding to the variable name
         """
-        return self.globalScope[-1][name]
+        return self.visible[name]
 
     def __setitem__(self, name: str, value: Variable):
         """
-        set the mapping from name to the Variable object
+        define name in the current scope
         """
-        self.currentScope[-1][name] = self.globalScope[-1][name] = value
+        if self.marks:  # nothing is undone in the global scope
+            self.undoLog.append((name, self.visible.get(name)))
+        self.visible[name] = value
+        self.defined[-1].add(name)
 
     def __contains__(self, name: str):
         """
         check if the variable name is in the whole scope
         for undefined reference check
         """
-        return name in self.globalScope[-1]
+        return name in self.visible
 
     def __len__(self):
-        return len(self.globalScope[-1])
+        return len(self.visible)
 
     def push(self, is_func=False, isMain=False):
         """
-        copy the previous global scope element to the new global scope element
-        create the empty current scope element
+        enter a new scope
+
+        if the previous scope is a function except main function, then the parameter list (and everything
+        visible there) should be considered in the current function scope
+
+        if the previous scope is main function, since main functions do not have arguments in minidecaf,
+        we shouldn't include the previous variable scope into current (or the global vars will be considered
+        as main function scope variables.
         """
+        self.inherits.append(self.isFuncList[-1] and not self.isMainList[-1])
         self.isFuncList.append(is_func)
         self.isMainList.append(isMain)
-        if len(self.isFuncList) > 1 and self.isFuncList[-2] and not self.isMainList[-2]:
-            """
-            if the previous scope is a function except main function, then the parameter list should be considered in 
-            the current function scope
-            
-            if the previous scope is main function, since main functions do not have arguments in minidecaf, 
-            we shouldn't include the previous variabel scope into current (or the global vars will be considered 
-            as main function scope variables.
-            """
-            self.currentScope.append(deepcopy(self.globalScope[-1]))
-        else:
-            self.currentScope.append({})
-
-        self.globalScope.append(deepcopy(self.globalScope[-1]))
+        self.defined.append(set())
+        self.marks.append(len(self.undoLog))
 
     def pop(self):
         """
-        pop out the global scope and current scope in the current block
+        leave the current scope, the variables defined in it are no longer visible
         """
-        assert len(self.globalScope) > 1
-        self.globalScope.pop()
-        self.currentScope.pop()
+        assert self.marks
+        mark = self.marks.pop()
+        undoLog, visible = self.undoLog, self.visible
+        while len(undoLog) > mark:
+            name, previous = undoLog.pop()
+            if previous is None:
+                del visible[name]
+            else:
+                visible[name] = previous
+        self.defined.pop()
+        self.inherits.pop()
         self.isFuncList.pop()
+        self.isMainList.pop()
 
-    def current_scope_dict(self, last=0):
+    def defined_in_current(self, name: str):
         """
-        return current scope vars
+        check if name is defined in the current scope
         for redefinition check
         """
-        return self.currentScope[-1 - last]
+        if self.inherits[-1]:
+            return name in self.visible
+        return name in self.defined[-1]
 
 
 class ParamInfo:
@@ -362,25 +435,12 @@ class FuncInfo:
         self.nameManager = {}  # str -> NameManager. Initialized by Def.
         self.paramInfos = {}  # str -> ParamInfo. Fixed by Def; can be initialized by Decl.
         self.globInfos = {}  # Variable -> GlobInfo.
-        self.term2Var = {} # term -> Var
         self.globs = {}  # str -> GlobInfo
-        self.globsTerm2Var = {}  # term -> Var
 
     def enter_function(self, func: str, funcNameInfo: NameManager, paramInfo: ParamInfo):
         self.nameManager[func] = funcNameInfo
         self.paramInfos[func] = paramInfo
 
-    def freeze(self):
-        """
-        get all the used function vars into term2Var
-        :return: None
-        """
-        for funcNameInfo in self.nameManager.values():
-            self.term2Var.update(funcNameInfo.term2Var)
-
-    def __getitem__(self, ctx):
-        return self.term2Var[ctx]
-
 
 class GlobInfo:
     """
@@ -0,0 +1,348 @@
+"""
+Analyses of the control-flow graph of a TACFunc (see tac.py), used by ssa.py and the passes of opt.py
+an AnalysisManager computes an analysis of its function when it is first asked for and keeps it until it is
+invalidated. The passes on the three-address IR return the analyses they preserved (see passes.py):
+ALL_ANALYSES when they changed nothing, CFG_ANALYSES when they only changed instructions, NO_ANALYSES when
+they changed the graph; the others are dropped. See analysis_counters for how often they were reused.
+
+the sets of registers of liveness and reaching definitions are ints used as bitsets: the register %n is bit n
+(the numbers of a function are dense, see TACFunc.new_reg), a definition the bit of its index in defs.
+"""
+import sys
+
+from minidecaf.tac import Phi
+
+# analysis -> {"hits": asked for and kept, "misses": computed, "invalidations": dropped by a pass}
+analysis_counters = {}
+
+
+def reverse_postorder(func):
+    """
+    :return: the blocks reachable from the entry, in reverse postorder
+    """
+    return _reverse_postorder(func.blocks[0], lambda block: block.succs)
+
+
+def _reverse_postorder(root, succs):
+    order = []
+    seen = {root}
+    stack = [(root, iter(succs(root)))]
+    while stack:
+        node, it = stack[-1]
+        for succ in it:
+            if succ not in seen:
+                seen.add(succ)
+                stack.append((succ, iter(succs(succ))))
+                break
+        else:
+            stack.pop()
+            order.append(node)
+    order.reverse()
+    return order
+
+
+def immediate_dominators(order, preds):
+    """
+    the iterative algorithm of Cooper, Harvey and Kennedy
+
+    :param order: the nodes reachable from the root in reverse postorder, the root first
+    :param preds: preds(node) -> its predecessors
+    :return: node -> its immediate dominator, the root being its own
+    """
+    number = {node: i for i, node in enumerate(order)}
+    root = order[0]
+    idom = {root: root}
+
+    def intersect(a, b):
+        while a is not b:
+            while number[a] > number[b]:
+                a = idom[a]
+            while number[b] > number[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for node in order[1:]:
+            new = None
+            for pred in preds(node):
+                if pred in idom:
+                    new = pred if new is None else intersect(pred, new)
+            if idom.get(node) is not new:
+                idom[node] = new
+                changed = True
+    return idom
+
+
+def dominators(func):
+    """
+    :return: (the blocks in reverse postorder, block -> its immediate dominator, the entry being its own)
+    """
+    order = reverse_postorder(func)
+    return order, immediate_dominators(order, lambda block: block.preds)
+
+
+def dominance_frontiers(order, idom):
+    """
+    :return: block -> the blocks in its dominance frontier
+    """
+    frontiers = {block: {} for block in order}  # dicts as ordered sets, so that the output is always the same
+    for block in order:
+        preds = [pred for pred in block.preds if pred in idom]
+        if len(preds) < 2:
+            continue
+        for pred in preds:
+            runner = pred
+            while runner is not idom[block]:
+                frontiers[runner][block] = None
+                runner = idom[runner]
+    return frontiers
+
+
+class DomTree:
+    """
+    the dominator tree of the blocks reachable from the entry
+    """
+
+    def __init__(self, func, analyses):
+        self.order = analyses.get("rpo")
+        self.idom = immediate_dominators(self.order, lambda block: block.preds)
+        self.children = {block: [] for block in self.order}
+        for block in self.order[1:]:
+            self.children[self.idom[block]].append(block)
+        # a dominates b iff the walk of the tree enters a before b and leaves it after b
+        self._enter, self._leave = {}, {}
+        clock = 0
+        work = [(self.order[0], False)]
+        while work:
+            block, leaving = work.pop()
+            clock += 1
+            if leaving:
+                self._leave[block] = clock
+                continue
+            self._enter[block] = clock
+            work.append((block, True))
+            work.extend((child, False) for child in reversed(self.children[block]))
+
+    def dominates(self, a, b):
+        return self._enter[a] <= self._enter[b] and self._leave[b] <= self._leave[a]
+
+
+class _Exit:
+    succs = preds = ()
+    label = "exit"
+
+
+EXIT = _Exit()  # the virtual block the returning blocks go on to
+
+
+class PostDomTree:
+    """
+    ipdom: block -> its immediate postdominator, EXIT for the blocks ending in a return; the blocks from which
+    no path returns (an endless loop) are left out
+    """
+
+    def __init__(self, func, analyses):
+        returning = [block for block in func.blocks if not block.succs]
+        order = _reverse_postorder(EXIT, lambda node: returning if node is EXIT else node.preds)
+        self.ipdom = immediate_dominators(order, lambda node: node.succs or [EXIT])
+        del self.ipdom[EXIT]
+
+    def postdominates(self, a, b):
+        """
+        :return: whether every path from b to the exit goes through a
+        """
+        while b is not None and b is not EXIT:
+            if b is a:
+                return True
+            b = self.ipdom.get(b)
+        return False
+
+
+class Loop:
+    def __init__(self, header):
+        self.header = header
+        self.blocks = {header}
+        self.parent = None
+        self.depth = 1
+
+
+class LoopInfo:
+    """
+    the natural loops, a loop being the blocks of every back edge (an edge to a block dominating its source)
+    to the same header; loopOf maps a block to the innermost loop it is in
+    """
+
+    def __init__(self, func, analyses):
+        dom = analyses.get("dominators")
+        loops = {}
+        for block in dom.order:
+            for succ in block.succs:
+                if succ in dom.idom and dom.dominates(succ, block):
+                    loop = loops.get(succ)
+                    if loop is None:
+                        loop = loops[succ] = Loop(succ)
+                    work = [block]
+                    while work:
+                        member = work.pop()
+                        if member not in loop.blocks:
+                            loop.blocks.add(member)
+                            work.extend(pred for pred in member.preds if pred in dom.idom)
+        self.loops = sorted(loops.values(), key=lambda loop: -len(loop.blocks))  # the outer ones first
+        self.loopOf = {}
+        for loop in self.loops:
+            loop.parent = self.loopOf.get(loop.header)
+            if loop.parent is not None:
+                loop.depth = loop.parent.depth + 1
+            for block in loop.blocks:
+                self.loopOf[block] = loop
+
+    def depth(self, block):
+        loop = self.loopOf.get(block)
+        return 0 if loop is None else loop.depth
+
+
+class Liveness:
+    """
+    liveIn, liveOut: block -> the registers live at its start and end, as a bitset
+    in SSA form a phi uses its value at the end of the predecessor it comes from, and defines its register at
+    the start of its block
+    """
+
+    def __init__(self, func, analyses):
+        order = analyses.get("rpo")
+        uses, defs = {}, {}
+        phi_uses = {block: 0 for block in order}  # live out of the predecessors of phis
+        for block in order:
+            use = defined = 0
+            for instr in block.instrs:
+                if instr.__class__ is Phi:
+                    for pred, reg in instr.incoming.items():
+                        if pred in phi_uses:
+                            phi_uses[pred] |= 1 << reg.n
+                else:
+                    for reg in instr.args:
+                        bit = 1 << reg.n
+                        if not defined & bit:
+                            use |= bit
+                if instr.dst is not None:
+                    defined |= 1 << instr.dst.n
+            uses[block], defs[block] = use, defined
+        self.liveIn = dict.fromkeys(order, 0)
+        self.liveOut = dict.fromkeys(order, 0)
+        postorder = order[::-1]
+        changed = True
+        while changed:
+            changed = False
+            for block in postorder:
+                out = phi_uses[block]
+                for succ in block.succs:
+                    out |= self.liveIn[succ]
+                live_in = uses[block] | (out & ~defs[block])
+                if live_in != self.liveIn[block] or out != self.liveOut[block]:
+                    self.liveIn[block], self.liveOut[block] = live_in, out
+                    changed = True
+
+
+class ReachingDefinitions:
+    """
+    defs: the instructions defining a register; reachIn, reachOut: block -> the definitions reaching its start
+    and end, as a bitset of their indices in defs
+    """
+
+    def __init__(self, func, analyses):
+        order = analyses.get("rpo")
+        self.defs = []
+        self.defsOf = {}  # register -> the bitset of its definitions
+        gens, kills = {}, {}
+        for block in order:
+            last = {}
+            for instr in block.instrs:
+                if instr.dst is not None:
+                    bit = 1 << len(self.defs)
+                    self.defs.append(instr)
+                    self.defsOf[instr.dst] = self.defsOf.get(instr.dst, 0) | bit
+                    last[instr.dst] = bit
+            gens[block] = sum(last.values())
+            kills[block] = list(last)
+        kills = {block: sum(self.defsOf[reg] for reg in regs) & ~gens[block] for block, regs in kills.items()}
+        self.reachIn = dict.fromkeys(order, 0)
+        self.reachOut = dict(gens)
+        changed = True
+        while changed:
+            changed = False
+            for block in order:
+                reach_in = 0
+                for pred in block.preds:
+                    reach_in |= self.reachOut.get(pred, 0)
+                out = gens[block] | (reach_in & ~kills[block])
+                if reach_in != self.reachIn[block] or out != self.reachOut[block]:
+                    self.reachIn[block], self.reachOut[block] = reach_in, out
+                    changed = True
+
+    def reaching(self, block):
+        """
+        :return: the instructions whose definition reaches the start of block
+        """
+        mask = self.reachIn[block]
+        return [instr for i, instr in enumerate(self.defs) if mask >> i & 1]
+
+
+def _frontiers(func, analyses):
+    dom = analyses.get("dominators")
+    return dominance_frontiers(dom.order, dom.idom)
+
+
+ANALYSES = {
+    "rpo": lambda func, analyses: reverse_postorder(func),
+    "dominators": DomTree,
+    "frontiers": _frontiers,
+    "postdominators": PostDomTree,
+    "loops": LoopInfo,
+    "liveness": Liveness,
+    "reaching-defs": ReachingDefinitions,
+}
+ALL_ANALYSES = frozenset(ANALYSES)
+CFG_ANALYSES = frozenset(["rpo", "dominators", "frontiers", "postdominators", "loops"])  # depend on the edges only
+NO_ANALYSES = frozenset()
+for _name in ANALYSES:
+    analysis_counters[_name] = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+class AnalysisManager:
+    """
+    the analyses of one function, see the module docstring
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.results = {}
+
+    def get(self, name: str):
+        result = self.results.get(name)
+        if result is not None:
+            analysis_counters[name]["hits"] += 1
+            return result
+        analysis_counters[name]["misses"] += 1
+        result = self.results[name] = ANALYSES[name](self.func, self)
+        return result
+
+    def invalidate(self, preserved=NO_ANALYSES):
+        """
+        drop every analysis but the preserved ones
+        """
+        for name in [name for name in self.results if name not in preserved]:
+            del self.results[name]
+            analysis_counters[name]["invalidations"] += 1
+
+
+def print_counters(out=sys.stderr):
+    hits = misses = 0
+    for name, counts in analysis_counters.items():
+        for kind, value in counts.items():
+            print(f"minidecaf_analysis_{name}_{kind} {value}", file=out)
+        hits += counts["hits"]
+        misses += counts["misses"]
+    print(f"minidecaf_analysis_hit_rate {hits / (hits + misses) if hits + misses else 0:.3f}", file=out)
+
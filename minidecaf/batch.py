@@ -0,0 +1,103 @@
+"""
+Batch compilation
+compile many MiniDecaf sources in one go, spreading them over a pool of worker processes.
+Every worker imports the generated lexer/parser once and keeps them (and their warm DFA caches)
+for all the files it is handed.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import antlr4
+
+from minidecaf.main import compile_ir, compile_asm, render_tac
+
+
+def collect_sources(src_dir: str):
+    """
+    find all the .c files under src_dir, in a stable order
+    """
+    sources = []
+    for root, dirs, files in os.walk(src_dir):
+        dirs.sort()
+        sources.extend(os.path.join(root, f) for f in sorted(files) if f.endswith('.c'))
+    return sources
+
+
+def output_path(infile: str, emit_ir=False):
+    """
+    foo/bar.c -> foo/bar.S (or foo/bar.ir when emitting ir)
+    """
+    return os.path.splitext(infile)[0] + ('.ir' if emit_ir else '.S')
+
+
+def compile_one(infile: str, emit_ir=False, passes=None, frontend="antlr", semantic="split", parse_mode="sll",
+                ssa=False):
+    """
+    compile a single file of the batch, never raises
+    :param passes: see AsmGenerator
+    :param frontend, semantic, parse_mode: see compile_ir
+    :param ssa: with emit_ir, write the three-address IR in SSA form, as -ir --ssa does
+
+    :return (infile, ok, message, seconds):
+    """
+    start = time.perf_counter()
+    outfile = output_path(infile, emit_ir)
+    try:
+        if emit_ir:
+            ir = compile_ir(antlr4.FileStream(infile), parse_mode=parse_mode, frontend=frontend, semantic=semantic)
+            with open(outfile, 'w') as f:
+                if ssa:
+                    f.write(render_tac(ir, passes))
+                else:
+                    print(ir, file=f)
+        else:
+            compile_asm(antlr4.FileStream(infile), outfile, parse_mode=parse_mode, frontend=frontend,
+                        semantic=semantic, passes=passes)
+        return infile, True, outfile, time.perf_counter() - start
+    except Exception as e:
+        if os.path.exists(outfile):
+            os.remove(outfile)  # do not leave half written output behind
+        message = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        return infile, False, message.split('\n')[0], time.perf_counter() - start
+
+
+def _compile_job(job):
+    return compile_one(*job)
+
+
+def run_batch(src_dir: str, jobs=1, emit_ir=False, out=sys.stdout, passes=None, frontend="antlr", semantic="split",
+              parse_mode="sll", ssa=False):
+    """
+    compile every source under src_dir and print a per-file summary
+
+    :param src_dir:
+    :param jobs: number of worker processes, 1 compiles in this process
+    :param emit_ir:
+    :param out: where the summary goes
+    :param passes: the PassManager of every file, see AsmGenerator
+    :param frontend, semantic, parse_mode, ssa: see compile_one
+    :return: 0 if every file compiled, 1 otherwise
+    """
+    sources = collect_sources(src_dir)
+    job_list = [(src, emit_ir, passes, frontend, semantic, parse_mode, ssa) for src in sources]
+    if jobs <= 1 or len(sources) <= 1:
+        results = map(_compile_job, job_list)
+        failed = _summarize(results, out)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            failed = _summarize(pool.map(_compile_job, job_list), out)
+    print(f"{len(sources) - failed} succeeded, {failed} failed", file=out)
+    return 0 if failed == 0 else 1
+
+
+def _summarize(results, out):
+    failed = 0
+    for infile, ok, message, seconds in results:
+        if ok:
+            print(f"OK   {infile} ({seconds:.3f}s)", file=out)
+        else:
+            failed += 1
+            print(f"FAIL {infile} ({seconds:.3f}s): {message}", file=out)
+    return failed
@@ -0,0 +1,171 @@
+"""
+Content addressed cache of compiler output
+the key is a hash of the source bytes, the compiler itself and the options (like -ir), so a hit can be
+returned without lexing or parsing anything.
+
+layout of the cache dir:
+    ab/abcdef...   one file per entry, named by its key
+    stats.json     hit/miss/store/eviction counters and the total size of the entries
+    lock           flock'ed while stats.json is updated or entries are evicted
+entries are written to a temp file and renamed into place, so several processes can share one cache.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024  # bytes
+
+_compiler_version = None
+
+
+def compiler_version():
+    """
+    a hash of the compiler's own sources and grammar, so entries never outlive a change of the compiler
+    """
+    global _compiler_version
+    if _compiler_version is None:
+        h = hashlib.sha256()
+        pkg_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(pkg_dir)):
+            if name.endswith('.py') or name.endswith('.g4'):
+                with open(os.path.join(pkg_dir, name), 'rb') as f:
+                    h.update(name.encode() + b'\0' + f.read())
+        _compiler_version = h.hexdigest()
+    return _compiler_version
+
+
+class CompileCache:
+    """
+    on-disk cache: key -> compiled text, with a size cap and LRU eviction
+    """
+    STAT_NAMES = ["hits", "misses", "stores", "evictions", "bytes"]
+
+    def __init__(self, cache_dir: str, max_size=DEFAULT_CACHE_SIZE):
+        self.dir = cache_dir
+        self.maxSize = max_size
+        os.makedirs(self.dir, exist_ok=True)
+
+    def key(self, source: bytes, **options):
+        """
+        hash the source bytes together with the compiler version and the options
+        """
+        h = hashlib.sha256()
+        h.update(compiler_version().encode())
+        h.update(json.dumps(options, sort_keys=True).encode())
+        h.update(source)
+        return h.hexdigest()
+
+    def _path(self, key: str):
+        return os.path.join(self.dir, key[:2], key)
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.dir, "lock"), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_stats(self):
+        try:
+            with open(os.path.join(self.dir, "stats.json")) as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            stats = {}
+        return {name: stats.get(name, 0) for name in self.STAT_NAMES}
+
+    def _write_stats(self, stats):
+        self._atomic_write(os.path.join(self.dir, "stats.json"), json.dumps(stats))
+
+    def _count(self, **deltas):
+        with self._locked():
+            stats = self._read_stats()
+            for name, delta in deltas.items():
+                stats[name] += delta
+            self._write_stats(stats)
+        return stats
+
+    def _atomic_write(self, path: str, text):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb' if isinstance(text, bytes) else 'w') as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def get(self, key: str, binary=False):
+        """
+        :param binary: the entry was put as bytes
+        :return: the cached text, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb' if binary else 'r') as f:
+                text = f.read()
+        except OSError:
+            self._count(misses=1)
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass  # evicted by another process meanwhile, the text we read is still fine
+        self._count(hits=1)
+        return text
+
+    def put(self, key: str, text):
+        """
+        :param text: str, or bytes read back with get(key, binary=True)
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        existed = os.path.exists(path)
+        self._atomic_write(path, text)
+        added = 0 if existed else os.path.getsize(path)
+        stats = self._count(stores=1, bytes=added)
+        if stats["bytes"] > self.maxSize:
+            self.evict()
+
+    def evict(self):
+        """
+        remove the least recently used entries until the cache fits in maxSize again
+        """
+        with self._locked():
+            entries = []
+            for sub in os.listdir(self.dir):
+                sub_dir = os.path.join(self.dir, sub)
+                if not os.path.isdir(sub_dir):
+                    continue
+                for name in os.listdir(sub_dir):
+                    if name.startswith(".tmp-"):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(sub_dir, name))
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, os.path.join(sub_dir, name)))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            evicted = 0
+            for _, size, path in entries:
+                if total <= self.maxSize:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                evicted += 1
+            stats = self._read_stats()
+            stats["bytes"] = total  # resync with what is really on disk
+            stats["evictions"] += evicted
+            self._write_stats(stats)
+
+    def stats(self):
+        with self._locked():
+            return self._read_stats()
@@ -0,0 +1,79 @@
+"""
+Thin client for the compile server (see server.py)
+it has the same interface as `python -m minidecaf infile outfile -ir`, but only sends the source text
+to a running server, so no antlr4 or generated parser is imported here.
+
+usage: python -m minidecaf.client infile [outfile] [-ir] [--socket PATH]
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+
+
+def default_socket_path():
+    """
+    MINIDECAF_SOCKET if set, otherwise a per-user socket in the temp dir
+    """
+    return os.environ.get("MINIDECAF_SOCKET", f"/tmp/minidecaf-{os.getuid()}.sock")
+
+
+def send_request(request: dict, socket_path=None):
+    """
+    send one json request line to the server and return the decoded json response
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path or default_socket_path())
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+def compile_remote(source: str, emit_ir=False, socket_path=None, opt_level=0):
+    """
+    compile source text on the server
+    :param opt_level: the -O level, see passes.py
+    :return: the assembly (or ir) text
+    """
+    response = send_request({"source": source, "ir": emit_ir, "opt": opt_level}, socket_path)
+    if not response["ok"]:
+        raise Exception(response["error"])
+    return response["output"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MiniDecaf compile server client")
+    parser.add_argument("infile", type=str,
+                        help="the input C file")
+    parser.add_argument("outfile", type=str, nargs="?",
+                        help="the output assembly file")
+    parser.add_argument("-ir", action="store_true", help="emit ir rather than asm")
+    parser.add_argument("-O", type=int, choices=[0, 1, 2], default=0, dest="opt_level", metavar="LEVEL",
+                        help="optimization level, as for main()")
+    parser.add_argument("--socket", type=str, default=None,
+                        help="the server socket, defaults to $MINIDECAF_SOCKET or " + default_socket_path())
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.infile) as f:
+        source = f.read()
+    try:
+        output = compile_remote(source, args.ir, args.socket, args.opt_level)
+    except OSError as e:
+        print(f"cannot reach compile server: {e}", file=sys.stderr)
+        sys.exit(2)
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if args.ir or args.outfile is None:  # ir always goes to stdout, like main()
+        sys.stdout.write(output)
+    else:
+        with open(args.outfile, 'w') as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+In-process library API
+
+    from minidecaf.compiler import Compiler
+    asm = Compiler().compile_string("int main() { return 0; }")
+
+A Compiler can be kept around and called many times, also from several threads at once:
+every call builds its own lexer, parser and passes, and only the DFA caches of the generated
+lexer/parser (which warm up over the calls) are shared.
+"""
+import threading
+
+import antlr4
+
+from minidecaf.main import my_lexer, my_parser, name_parse, check_type, gen_ir, render_asm
+from minidecaf.syntax import lower
+
+# the generated lexer/parser keep their DFA caches in class attributes shared by every instance,
+# and the python runtime does not guard their updates, so lexing + parsing is done one at a time
+_antlr_lock = threading.Lock()
+
+
+class Compiler:
+    """
+    reusable, thread-safe compiler object
+    sources can be str, bytes, bytearray or memoryview (utf-8)
+    frontend is "antlr" or "fast", see main.parse_tree
+    passes is the PassManager the assembly is generated with (see passes.py), None for -O0
+    with compact_ir, compile_to_ir packs the instructions of every function (see ircode.py)
+    """
+
+    def __init__(self, encoding="utf-8", frontend="antlr", passes=None, compact_ir=False):
+        self.encoding = encoding
+        self.frontend = frontend
+        self.passes = passes
+        self.compactIR = compact_ir
+
+    def _input_stream(self, src):
+        if isinstance(src, memoryview):
+            src = src.tobytes()
+        if isinstance(src, (bytes, bytearray)):
+            src = src.decode(self.encoding)
+        if not isinstance(src, str):
+            raise TypeError(f"cannot compile a {type(src).__name__}")
+        return antlr4.InputStream(src)
+
+    def parse(self, src):
+        """
+        :return: the ANTLR parse tree of src
+        """
+        input_stream = self._input_stream(src)
+        if self.frontend == "fast":  # shares nothing between the calls
+            from minidecaf.fastparser import fast_parse
+            return fast_parse(input_stream.strdata)
+        with _antlr_lock:
+            return my_parser(my_lexer(input_stream))
+
+    def compile_to_ir(self, src):
+        """
+        :return: the IRContainer of src
+        """
+        program = lower(self.parse(src))
+        name_manager = name_parse(program)
+        type_info = check_type(program, name_manager)
+        return gen_ir(program, name_manager, type_info, release=True, compact=self.compactIR)
+
+    def compile_string(self, src, passes=None):
+        """
+        :param passes: the PassManager for this call, self.passes if None
+        :return: the assembly of src, the same text main() writes
+        """
+        return render_asm(self.compile_to_ir(src), passes or self.passes)
@@ -0,0 +1,510 @@
+"""
+Hand-written frontend, used with --frontend=fast
+a lexer and a recursive descent parser in plain python, which build the same parse tree as the generated
+ANTLR lexer/parser (MiniDecafParser.*Context objects, TerminalNodeImpl leaves), so NameParser, Typer and
+IRGenerator run on it unchanged. It skips the adaptive prediction of the ANTLR runtime, which is where
+most of the time of a large file goes.
+
+- tokenize(): one regex match per token; the token types of the keywords and punctuation are taken from
+  the literal table of the generated parser, so they always agree with MiniDecaf.g4/CommonLex.g4.
+- FastParser: one method per grammar rule, every decision takes one or two tokens of lookahead, except
+  the binary operators, which are parsed by precedence climbing over BINARY_LEVELS and then dressed up as
+  the chain of left recursive rules ANTLR would have built. The descent runs on an explicit stack rather
+  than the python one, see FastParser.
+
+The grammar is ambiguous in a few places (the optional ';' at the end of a declaration, ';' alone as a
+statement, the dangling else), the parser resolves them as ANTLR does.
+"""
+import re
+import sys
+
+from antlr4.Token import CommonToken, Token
+from antlr4.tree.Tree import TerminalNode, TerminalNodeImpl
+
+from minidecaf.generated.MiniDecafParser import MiniDecafParser as P
+from minidecaf.syntax import drive, without_gc
+
+LITERALS = {name[1:-1]: ttype for ttype, name in enumerate(P.literalNames) if name.startswith("'")}
+KEYWORDS = {text: ttype for text, ttype in LITERALS.items() if text[0].isalpha()}
+_PUNCTUATION = sorted((text for text in LITERALS if not text[0].isalpha()), key=len, reverse=True)
+# group 1: Integer, group 2: Ident or keyword, group 3: punctuation
+_TOKEN = re.compile(r"[ \t\n\r]*(?:([0-9]+)|([A-Za-z_][0-9A-Za-z_]*)|(%s))" % "|".join(map(re.escape, _PUNCTUATION)))
+_SPACE = re.compile(r"[ \t\n\r]*")
+
+INT, MAIN = LITERALS['int'], LITERALS['main']
+LPAREN, RPAREN, LBRACE, RBRACE, LBRACKET, RBRACKET = (LITERALS[t] for t in "(){}[]")
+SEMI, COMMA, STAR, ASSIGN, QUESTION, COLON = (LITERALS[t] for t in ";,*=?:")
+RETURN, IF, ELSE, FOR, WHILE, DO, BREAK, CONTINUE = \
+    (LITERALS[t] for t in ["return", "if", "else", "for", "while", "do", "break", "continue"])
+UNARY_OPS = {LITERALS[t] for t in "-!~*&"}
+EXPR_START = UNARY_OPS | {P.Integer, P.Ident, LPAREN}
+
+# the binary operator rules from the loosest to the tightest: the operators, the context of the operator and
+# the contexts of the rule without and with an operator; the operands of the last level are casts
+BINARY_LEVELS = [
+    (["||"], P.OrOpContext, P.TLorContext, P.CLorContext),
+    (["&&"], P.AndOpContext, P.TLandContext, P.CLandContext),
+    (["==", "!="], P.EqOpContext, P.TEqContext, P.CEqContext),
+    (["<", ">", "<=", ">="], P.RelOpContext, P.TRelContext, P.CRelContext),
+    (["+", "-"], P.AddOpContext, P.TAddContext, P.CAddContext),
+    (["*", "/", "%"], P.MulOpContext, P.TMulContext, P.CMulContext),
+]
+_LEVEL_OF = {LITERALS[op]: level for level, (ops, *_) in enumerate(BINARY_LEVELS) for op in ops}
+_CAST_LEVEL = len(BINARY_LEVELS)
+
+
+class ParseError(Exception):
+    """
+    syntax error found by FastParser
+    """
+
+
+class FastToken(Token):
+    __slots__ = ()
+
+    def __init__(self, ttype: int, text: str, start: int, line: int, column: int, index: int):
+        self.source = CommonToken.EMPTY_SOURCE
+        self.type = ttype
+        self.channel = Token.DEFAULT_CHANNEL
+        self.start = start
+        self.stop = start + len(text) - 1
+        self.tokenIndex = index
+        self.line = line
+        self.column = column
+        self._text = text
+
+
+def tokenize(text: str, err=sys.stderr):
+    """
+    the tokens of text, ending with EOF
+    like the ANTLR lexer, a character no token starts with is reported to err and skipped
+    """
+    tokens = []
+    match = _TOKEN.match
+    pos, end = 0, len(text)
+    line, line_start = 1, 0
+    while True:
+        m = match(text, pos)
+        if m is None:
+            start = _SPACE.match(text, pos).end()
+        else:
+            start = m.start(m.lastindex)
+        newlines = text.count('\n', pos, start)
+        if newlines:
+            line += newlines
+            line_start = text.rindex('\n', pos, start) + 1
+        if m is None:
+            if start == end:
+                break
+            print(f"line {line}:{start - line_start} token recognition error at: '{text[start]}'", file=err)
+            pos = start + 1
+            continue
+        group = m.lastindex
+        word = m.group(group)
+        if group == 1:
+            ttype = P.Integer
+        elif group == 2:
+            ttype = KEYWORDS.get(word, P.Ident)
+        else:
+            ttype = LITERALS[word]
+        tokens.append(FastToken(ttype, word, start, line, start - line_start, len(tokens)))
+        pos = m.end()
+    tokens.append(FastToken(Token.EOF, "<EOF>", end, line, end - line_start, len(tokens)))
+    return tokens
+
+
+def token_name(ttype: int):
+    if ttype == Token.EOF:
+        return "<EOF>"
+    if ttype < len(P.literalNames) and P.literalNames[ttype] != "<INVALID>":
+        return P.literalNames[ttype]
+    return P.symbolicNames[ttype]
+
+
+def _new(cls):
+    """
+    a context of cls without a parser, the same as cls(...) would build but without going through the
+    constructors, which copy a rule context into the context of one of its alternatives
+    """
+    ctx = cls.__new__(cls)
+    ctx.parser = None
+    ctx.parentCtx = None
+    ctx.invokingState = -1
+    ctx.exception = None
+    return ctx
+
+
+def _node(cls, children):
+    """
+    a context of cls with children below it
+    """
+    ctx = _new(cls)
+    ctx.children = children
+    for child in children:
+        child.parentCtx = ctx
+    first, last = children[0], children[-1]
+    ctx.start = first.symbol if isinstance(first, TerminalNode) else first.start
+    ctx.stop = last.symbol if isinstance(last, TerminalNode) else last.stop
+    return ctx
+
+
+def _itself(rule):
+    return rule
+
+
+class FastParser:
+    """
+    recursive descent parser over the tokens of tokenize()
+    the rules that can nest are generators that yield the generator of every rule they descend into and get
+    back its context, run on an explicit stack by syntax.drive(), so that no nesting of parentheses, unary
+    operators, assignments or statements is bounded by the recursion limit of python
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.types = [token.type for token in tokens]
+        self.pos = 0
+
+    def parse(self):
+        """
+        :return: the ProgContext
+        """
+        return without_gc(drive, self.prog(), _itself)
+
+    def parse_decls(self):
+        """
+        parse a run of top-level declarations, see parallel.py
+        :return: the FuncExternalDeclContext, DeclExternalDeclContext and MainFuncContext up to EOF
+        """
+        return without_gc(drive, self.decls(), _itself)
+
+    # tokens
+
+    def error(self, expected=None):
+        token = self.tokens[self.pos]
+        message = f"line {token.line}:{token.column} syntax error at '{token.text}'"
+        if expected is not None:
+            message += f", expected {token_name(expected)}"
+        raise ParseError(message)
+
+    def match(self, ttype: int):
+        if self.types[self.pos] != ttype:
+            self.error(ttype)
+        node = TerminalNodeImpl(self.tokens[self.pos])
+        self.pos += 1
+        return node
+
+    def _skip_ty(self, i: int):
+        """
+        the index of the token after the ty starting at i
+        """
+        if self.types[i] != INT:
+            self.pos = i
+            self.error(INT)
+        i += 1
+        while self.types[i] == STAR:
+            i += 1
+        return i
+
+    def _empty(self, cls):
+        """
+        an empty rule, ANTLR lets it start at the next token and stop at the previous one
+        """
+        ctx = _new(cls)
+        ctx.children = None
+        ctx.start = self.tokens[self.pos]
+        ctx.stop = self.tokens[self.pos - 1] if self.pos > 0 else None
+        return ctx
+
+    # declarations, every rule that can nest is a generator (see the class docstring)
+
+    def prog(self):
+        children = []
+        while self.types[self._skip_ty(self.pos)] != MAIN:
+            children.append((yield self.external_decl()))
+        children.append((yield self.main_func()))
+        while self.types[self.pos] != Token.EOF:
+            children.append((yield self.external_decl()))
+        children.append(self.match(Token.EOF))
+        return _node(P.ProgContext, children)
+
+    def decls(self):
+        children = []
+        while self.types[self.pos] != Token.EOF:
+            if self.types[self._skip_ty(self.pos)] == MAIN:
+                children.append((yield self.main_func()))
+            else:
+                children.append((yield self.external_decl()))
+        return children
+
+    def external_decl(self):
+        after_ty = self._skip_ty(self.pos)
+        if self.types[after_ty] == P.Ident and self.types[after_ty + 1] == LPAREN:
+            return _node(P.FuncExternalDeclContext, [(yield self.func())])
+        declaration = yield self.declaration(self._top_level_semicolon)
+        return _node(P.DeclExternalDeclContext, [declaration, self.match(SEMI)])
+
+    def main_func(self):
+        children = [self.ty(), self.match(MAIN), self.match(LPAREN), (yield self.param_list()), self.match(RPAREN),
+                    (yield self.compound())]
+        return _node(P.MainFuncContext, children)
+
+    def func(self):
+        children = [self.ty(), self.match(P.Ident), self.match(LPAREN), (yield self.param_list()),
+                    self.match(RPAREN)]
+        if self.types[self.pos] == LBRACE:
+            children.append((yield self.compound()))
+            return _node(P.FuncDefContext, children)
+        children.append(self.match(SEMI))
+        return _node(P.FuncDeclContext, children)
+
+    def param_list(self):
+        if self.types[self.pos] != INT:
+            return self._empty(P.ParamListContext)
+        children = [(yield self.declaration())]
+        while self.types[self.pos] == COMMA:
+            children += [self.match(COMMA), (yield self.declaration())]
+        return _node(P.ParamListContext, children)
+
+    def ty(self):
+        ty = _node(P.IntTypeContext, [self.match(INT)])
+        while self.types[self.pos] == STAR:
+            ty = _node(P.PtrTypeContext, [ty, self.match(STAR)])
+        return ty
+
+    def declaration(self, takes_semicolon=None):
+        """
+        :param takes_semicolon: decides whether the optional ';' at the end belongs to the declaration,
+            by default it does whenever there is one
+        """
+        children = [self.ty(), self.match(P.Ident)]
+        while self.types[self.pos] == LBRACKET:
+            children += [self.match(LBRACKET), self.match(P.Integer), self.match(RBRACKET)]
+        if self.types[self.pos] == ASSIGN:
+            children += [self.match(ASSIGN), (yield self.expr())]
+        if self.types[self.pos] == SEMI and (takes_semicolon is None or takes_semicolon()):
+            children.append(self.match(SEMI))
+        return _node(P.DeclarationContext, children)
+
+    def _top_level_semicolon(self):
+        # `declaration ';'`: only `;;` leaves a ';' for the external declaration
+        return self.types[self.pos + 1] == SEMI
+
+    def _for_init_semicolon(self):
+        # `declaration expr? ';' expr? ')'`: the ';' is the declaration's if another ';' comes before the ')'
+        depth = 0
+        for ttype in self.types[self.pos + 1:]:
+            if ttype == LPAREN:
+                depth += 1
+            elif ttype == RPAREN:
+                if depth == 0:
+                    return False
+                depth -= 1
+            elif ttype == SEMI and depth == 0 or ttype == Token.EOF:
+                return True
+        return True
+
+    # statements
+
+    def compound(self):
+        children = [self.match(LBRACE)]
+        while self.types[self.pos] != RBRACE:
+            item = yield (self.declaration() if self.types[self.pos] == INT else self.stmt())
+            children.append(_node(P.BlockItemContext, [item]))
+        children.append(self.match(RBRACE))
+        return _node(P.CompoundContext, children)
+
+    def _expr_opt(self, children):
+        """
+        the optional expr at the current token, appended to children if there
+        """
+        if self.types[self.pos] not in EXPR_START:
+            return None
+        expr = yield self.expr()
+        children.append(expr)
+        return expr
+
+    def _stmt_after(self, children, ttype: int):
+        """
+        the token ttype and the stmt after it, both appended to children
+
+        :return: the stmt
+        """
+        children.append(self.match(ttype))
+        stmt = yield self.stmt()
+        children.append(stmt)
+        return stmt
+
+    def stmt(self):
+        ttype = self.types[self.pos]
+        if ttype == RETURN:
+            children = [self.match(RETURN), (yield self.expr()), self.match(SEMI)]
+            return _node(P.ReturnStmtContext, children)
+        if ttype == IF:
+            children = [self.match(IF), self.match(LPAREN), (yield self.expr()), self.match(RPAREN),
+                        (yield self.stmt())]
+            th, el = children[-1], None
+            if self.types[self.pos] == ELSE:  # the dangling else goes to the innermost if
+                el = yield from self._stmt_after(children, ELSE)
+            ctx = _node(P.IfStmtContext, children)
+            ctx.th, ctx.el = th, el
+            return ctx
+        if ttype == LBRACE:
+            return _node(P.CmpdStmtContext, [(yield self.compound())])
+        if ttype == FOR:
+            return (yield self.for_stmt())
+        if ttype == WHILE:
+            children = [self.match(WHILE), self.match(LPAREN), (yield self.expr()), self.match(RPAREN),
+                        (yield self.stmt())]
+            return _node(P.WhileStmtContext, children)
+        if ttype == DO:
+            children = [self.match(DO), (yield self.stmt()), self.match(WHILE), self.match(LPAREN),
+                        (yield self.expr()), self.match(RPAREN), self.match(SEMI)]
+            return _node(P.DoWhileStmtContext, children)
+        if ttype == BREAK:
+            return _node(P.BreakStmtContext, [self.match(BREAK), self.match(SEMI)])
+        if ttype == CONTINUE:
+            return _node(P.ContinueStmtContext, [self.match(CONTINUE), self.match(SEMI)])
+        if ttype == SEMI:  # an exprStmt without expr rather than a nullStmt, ANTLR takes the first alternative
+            return _node(P.ExprStmtContext, [self.match(SEMI)])
+        if ttype in EXPR_START:
+            return _node(P.ExprStmtContext, [(yield self.expr()), self.match(SEMI)])
+        self.error()
+
+    def for_stmt(self):
+        children = [self.match(FOR), self.match(LPAREN)]
+        if self.types[self.pos] == INT:
+            cls = P.ForDeclStmtContext
+            init = yield self.declaration(self._for_init_semicolon)
+            children.append(init)
+        else:
+            cls = P.ForStmtContext
+            init = yield from self._expr_opt(children)
+            children.append(self.match(SEMI))
+        ctrl = yield from self._expr_opt(children)
+        children.append(self.match(SEMI))
+        post = yield from self._expr_opt(children)
+        children += [self.match(RPAREN), (yield self.stmt())]
+        ctx = _node(cls, children)
+        ctx.init, ctx.ctrl, ctx.post = init, ctrl, post
+        return ctx
+
+    # expressions
+
+    def expr(self):
+        return _node(P.ExprContext, [(yield self.assignment())])
+
+    def assignment(self):
+        # a unary followed by '=' is an assignment, otherwise the unary is the first operand of a conditional
+        if self.types[self.pos] == LPAREN and self.types[self.pos + 1] == INT:
+            first = yield self.cast()  # a cast is no unary, so cannot be assigned to
+        else:
+            unary = yield self.unary()
+            if self.types[self.pos] == ASSIGN:
+                children = [unary, _node(P.AsgnOpContext, [self.match(ASSIGN)]), (yield self.assignment())]
+                return _node(P.WithAsgnContext, children)
+            first = _node(P.TCastContext, [unary])
+        return _node(P.NoAsgnContext, [(yield self.conditional(first))])
+
+    def conditional(self, first=None):
+        """
+        :param first: the first cast of the conditional if it is already parsed
+        """
+        logical_or = yield self.binary(first)
+        if self.types[self.pos] != QUESTION:
+            return _node(P.NoCondContext, [logical_or])
+        children = [logical_or, self.match(QUESTION), (yield self.expr()), self.match(COLON),
+                    (yield self.conditional())]
+        return _node(P.WithCondContext, children)
+
+    def binary(self, first=None):
+        """
+        parse a logicalOr by precedence climbing
+
+        :return: the LogicalOrContext
+        """
+        tree = yield self._climb(first if first is not None else (yield self.cast()), 0)
+        return self._rule_of(tree, 0)
+
+    def _climb(self, lhs, min_level: int):
+        """
+        :return: a cast context, or (level, lhs, operator terminal, rhs) for a binary operation
+        """
+        types = self.types
+        while types[self.pos] in _LEVEL_OF and _LEVEL_OF[types[self.pos]] >= min_level:
+            level = _LEVEL_OF[types[self.pos]]
+            op = self.match(types[self.pos])
+            rhs = yield self.cast()
+            # the operators of the tighter levels bind the rhs first; all the levels are left associative
+            while types[self.pos] in _LEVEL_OF and _LEVEL_OF[types[self.pos]] > level:
+                rhs = yield self._climb(rhs, level + 1)
+            lhs = (level, lhs, op, rhs)
+        return lhs
+
+    def _rule_of(self, tree, level: int):
+        """
+        the context of the rule of level for a tree of _climb, wrapped in the contexts of the rules in between
+        """
+        if level == _CAST_LEVEL:
+            return tree
+        _, op_ctx, wrap_ctx, binary_ctx = BINARY_LEVELS[level]
+        # a+b+...+z is as deep as it is long on the lhs side, so that side is walked by a loop; the recursion
+        # only goes down the levels and into the rhs operands
+        spine = []
+        while isinstance(tree, tuple) and tree[0] == level:
+            _, tree, op, rhs = tree
+            spine.append((op, rhs))
+        ctx = _node(wrap_ctx, [self._rule_of(tree, level + 1)])
+        for op, rhs in reversed(spine):
+            ctx = _node(binary_ctx, [ctx, _node(op_ctx, [op]), self._rule_of(rhs, level + 1)])
+        return ctx
+
+    def cast(self):
+        if self.types[self.pos] == LPAREN and self.types[self.pos + 1] == INT:
+            children = [self.match(LPAREN), self.ty(), self.match(RPAREN), (yield self.cast())]
+            return _node(P.CCastContext, children)
+        return _node(P.TCastContext, [(yield self.unary())])
+
+    def unary(self):
+        ttype = self.types[self.pos]
+        if ttype in UNARY_OPS:
+            children = [_node(P.UnaryOpContext, [self.match(ttype)]), (yield self.cast())]
+            return _node(P.CUnaryContext, children)
+        return _node(P.TUnaryContext, [(yield self.postfix())])
+
+    def postfix(self):
+        if self.types[self.pos] == P.Ident and self.types[self.pos + 1] == LPAREN:
+            children = [self.match(P.Ident), self.match(LPAREN), (yield self.arg_list()), self.match(RPAREN)]
+            postfix = _node(P.PostfixCallContext, children)
+        else:
+            postfix = _node(P.TPostfixContext, [(yield self.atom())])
+        while self.types[self.pos] == LBRACKET:
+            children = [postfix, self.match(LBRACKET), (yield self.expr()), self.match(RBRACKET)]
+            postfix = _node(P.PostfixArrayContext, children)
+        return postfix
+
+    def arg_list(self):
+        if self.types[self.pos] not in EXPR_START:
+            return self._empty(P.ArgListContext)
+        children = [(yield self.expr())]
+        while self.types[self.pos] == COMMA:
+            children += [self.match(COMMA), (yield self.expr())]
+        return _node(P.ArgListContext, children)
+
+    def atom(self):
+        ttype = self.types[self.pos]
+        if ttype == P.Integer:
+            return _node(P.AtomIntegerContext, [self.match(P.Integer)])
+        if ttype == P.Ident:
+            return _node(P.AtomIdentContext, [self.match(P.Ident)])
+        if ttype == LPAREN:
+            children = [self.match(LPAREN), (yield self.expr()), self.match(RPAREN)]
+            return _node(P.AtomParenContext, children)
+        self.error()
+
+
+def fast_parse(text: str):
+    """
+    :return: the parse tree of text, the same as the one of main.my_parser
+    """
+    return FastParser(tokenize(text)).parse()
@@ -0,0 +1,247 @@
+"""
+Incremental compilation, used with --incremental DIR
+the IR and the assembly of every function definition are kept in a CompileCache (see cache.py) under a
+fingerprint of the function: its own tokens, and the tokens of everything before it a function can depend on,
+that is the global variables, the function declarations and the headers of the function definitions (where
+FuncInfo.paramInfos, FuncInfo.globInfos and TypeInfo.funcs come from). A function whose fingerprint is found
+is not compiled again:
+
+- its body is cut down to {} in the source handed to the frontend, so lexing, parsing, name resolution and
+  type checking see only its header, which keeps the signatures and globals of the program as they are;
+- its IR is taken from the store, where it is kept packed (see ircode.py). The labels a function makes are
+  numbered by counters running over the whole program (see LabelManager), so the stored labels are moved by
+  how far the counters at the start of the function have moved since it was stored, and the counters are
+  advanced by the labels it made;
+- its assembly is taken from the store as well, unless its labels moved, then it is generated again from
+  the IR.
+
+Whatever goes wrong is left to a clean build, which gives the same output or error as without --incremental,
+and the store is only written after a build got through, so the output is always the one of a clean build.
+"""
+import hashlib
+import io
+import pickle
+import sys
+
+from minidecaf.AsmGenerator import AsmGenerator
+from minidecaf.AsmWriter import AsmWriter
+from minidecaf.IRContainer import IRContainer, IRFunc
+from minidecaf.IRGenerator import IRGenerator
+from minidecaf.IRStr import Branch, Label
+from minidecaf.ircode import pack
+from minidecaf.syntax import FuncDef
+
+# reused: function taken from the store as it is, rebased: taken from the store with its labels moved,
+# generated: function compiled as it would be without --incremental
+incremental_counters = {"reused": 0, "rebased": 0, "generated": 0}
+
+
+class Chunk:
+    """
+    a top-level declaration of the source
+    """
+
+    def __init__(self, text: str, header: str, key: str):
+        """
+        :param text: source of the declaration, with the white space after it
+        :param header: for a function definition, its source up to the body, None otherwise
+        :param key: for a function definition, its fingerprint, None otherwise
+        """
+        self.text = text
+        self.header = header
+        self.key = key
+
+
+def split_source(text: str, store, passes=None):
+    """
+    cut the source into top-level declarations and fingerprint the function definitions
+
+    :param store: the CompileCache making the keys
+    :param passes: the PassManager the asm is generated with, see AsmGenerator
+    :return: [Chunk], or None if the source does not lex
+    """
+    from minidecaf.fastparser import LBRACE, tokenize
+    from minidecaf.parallel import cut_points
+    err = io.StringIO()
+    tokens = tokenize(text, err)
+    if err.getvalue():
+        return None
+    points = cut_points([token.type for token in tokens])
+    starts = [0] + points
+    ends = points + [len(tokens) - 1]
+    chunks = []
+    env = hashlib.sha256()  # the tokens a function can depend on, see the module docstring
+    for first, last in zip(starts, ends):
+        words = [token.text for token in tokens[first:last]]
+        begin = 0 if first == 0 else tokens[first].start
+        end = tokens[last].start if last < len(tokens) - 1 else len(text)
+        body = next((i for i in range(first, last) if tokens[i].type == LBRACE), None)
+        if body is None:
+            env.update(' '.join(words).encode() + b'\n')
+            chunks.append(Chunk(text[begin:end], None, None))
+            continue
+        key = store.key(' '.join(words).encode(), incremental=env.hexdigest(),
+                        passes=None if passes is None else passes.signature())
+        env.update(' '.join(words[:body - first]).encode() + b'\n')
+        chunks.append(Chunk(text[begin:end], text[begin:tokens[body].start], key))
+    return chunks
+
+
+def rebase(instructions, labels: dict, start: dict, scopes):
+    """
+    renumber the labels of instructions stored with the label counters at labels, for the counters at start
+
+    :param scopes: the scopes of the labels in instructions
+    :return: the instructions, the same list if no label moved
+    """
+    if all(labels.get(scope, 0) == start.get(scope, 0) for scope in scopes):
+        return instructions
+
+    def moved(label):
+        scope, n = label.rsplit('_', 1)
+        return f"{scope}_{int(n) - labels.get(scope, 0) + start.get(scope, 0)}"
+
+    result = []
+    for ir in instructions:
+        if ir.__class__ is Label:
+            ir = Label(moved(ir.label))
+        elif ir.__class__ is Branch:
+            ir = Branch(ir.op, moved(ir.label))
+        result.append(ir)
+    return result
+
+
+def function_asm(func, passes=None):
+    """
+    :return: the assembly of the IRFunc func
+    """
+    buf = io.StringIO()
+    writer = AsmWriter(buf)
+    AsmGenerator(writer, passes).generate_function(func)
+    writer.flush()
+    return buf.getvalue()
+
+
+class IncrementalIRGenerator(IRGenerator):
+    """
+    IRGenerator taking the functions found in the store from there, and handing every function together with
+    its assembly to the AsmGenerator as in streaming mode (see AsmGenerator.stream_function)
+    """
+
+    def __init__(self, ir_container, name_manager, type_info, entries: dict, asm_generator: AsmGenerator):
+        """
+        :param entries: name -> (key, the stored entry or None) of the function definitions
+        """
+        super().__init__(ir_container, name_manager, type_info, release=True)
+        ir_container.onFunction = self.finished
+        self.func = None
+        self.entries = entries
+        self.asmGenerator = asm_generator
+        self.stored = []  # [(key, entry)] to be written to the store once the build got through
+        self.funcs = []  # every IRFunc, for -ir --ssa
+
+    def finished(self, ir, func):
+        self.func = func
+
+    def emit(self, func, asm: str):
+        generator = self.asmGenerator
+        if generator.ir is None:
+            generator.start_stream(self._container)
+        generator.writer.write_text(asm)
+        self.funcs.append(func)
+
+    def visitFuncDef(self, node):
+        key, entry = self.entries[node.name]
+        start = self.labelManager.counters()
+        if entry is None:
+            super().visitFuncDef(node)
+            func = self.func
+            end = self.labelManager.counters()
+            delta = {scope: n - start.get(scope, 0) for scope, n in end.items() if n != start.get(scope, 0)}
+            labels = {scope: start.get(scope, 0) for scope in delta}
+            entry = {"instructions": pack(func.instructions), "labels": labels, "delta": delta,
+                     "asm": function_asm(func, self.asmGenerator.passes)}
+            self.stored.append((key, entry))
+            incremental_counters["generated"] += 1
+        else:
+            instructions = rebase(entry["instructions"], entry["labels"], start, entry["delta"])
+            func = IRFunc(node.name, self.nameManager.paramInfos[node.name], instructions)
+            if instructions is entry["instructions"]:
+                incremental_counters["reused"] += 1
+            else:
+                labels = {scope: start.get(scope, 0) for scope in entry["delta"]}
+                entry = {"instructions": pack(instructions), "labels": labels, "delta": entry["delta"],
+                         "asm": function_asm(func, self.asmGenerator.passes)}
+                self.stored.append((key, entry))
+                incremental_counters["rebased"] += 1
+            self.labelManager.advance(entry["delta"])
+            self._container.add_function(func)
+        self.emit(func, entry["asm"])
+
+
+def compile_incremental(source: str, store, ir=False, parse_mode="sll", frontend="antlr", semantic="split",
+                        passes=None):
+    """
+    compile source reusing the functions kept in store
+
+    :param store: a CompileCache
+    :param ir: emit the IR rather than the assembly
+    :param passes: see AsmGenerator, with ir and passes.ssa the IR is the one of main.render_tac
+    :return: the output, the same as the one of a clean build
+    """
+    from minidecaf.main import compile_ir, render_asm, render_tac
+    chunks = split_source(source, store, passes)
+    if chunks is not None:
+        try:
+            return build(chunks, store, ir, parse_mode, frontend, semantic, passes)
+        except Exception:
+            pass  # the clean build reports it
+    import antlr4
+    program = compile_ir(antlr4.InputStream(source), parse_mode=parse_mode, frontend=frontend, semantic=semantic)
+    if ir:
+        return render_tac(program, passes) if passes is not None and passes.ssa else f"{program}\n"
+    return render_asm(program, passes)
+
+
+def build(chunks, store, ir: bool, parse_mode: str, frontend: str, semantic: str, passes):
+    import antlr4
+    from minidecaf.main import check_semantics, check_type, lower_tree, name_parse, parse_tree, render_tac
+    found = []
+    parts = []
+    for chunk in chunks:
+        if chunk.key is None:
+            parts.append(chunk.text)
+            continue
+        data = store.get(chunk.key, binary=True)
+        entry = None if data is None else pickle.loads(data)
+        found.append((chunk.key, entry))
+        parts.append(chunk.text if entry is None else f"{chunk.header}{{}}\n")
+    tree = parse_tree(antlr4.InputStream(''.join(parts)), parse_mode=parse_mode, frontend=frontend)
+    program = lower_tree(tree)
+    del tree
+    if semantic == "fused":
+        name_manager, type_info = check_semantics(program)
+    else:
+        name_manager = name_parse(program)
+        type_info = check_type(program, name_manager)
+    names = [decl.name for decl in program.decls if decl.__class__ is FuncDef]
+    if len(names) != len(found):
+        raise Exception("function definitions not cut apart")
+    entries = dict(zip(names, found))
+    buf = io.StringIO()
+    container = IRContainer()
+    asm_generator = AsmGenerator(AsmWriter(buf), passes)
+    generator = IncrementalIRGenerator(container, name_manager, type_info, entries, asm_generator)
+    generator.visit(program)
+    asm_generator.finish_stream(container)
+    for key, entry in generator.stored:
+        store.put(key, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+    if ir and passes is not None and passes.ssa:
+        container.funcs = generator.funcs
+        return render_tac(container, passes)
+    return f"{container}\n" if ir else buf.getvalue()
+
+
+def print_counters(out=sys.stderr):
+    for name, value in incremental_counters.items():
+        print(f"minidecaf_incremental_{name} {value}", file=out)
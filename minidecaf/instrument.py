@@ -0,0 +1,128 @@
+"""
+Per-phase instrumentation for --time-passes / --mem-report
+records wall time, cpu time and (optionally) the tracemalloc peak of every compiler phase
+(startup, lex, parse, name_parse, check_type, gen_ir, gen_asm) and of every function compiled in it.
+"""
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class NullInstrument:
+    """
+    instrument doing nothing, used when no report is asked for
+    """
+
+    def phase(self, name: str):
+        return nullcontext()
+
+    def watch(self, phase: str, obj, method: str, name_of):
+        pass
+
+
+class Instrument:
+    """
+    collects one record per phase, and per function within a phase
+
+    :param mem: also track the tracemalloc peak (slows the compiler down noticeably)
+    :param profile_phase: name of a phase to run under cProfile
+    :param profile_out: where the pstats of profile_phase are dumped
+    """
+
+    def __init__(self, mem=False, profile_phase=None, profile_out=None):
+        self.mem = mem
+        self.profilePhase = profile_phase
+        self.profileOut = profile_out or f"minidecaf-{profile_phase}.pstats"
+        self.records = []  # dicts: phase, function, wall, cpu, peak
+        self._peaks = []  # running peak of every open measurement
+        if self.mem:
+            import tracemalloc
+            tracemalloc.start()
+
+    @contextmanager
+    def _measure(self, phase: str, function):
+        if self.mem:
+            import tracemalloc
+            self._fold_peak(tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+            base = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        record = {"phase": phase, "function": function}
+        try:
+            yield record
+        finally:
+            record["wall"] = time.perf_counter() - wall
+            record["cpu"] = time.process_time() - cpu
+            if self.mem:
+                self._fold_peak(tracemalloc.get_traced_memory()[1])
+                record["peak"] = max(self._peaks.pop() - base, 0)
+                self._fold_peak(record["peak"] + base)  # the enclosing phase saw this peak too
+            self.records.append(record)
+
+    def _fold_peak(self, peak: int):
+        for i in range(len(self._peaks)):
+            self._peaks[i] = max(self._peaks[i], peak)
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        measure a whole phase, under cProfile if it is the chosen one
+        """
+        profiler = None
+        if name == self.profilePhase:
+            import cProfile
+            profiler = cProfile.Profile()
+        with self._measure(name, None):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    profiler.dump_stats(self.profileOut)
+
+    def watch(self, phase: str, obj, method: str, name_of):
+        """
+        measure every call of obj.method as the compilation of one function of phase
+
+        :param name_of: maps the call arguments to the function name
+        """
+        original = getattr(obj, method)
+
+        def measured(*args):
+            with self._measure(phase, name_of(*args)):
+                return original(*args)
+
+        setattr(obj, method, measured)  # instance attribute, the class is left alone
+
+    def report(self, out=sys.stderr):
+        """
+        print the phases, each followed by its slowest functions
+        """
+        header = f"{'phase / function':<40}{'wall ms':>10}{'cpu ms':>10}"
+        if self.mem:
+            header += f"{'peak KiB':>10}"
+        print(header, file=out)
+        phases = [r for r in self.records if r["function"] is None]
+        for phase in phases:
+            self._report_line(phase["phase"], phase, out)
+            functions = [r for r in self.records if r["phase"] == phase["phase"] and r["function"] is not None]
+            for record in sorted(functions, key=lambda r: -r["wall"])[:10]:
+                self._report_line("  " + record["function"], record, out)
+        total = {"wall": sum(p["wall"] for p in phases), "cpu": sum(p["cpu"] for p in phases),
+                 "peak": max([p.get("peak", 0) for p in phases] + [0])}
+        self._report_line("total", total, out)
+
+    def _report_line(self, name: str, record, out):
+        line = f"{name:<40}{record['wall'] * 1000:>10.2f}{record['cpu'] * 1000:>10.2f}"
+        if self.mem:
+            line += f"{record.get('peak', 0) / 1024:>10.1f}"
+        print(line, file=out)
+
+    def dump_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.records, f, indent=1)
+
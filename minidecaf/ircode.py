@@ -0,0 +1,161 @@
+"""
+Compact encoding of the stack IR of a function (see IRStr.py)
+a PackedIR keeps the instructions in two parallel array('i') columns, the opcode and the operand of every
+instruction, with the labels, the global symbols and the call targets interned in tables the operand
+indexes. Its instructions are read back through a sequence view: iterating or indexing it yields IRStr
+instances, the same shared instance for every instruction without operands (Pop, Load, Store, Ret and each
+Binary and Unary operator), so gen_asm, tac.lower, irexec and the ir passes work on it as on a list.
+
+    packed = pack(func.instructions)    # 8 bytes per instruction, plus the tables
+    func = IRFunc(name, param_info, packed)
+
+the operand of a Const or a FrameSlot is the value itself, which fits, as Const checks its range.
+"""
+from array import array
+
+from minidecaf.IRStr import Binary, Branch, Call, Const, FrameSlot, GlobalSymbol, Label, LOAD, POP, RET, STORE, \
+    Unary
+
+CONST, FRAMESLOT, GLOBAL, CALL, LABEL, LOAD_OP, STORE_OP, POP_OP, RET_OP = range(9)
+BRANCH = 9  # + the index of the op in Branch.branchOps
+UNARY = BRANCH + len(Branch.branchOps)  # + the index of the op in Unary.ir_unary_ops
+BINARY = UNARY + len(Unary.ir_unary_ops)  # + the index of the op in Binary.binary_ops
+OPCODES = BINARY + len(Binary.binary_ops)
+
+_BRANCH_OPS = list(Branch.branchOps)
+_UNARY_OPS = list(Unary.ir_unary_ops)
+_BINARY_OPS = list(Binary.binary_ops)
+_UNARY_CODE = {op: UNARY + i for i, op in enumerate(_UNARY_OPS)}
+_BINARY_CODE = {op: BINARY + i for i, op in enumerate(_BINARY_OPS)}
+
+# opcode -> the instance standing for every instruction of that opcode, None for the ones with operands
+SHARED = [None] * OPCODES
+SHARED[LOAD_OP], SHARED[STORE_OP], SHARED[POP_OP], SHARED[RET_OP] = LOAD, STORE, POP, RET
+for _op, _code in _UNARY_CODE.items():
+    SHARED[_code] = Unary(_op)
+for _op, _code in _BINARY_CODE.items():
+    SHARED[_code] = Binary(_op)
+_NO_OPERAND = {LOAD.__class__: LOAD_OP, STORE.__class__: STORE_OP, POP.__class__: POP_OP, RET.__class__: RET_OP}
+
+
+def _make(cls, **fields):
+    """
+    an instance of cls with these fields, without the checks of its __init__: the operand was checked
+    when it was packed
+    """
+    ir = object.__new__(cls)
+    for name, value in fields.items():
+        setattr(ir, name, value)
+    return ir
+
+
+class PackedIR:
+    """
+    the instructions of one function, see the module docstring
+    """
+    __slots__ = ('ops', 'args', 'labels', 'symbols', 'calls')
+
+    def __init__(self):
+        self.ops = array('i')
+        self.args = array('i')
+        self.labels = []
+        self.symbols = []
+        self.calls = []  # (symbol index, number of parameters)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __iter__(self):
+        shared = SHARED
+        decode = self._decode
+        for op, arg in zip(self.ops, self.args):
+            ir = shared[op]
+            yield decode(op, arg) if ir is None else ir
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self.ops)))]
+        op = self.ops[i]
+        ir = SHARED[op]
+        return self._decode(op, self.args[i]) if ir is None else ir
+
+    def __str__(self):
+        return '\n'.join(map(str, self))
+
+    def _decode(self, op: int, arg: int):
+        if op == CONST:
+            return _make(Const, v=arg)
+        if op == FRAMESLOT:
+            return _make(FrameSlot, offset=arg)
+        if op == GLOBAL:
+            return _make(GlobalSymbol, sym=self.symbols[arg])
+        if op == CALL:
+            sym, para_cnt = self.calls[arg]
+            return _make(Call, func=self.symbols[sym], para_cnt=para_cnt)
+        if op == LABEL:
+            return _make(Label, label=self.labels[arg])
+        return _make(Branch, op=_BRANCH_OPS[op - BRANCH], label=self.labels[arg])
+
+    def nbytes(self):
+        """
+        :return: the bytes taken by the columns, the tables left out
+        """
+        return self.ops.itemsize * len(self.ops) + self.args.itemsize * len(self.args)
+
+
+class _Packer:
+    def __init__(self):
+        self.packed = PackedIR()
+        self.labels = {}
+        self.symbols = {}
+        self.calls = {}
+
+    @staticmethod
+    def _intern(index: dict, table: list, value):
+        i = index.get(value)
+        if i is None:
+            i = index[value] = len(table)
+            table.append(value)
+        return i
+
+    def add(self, ir):
+        packed = self.packed
+        cls = ir.__class__
+        arg = 0
+        if cls in _NO_OPERAND:
+            op = _NO_OPERAND[cls]
+        elif cls is Binary:
+            op = _BINARY_CODE[ir.op]
+        elif cls is Unary:
+            op = _UNARY_CODE[ir.op]
+        elif cls is Const:
+            op, arg = CONST, ir.v
+        elif cls is FrameSlot:
+            op, arg = FRAMESLOT, ir.offset
+        elif cls is GlobalSymbol:
+            op, arg = GLOBAL, self._intern(self.symbols, packed.symbols, ir.sym)
+        elif cls is Call:
+            sym = self._intern(self.symbols, packed.symbols, ir.func)
+            op, arg = CALL, self._intern(self.calls, packed.calls, (sym, ir.para_cnt))
+        elif cls is Label:
+            op, arg = LABEL, self._intern(self.labels, packed.labels, ir.label)
+        elif cls is Branch:
+            op, arg = BRANCH + _BRANCH_OPS.index(ir.op), self._intern(self.labels, packed.labels, ir.label)
+        else:
+            raise Exception(f"cannot pack {ir}")
+        packed.ops.append(op)
+        packed.args.append(arg)
+
+
+def pack(instructions):
+    """
+    :param instructions: IRStr instances, or a PackedIR which is returned as it is
+    :return: the PackedIR of instructions
+    """
+    if instructions.__class__ is PackedIR:
+        return instructions
+    packer = _Packer()
+    add = packer.add
+    for ir in instructions:
+        add(ir)
+    return packer.packed
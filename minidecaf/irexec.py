@@ -0,0 +1,244 @@
+"""
+IR execution engine
+runs an IRContainer without going through assembly, e.g. to check an optimization of the IR against the
+unoptimized IR on many generated programs:
+
+    python -m minidecaf --run-ir prog.c          # exit status is the return value of main
+
+the IR is run with the semantics of the assembly it becomes (see IRStr.gen_asm and AsmGenerator): the IR
+stack is the machine stack, the locals are the slots pushed at the bottom of the frame, pointers are byte
+addresses and arithmetic wraps like on RV32IM (see rvsim.s32/div32/rem32).
+
+every IRFunc is lowered once to the source of one python function, with its labels resolved to basic
+block numbers and a binary dispatch on the block number; sp and fp are python locals, the memory is a list
+of 32-bit words indexed by the word address. So running it costs about one python statement per IR
+instruction, instead of a dispatch on the IR class.
+"""
+import sys
+
+from minidecaf.IRContainer import IRContainer
+from minidecaf.IRStr import Binary, Branch, Call, Const, FrameSlot, GlobalSymbol, Label, Load, Pop, Ret, Store, \
+    Unary
+from minidecaf.rvsim import DATA_BASE, DEFAULT_MEM_SIZE, div32, rem32, s32
+
+DEFAULT_MAX_ITERATIONS = 10 * 1000 * 1000  # loop iterations, so a broken loop does not hang the caller
+RECURSION_LIMIT = 10000  # every call of the program is a python call
+STACK_RESERVE = 64  # words a frame may use before the overflow check of the next call notices
+
+_WRAP = "if not -2147483648 <= t <= 2147483647: t = s32(t)"
+# the python expression of a binary IR on x (below) and y (stack top), or of a unary IR on x
+_BINARY = {
+    '+': "x + y", '-': "x - y", '*': "x * y", '/': "div32(x, y)", '%': "rem32(x, y)",
+    '==': "int(x == y)", '!=': "int(x != y)", '<': "int(x < y)", '<=': "int(x <= y)",
+    '>': "int(x > y)", '>=': "int(x >= y)", '&&': "int(x != 0 and y != 0)", '||': "int(x != 0 or y != 0)",
+}
+_UNARY = {'-': "-x", '~': "~x", '!': "int(x == 0)"}
+_WRAPPING = {'+', '-', '*'}
+
+
+class IRExecError(Exception):
+    """
+    the IR did something wrong at run time (bad address, stack overflow, ...) or ran for too long
+    """
+
+
+class _OutOfFuel(Exception):
+    pass
+
+
+class IRMachine:
+    """
+    an IRContainer lowered to python, run() can be called many times, each run starts from fresh memory
+    """
+
+    def __init__(self, ir: IRContainer, mem_size=DEFAULT_MEM_SIZE):
+        self.ir = ir
+        self.memWords = mem_size // 4
+        self.globals = {}  # name -> byte address
+        self.initial = []  # (word index, value)
+        address = DATA_BASE
+        for glob in ir.globs:
+            self.globals[glob.var.name] = address
+            if glob.init is not None:
+                self.initial.append((address >> 2, s32(glob.init)))
+            address += (glob.size + 3) // 4 * 4
+        self.dataEnd = address >> 2
+        defined = {func.name for func in ir.funcs}
+        self.sources = {func.name: FunctionLowering(func, self.globals, defined).source() for func in ir.funcs}
+        self._makers = {name: compile(src, f"<ir {name}>", "exec") for name, src in self.sources.items()}
+
+    def run(self, entry="main", max_iterations=DEFAULT_MAX_ITERATIONS):
+        """
+        :return: the return value of entry
+        """
+        M = [0] * self.memWords
+        for index, value in self.initial:
+            M[index] = value
+        F = {}
+        fuel = [max_iterations]
+        env = {"M": M, "F": F, "fuel": fuel, "fault": self._fault, "s32": s32, "div32": div32, "rem32": rem32,
+               "LOW": DATA_BASE, "HIGH": self.memWords * 4, "STACK_LIMIT": self.dataEnd + STACK_RESERVE,
+               "OutOfFuel": _OutOfFuel, "IRExecError": IRExecError}
+        for name, code in self._makers.items():
+            exec(code, env)
+            F[name] = env.pop("fn")
+        if entry not in F:
+            raise IRExecError(f"no function {entry}")
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, RECURSION_LIMIT))
+        try:
+            return F[entry](self.memWords)
+        except _OutOfFuel:
+            raise IRExecError(f"gave up after {max_iterations} loop iterations")
+        except RecursionError:
+            raise IRExecError("recursion too deep for the evaluator")
+        finally:
+            sys.setrecursionlimit(limit)
+
+    @staticmethod
+    def _fault(func, what, value):
+        raise IRExecError(f"in {func}: {what} {value:#x}")
+
+
+class FunctionLowering:
+    """
+    the python source of one IRFunc
+
+    the function takes the sp of the caller (a word index, the arguments are at sp, sp + 1, ...) and
+    returns the return value; like the assembly it pushes ra and fp, then copies the arguments
+    """
+
+    def __init__(self, func, global_addresses, defined_funcs):
+        self.func = func
+        self.globals = global_addresses
+        self.defined = defined_funcs
+        self.blocks = []  # [label or None, [IR]]
+        self.blockOf = {}  # label -> block number
+        self._split()
+
+    def _split(self):
+        current = [None, []]
+        self.blocks.append(current)
+        for ir in self.func.instructions:
+            if isinstance(ir, Label):
+                current = [ir.label, []]
+                self.blocks.append(current)
+                self.blockOf[ir.label] = len(self.blocks) - 1
+                continue
+            current[1].append(ir)
+            if isinstance(ir, (Branch, Ret)):
+                current = [None, []]
+                self.blocks.append(current)
+
+    def _loop_heads(self):
+        """
+        blocks jumped to from themselves or a later block, the only places a loop can go around
+        """
+        heads = set()
+        for number, (_, irs) in enumerate(self.blocks):
+            for ir in irs:
+                if isinstance(ir, Branch) and self._target(ir) <= number:
+                    heads.add(self._target(ir))
+        return heads
+
+    def _target(self, branch: Branch):
+        if branch.label not in self.blockOf:
+            raise IRExecError(f"in {self.func.name}: undefined label {branch.label}")
+        return self.blockOf[branch.label]
+
+    def source(self):
+        name = self.func.name
+        lines = [
+            "def fn(sp):",
+            "    sp -= 2",  # ra and fp
+            "    fp = sp",
+            f"    if sp < STACK_LIMIT: fault({name!r}, 'stack overflow at', sp << 2)",
+        ]
+        for i in range(self.func.paramInfo.paramNum):
+            lines += ["    sp -= 1", f"    M[sp] = M[fp + {i + 2}]"]
+        lines += ["    fpb = fp << 2", "    b = 0", "    while True:"]
+        heads = self._loop_heads()
+        self._dispatch(lines, 0, len(self.blocks), 2, heads)
+        return "\n".join(lines) + "\n"
+
+    def _dispatch(self, lines, lo: int, hi: int, depth: int, heads):
+        """
+        binary search on b over the blocks lo..hi-1
+        """
+        pad = "    " * depth
+        if hi - lo == 1:
+            self._block(lines, lo, depth, heads)
+            return
+        mid = (lo + hi) // 2
+        lines.append(f"{pad}if b < {mid}:")
+        self._dispatch(lines, lo, mid, depth + 1, heads)
+        lines.append(f"{pad}else:")
+        self._dispatch(lines, mid, hi, depth + 1, heads)
+
+    def _block(self, lines, number: int, depth: int, heads):
+        pad = "    " * depth
+        label, irs = self.blocks[number]
+        lines.append(f"{pad}# block {number}" + (f" {label}" if label else ""))
+        if number in heads:
+            lines += [f"{pad}fuel[0] -= 1", f"{pad}if fuel[0] < 0: raise OutOfFuel()"]
+        for ir in irs:
+            lines.extend(pad + line for line in self._lower(ir, number))
+        if not irs or not isinstance(irs[-1], (Branch, Ret)):
+            if number + 1 < len(self.blocks):
+                lines.append(f"{pad}b = {number + 1}")
+            else:  # the end of the function: the epilogue returns 0
+                lines.append(f"{pad}return 0")
+
+    def _lower(self, ir, number: int):
+        name = self.func.name
+        if isinstance(ir, Const):
+            return ["sp -= 1", f"M[sp] = {ir.v}"]
+        if isinstance(ir, FrameSlot):
+            return ["sp -= 1", f"M[sp] = fpb + {ir.offset}"]
+        if isinstance(ir, GlobalSymbol):
+            if ir.sym not in self.globals:
+                raise IRExecError(f"in {name}: undefined global {ir.sym}")
+            return ["sp -= 1", f"M[sp] = {self.globals[ir.sym]}"]
+        if isinstance(ir, Pop):
+            return ["sp += 1"]
+        if isinstance(ir, Load):
+            return ["a = M[sp]",
+                    f"if a & 3 or not LOW <= a < HIGH: fault({name!r}, 'load from', a)",
+                    "M[sp] = M[a >> 2]"]
+        if isinstance(ir, Store):
+            return ["a = M[sp]",
+                    f"if a & 3 or not LOW <= a < HIGH: fault({name!r}, 'store to', a)",
+                    "sp += 1",
+                    "M[a >> 2] = M[sp]"]
+        if isinstance(ir, Unary):
+            lines = ["x = M[sp]", f"t = {_UNARY[ir.op]}"]
+            if ir.op == '-':
+                lines.append(_WRAP)
+            return lines + ["M[sp] = t"]
+        if isinstance(ir, Binary):
+            lines = ["y = M[sp]", "sp += 1", "x = M[sp]", f"t = {_BINARY[ir.op]}"]
+            if ir.op in _WRAPPING:
+                lines.append(_WRAP)
+            return lines + ["M[sp] = t"]
+        if isinstance(ir, Call):
+            return [f"t = F[{ir.func!r}](sp)" if ir.func in self.defined else
+                    f"raise IRExecError('call of {ir.func}, which is declared but not defined')",
+                    f"sp += {ir.para_cnt - 1}",
+                    "M[sp] = t"]
+        if isinstance(ir, Ret):
+            return ["return M[sp]"]
+        if isinstance(ir, Branch):
+            target = self._target(ir)
+            if ir.op == "br":
+                return [f"b = {target}", "continue"]
+            if ir.op in ("beqz", "bnez"):
+                test = "not t" if ir.op == "beqz" else "t"
+                return ["t = M[sp]", "sp += 1", f"b = {target} if {test} else {number + 1}", "continue"]
+        raise IRExecError(f"in {name}: cannot run {ir}")
+
+
+def run_ir(ir: IRContainer, entry="main", max_iterations=DEFAULT_MAX_ITERATIONS):
+    """
+    :return: the return value of entry
+    """
+    return IRMachine(ir).run(entry, max_iterations)
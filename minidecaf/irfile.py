@@ -0,0 +1,348 @@
+"""
+IR files, written with -ir --ir-format and read back with --from-ir
+an IR file holds the whole IRContainer of a program: its globals (GlobInfo), its function declarations
+(funcDecl) and every IRFunc with its ParamInfo, so the backend can run on it without the frontend and give the
+same output as on the IR it was written from. There are two forms of it, told apart by their first bytes:
+
+- text: a line "minidecaf-ir <version>", then one line per global, declaration and parameter, and the
+  instructions of every function as -ir prints them, between "func <name>" and "end":
+
+      minidecaf-ir 1
+      global g 0 4 4 = 3          # name, variable id, variable size, size, initial value if any
+      declare f
+      func main
+          const 0
+          ret
+      end
+
+  a call also gives how many parameters it pops ("call f 2"); a "#" starts a comment.
+- binary: b"MDIR", the version as a little-endian u16, then the same content with the instructions of every
+  function as the columns and tables of a PackedIR (see ircode.py). Every integer is little-endian, every
+  string a u32 length followed by utf-8.
+
+a file of another version is refused, FORMAT_VERSION goes up whenever the format changes.
+"""
+import struct
+import sys
+from array import array
+
+from minidecaf.IRContainer import IRContainer, IRFunc
+from minidecaf.IRStr import Binary, Branch, Call, Const, FrameSlot, GlobalSymbol, Label, LOAD, POP, RET, STORE, \
+    Unary
+from minidecaf.NameParser import GlobInfo, ParamInfo, Variable
+from minidecaf.ircode import BRANCH, CALL, GLOBAL, LABEL, OPCODES, UNARY, PackedIR, pack
+
+FORMAT_VERSION = 1
+MAGIC = b"MDIR"
+TEXT_MAGIC = "minidecaf-ir"
+FORMATS = ["text", "binary"]
+
+_NO_OPERAND = {str(ir): ir for ir in [LOAD, STORE, POP, RET]}
+_UNARY_OPS = {name: op for op, name in Unary.ir_unary_ops.items()}
+_BINARY_OPS = {name: op for op, name in Binary.binary_ops.items()}
+_BRANCH_OPS = ["br", "beqz", "bnez"]  # not beq, which nothing generates nor runs
+
+
+class IRFormatError(Exception):
+    """
+    the file is not an IR file of this version, or is cut short or damaged
+    """
+
+
+def dump(ir: IRContainer, fmt="text"):
+    """
+    :return: the IR file of ir, a str for text and bytes for binary
+    """
+    return dump_text(ir) if fmt == "text" else dump_binary(ir)
+
+
+def load(data):
+    """
+    :param data: the contents of an IR file in either form, as bytes or str
+    :return: its IRContainer
+    """
+    if isinstance(data, str):
+        return load_text(data)
+    if data.startswith(MAGIC):
+        return load_binary(data)
+    try:
+        text = data.decode()
+    except UnicodeDecodeError:
+        raise IRFormatError("not an IR file") from None
+    return load_text(text)
+
+
+def write_ir(ir: IRContainer, output_file, fmt="text"):
+    """
+    :param output_file: None for stdout, or a file name
+    """
+    data = dump(ir, fmt)
+    if isinstance(data, str):
+        data = data.encode()
+    if output_file is None:
+        sys.stdout.buffer.write(data)
+        sys.stdout.flush()
+    else:
+        with open(output_file, 'wb') as f:
+            f.write(data)
+
+
+def read_ir(path: str):
+    """
+    :return: the IRContainer of the IR file at path
+    """
+    with open(path, 'rb') as f:
+        return load(f.read())
+
+
+def _functions(ir: IRContainer):
+    if ir.onFunction is not None:
+        raise IRFormatError("the functions of a streaming IRContainer are not kept")
+    return ir.funcs
+
+
+# text
+
+
+def _instr_text(ir):
+    if ir.__class__ is Call:
+        return f"call {ir.func} {ir.para_cnt}"
+    return str(ir)
+
+
+def dump_text(ir: IRContainer):
+    lines = [f"{TEXT_MAGIC} {FORMAT_VERSION}"]
+    for glob in ir.globs:
+        var = glob.var
+        init = "" if glob.init is None else f" = {glob.init}"
+        lines.append(f"global {var.name} {var.id} {var.size} {glob.size}{init}")
+    lines += [f"declare {name}" for name in ir.funcDecl]
+    for func in _functions(ir):
+        lines.append(f"func {func.name}")
+        lines += [f"param {var.name} {var.id} {var.offset} {var.size}" for var in func.paramInfo.vars]
+        lines += [f"\t{_instr_text(instr)}" for instr in func.instructions]
+        lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+def _parse_instr(words):
+    head = words[0]
+    if len(words) == 1:
+        if head.endswith(":"):
+            return Label(head[:-1])
+        if head in _NO_OPERAND:
+            return _NO_OPERAND[head]
+        if head in _UNARY_OPS:
+            return Unary(_UNARY_OPS[head])
+        if head in _BINARY_OPS:
+            return Binary(_BINARY_OPS[head])
+    elif len(words) == 2:
+        if head == "const":
+            return Const(int(words[1]))
+        if head == "frameslot":
+            return FrameSlot(int(words[1]))
+        if head == "globalsymbol":
+            return GlobalSymbol(words[1])
+        if head in _BRANCH_OPS:
+            return Branch(head, words[1])
+    elif len(words) == 3 and head == "call":
+        return Call(words[1], int(words[2]))
+    raise ValueError("unknown instruction")
+
+
+def load_text(text: str):
+    ir = IRContainer()
+    func = None  # (name, params, instructions) of the function being read
+    version = None
+    for number, line in enumerate(text.splitlines(), 1):
+        words = line.split("#", 1)[0].split()
+        if not words:
+            continue
+        try:
+            if version is None:
+                if words[0] != TEXT_MAGIC or len(words) != 2:
+                    raise IRFormatError("not an IR file")
+                version = int(words[1])
+                if version != FORMAT_VERSION:
+                    raise IRFormatError(f"IR format version {version}, expected {FORMAT_VERSION}")
+            elif func is not None:
+                name, params, instructions = func
+                if words == ["end"]:
+                    ir.funcs.append(IRFunc(name, ParamInfo(params), instructions))
+                    func = None
+                elif words[0] == "param" and not instructions:
+                    var_name, id, offset, size = words[1:]
+                    params.append(Variable(var_name, int(offset), int(size), int(id)))
+                else:
+                    instructions.append(_parse_instr(words))
+            elif words[0] == "global":
+                name, id, var_size, size = words[1:5]
+                init = None
+                if len(words) > 5:
+                    if words[5] != "=" or len(words) != 7:
+                        raise ValueError("bad initializer")
+                    init = int(words[6])
+                ir.add_global(GlobInfo(Variable(name, None, int(var_size), int(id)), int(size), init))
+            elif words[0] == "declare" and len(words) == 2:
+                ir.add_func_decl(words[1])
+            elif words[0] == "func" and len(words) == 2:
+                func = (words[1], [], [])
+            else:
+                raise ValueError("unexpected line")
+        except (ValueError, AssertionError) as e:
+            raise IRFormatError(f"line {number}: {e or 'bad operand'}: {line.strip()}")
+    if version is None:
+        raise IRFormatError("not an IR file")
+    if func is not None:
+        raise IRFormatError("the last function has no end")
+    return ir
+
+
+# binary
+
+
+class _Writer:
+    def __init__(self):
+        self.parts = []
+
+    def int(self, fmt: str, *values):
+        self.parts.append(struct.pack(f"<{fmt}", *values))
+
+    def str(self, s: str):
+        data = s.encode()
+        self.int("I", len(data))
+        self.parts.append(data)
+
+    def strs(self, strs):
+        self.int("I", len(strs))
+        for s in strs:
+            self.str(s)
+
+    def column(self, column: array):
+        if sys.byteorder == "big":
+            column = array(column.typecode, column)
+            column.byteswap()
+        self.parts.append(column.tobytes())
+
+
+class _Reader:
+    def __init__(self, data: bytes, at: int):
+        self.data = data
+        self.at = at
+
+    def take(self, size: int):
+        if self.at + size > len(self.data):
+            raise IRFormatError("the IR file is cut short")
+        part = self.data[self.at:self.at + size]
+        self.at += size
+        return part
+
+    def int(self, fmt: str):
+        values = struct.unpack(f"<{fmt}", self.take(struct.calcsize(f"<{fmt}")))
+        return values[0] if len(values) == 1 else values
+
+    def str(self):
+        return self.take(self.int("I")).decode()
+
+    def strs(self):
+        return [self.str() for _ in range(self.int("I"))]
+
+    def column(self, length: int):
+        column = array('i')
+        column.frombytes(self.take(column.itemsize * length))
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column
+
+
+def dump_binary(ir: IRContainer):
+    out = _Writer()
+    out.parts.append(MAGIC)
+    out.int("H", FORMAT_VERSION)
+    out.int("I", len(ir.globs))
+    for glob in ir.globs:
+        var = glob.var
+        out.str(var.name)
+        out.int("iii", var.id, var.size, glob.size)
+        out.int("Bq", glob.init is not None, glob.init or 0)
+    out.strs(ir.funcDecl)
+    funcs = _functions(ir)
+    out.int("I", len(funcs))
+    for func in funcs:
+        out.str(func.name)
+        out.int("I", len(func.paramInfo.vars))
+        for var in func.paramInfo.vars:
+            out.str(var.name)
+            out.int("iii", var.id, var.offset, var.size)
+        packed = pack(func.instructions)
+        out.strs(packed.labels)
+        out.strs(packed.symbols)
+        out.int("I", len(packed.calls))
+        for sym, para_cnt in packed.calls:
+            out.int("ii", sym, para_cnt)
+        out.int("I", len(packed))
+        out.column(packed.ops)
+        out.column(packed.args)
+    return b"".join(out.parts)
+
+
+def _check_operands(packed: PackedIR, name: str):
+    """
+    the tables indexed by the operands must hold them, so that the IR does not fail later on
+    """
+    for sym, para_cnt in packed.calls:
+        if not 0 <= sym < len(packed.symbols) or para_cnt < 0:
+            raise IRFormatError(f"bad call table entry in {name}")
+    tables = [None] * OPCODES
+    tables[GLOBAL], tables[CALL], tables[LABEL] = packed.symbols, packed.calls, packed.labels
+    tables[BRANCH:UNARY] = [packed.labels] * (UNARY - BRANCH)
+    for op, arg in zip(packed.ops, packed.args):
+        table = tables[op]
+        if table is not None and not 0 <= arg < len(table):
+            raise IRFormatError(f"operand out of its table in {name}")
+        if BRANCH <= op < UNARY and Branch.branchOps[op - BRANCH] not in _BRANCH_OPS:
+            raise IRFormatError(f"unknown opcode in {name}")
+
+
+def load_binary(data: bytes):
+    try:
+        return _load_binary(data)
+    except (UnicodeDecodeError, struct.error, IndexError, ValueError) as e:
+        raise IRFormatError(f"bad IR file: {e}") from None
+
+
+def _load_binary(data: bytes):
+    if not data.startswith(MAGIC):
+        raise IRFormatError("not an IR file")
+    src = _Reader(data, len(MAGIC))
+    version = src.int("H")
+    if version != FORMAT_VERSION:
+        raise IRFormatError(f"IR format version {version}, expected {FORMAT_VERSION}")
+    ir = IRContainer()
+    for _ in range(src.int("I")):
+        name = src.str()
+        id, var_size, size = src.int("iii")
+        has_init, init = src.int("Bq")
+        ir.add_global(GlobInfo(Variable(name, None, var_size, id), size, init if has_init else None))
+    ir.funcDecl = src.strs()
+    for _ in range(src.int("I")):
+        name = src.str()
+        params = []
+        for _ in range(src.int("I")):
+            var_name = src.str()
+            id, offset, size = src.int("iii")
+            params.append(Variable(var_name, offset, size, id))
+        packed = PackedIR()
+        packed.labels = src.strs()
+        packed.symbols = src.strs()
+        packed.calls = [src.int("ii") for _ in range(src.int("I"))]
+        length = src.int("I")
+        packed.ops = src.column(length)
+        packed.args = src.column(length)
+        if length and not 0 <= min(packed.ops) <= max(packed.ops) < OPCODES:
+            raise IRFormatError(f"unknown opcode in {name}")
+        _check_operands(packed, name)
+        ir.funcs.append(IRFunc(name, ParamInfo(params), packed))
+    if src.at != len(data):
+        raise IRFormatError("trailing bytes after the last function")
+    return ir
@@ -3,18 +3,22 @@ MiniDecaf Compiler Authored by Ren Yi 2018011423
 The general structure references to TA's implementation.
 """
 import argparse
+import io
+import os
 import sys
 
-import antlr4
+from minidecaf.instrument import NullInstrument
+from minidecaf.startup import parser_classes, use_parser_cache, save_parser_cache, default_parser_cache_dir
 
-from minidecaf.AsmGenerator import AsmGenerator
-from minidecaf.AsmWriter import AsmWriter
-from minidecaf.IRContainer import IRContainer
-from minidecaf.IRGenerator import IRGenerator
-from minidecaf.NameParser import NameParser
-from minidecaf.typer import Typer
-from .generated.MiniDecafLexer import MiniDecafLexer
-from .generated.MiniDecafParser import MiniDecafParser
+# antlr4, the generated lexer/parser and the passes are imported when first needed,
+# so that e.g. a cache hit or an -ir run does not pay for what it does not use
+
+FRONTENDS = ["antlr", "fast"]
+SEMANTIC_MODES = ["split", "fused"]
+PARSE_MODES = ["sll", "ll"]
+# sll: parses that SLL prediction got through, ll_fallback: parses done again in full LL mode after SLL bailed,
+# ll: parses done in full LL mode from the start, errors: parses that failed in full LL mode too
+parse_counters = {"sll": 0, "ll_fallback": 0, "ll": 0, "errors": 0}
 
 
 def parse_args():
@@ -23,25 +27,172 @@ def parse_args():
     Reference to TA's implementation
     """
     parser = argparse.ArgumentParser(description="MiniDecaf compiler by RenYi 2018011423")
-    parser.add_argument("infile", type=str,
+    parser.add_argument("infile", type=str, nargs="?",
                         help="the input C file")
     parser.add_argument("outfile", type=str, nargs="?",
                         help="the output assembly file")
     parser.add_argument("-ir", action="store_true", help="emit ir rather than asm")
-    return parser.parse_args()
+    parser.add_argument("--ir-format", choices=["text", "binary"], metavar="FORMAT",
+                        help="with -ir, write the whole program as an IR file (see irfile.py) in this form, text "
+                             "or binary, that --from-ir reads back")
+    parser.add_argument("--from-ir", action="store_true",
+                        help="the input is an IR file written with --ir-format, run the backend on it without the "
+                             "frontend")
+    parser.add_argument("--ssa", action="store_true",
+                        help="generate the asm through the three-address IR in SSA form (see tac.py and ssa.py), "
+                             "with -ir print that IR")
+    parser.add_argument("-O", type=int, choices=[0, 1, 2], default=0, dest="opt_level", metavar="LEVEL",
+                        help="-O0: the asm of the stack IR as it is (default); -O1, -O2: the optimization "
+                             "pipelines of passes.py")
+    parser.add_argument("--passes", type=str, metavar="LIST",
+                        help="run these comma separated passes (see passes.py) instead of the pipeline of -O")
+    parser.add_argument("--disable-pass", type=str, action="append", default=[], metavar="LIST",
+                        help="leave these comma separated passes out of the pipeline")
+    parser.add_argument("--print-after", type=str, action="append", default=[], metavar="LIST",
+                        help="print every function after these comma separated passes (or all) to stderr, "
+                             "compiling without --cache-dir and --incremental")
+    parser.add_argument("--analysis-stats", action="store_true",
+                        help="print how often the passes computed and reused every analysis (see analysis.py) "
+                             "to stderr")
+    parser.add_argument("--run-ir", action="store_true",
+                        help="run the ir (see irexec.py) instead of writing asm, exit with what main returns")
+    parser.add_argument("--compact-ir", action="store_true",
+                        help="keep the ir of every function packed in arrays (see ircode.py) with -ir and --run-ir")
+    parser.add_argument("--batch", type=str, metavar="DIR",
+                        help="compile every .c file under DIR, writing one .S beside each of them")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of worker processes for --batch")
+    parser.add_argument("--serve", type=str, nargs="?", const="", metavar="SOCKET",
+                        help="run as a compile server on a unix socket (see client.py)")
+    parser.add_argument("--cache-dir", type=str, default=os.environ.get("MINIDECAF_CACHE_DIR"),
+                        help="reuse output of identical earlier compilations stored in this dir "
+                             "(default $MINIDECAF_CACHE_DIR)")
+    parser.add_argument("--cache-size", type=int, default=64,
+                        help="size cap of the cache dir in MiB, least recently used entries are evicted")
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="print the cache counters and exit")
+    parser.add_argument("--incremental", type=str, metavar="DIR",
+                        help="keep the IR and asm of every function in DIR and compile again only the functions "
+                             "that changed, see incremental.py (size cap from --cache-size)")
+    parser.add_argument("--incremental-stats", action="store_true",
+                        help="print how many functions --incremental reused, rebased and generated to stderr")
+    parser.add_argument("--frontend", choices=FRONTENDS, default="antlr",
+                        help="antlr: the generated lexer/parser (default); fast: the hand-written one of fastparser.py")
+    parser.add_argument("--semantic", choices=SEMANTIC_MODES, default="split",
+                        help="split: name resolution and type checking one after the other (default); "
+                             "fused: both in one traversal, see semantic.py")
+    parser.add_argument("--parse-jobs", type=int, default=1, metavar="N",
+                        help="parse the top-level declarations in N worker processes, see parallel.py "
+                             "(needs --frontend=fast)")
+    parser.add_argument("--parse-mode", choices=PARSE_MODES, default="sll",
+                        help="sll: SLL prediction, parsing again with full LL if it fails (default); ll: full LL only")
+    parser.add_argument("--parse-stats", action="store_true",
+                        help="print how often the parser fell back from SLL to LL to stderr")
+    parser.add_argument("--no-parser-cache", action="store_true",
+                        help="do not load/save the warm DFA cache of the generated parser (see startup.py)")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print the import time of every module to stderr")
+    parser.add_argument("--time-passes", action="store_true",
+                        help="print wall/cpu time of every phase and function to stderr")
+    parser.add_argument("--mem-report", action="store_true",
+                        help="also track the tracemalloc peak of every phase and function")
+    parser.add_argument("--time-passes-json", type=str, metavar="FILE",
+                        help="write the --time-passes records as json to FILE")
+    parser.add_argument("--profile-phase", type=str, metavar="PHASE",
+                        choices=["startup", "lex", "parse", "lower", "name_parse", "check_type", "semantic", "gen_ir", "read_ir",
+                                 "gen_asm"],
+                        help="run PHASE under cProfile")
+    parser.add_argument("--profile-out", type=str, metavar="FILE",
+                        help="pstats file for --profile-phase (default minidecaf-PHASE.pstats)")
+    args = parser.parse_args()
+    if args.cache_stats and args.cache_dir is None:
+        parser.error("--cache-stats needs --cache-dir")
+    if args.incremental_stats and args.incremental is None:
+        parser.error("--incremental-stats needs --incremental")
+    if args.parse_jobs > 1 and args.frontend != "fast":
+        parser.error("--parse-jobs needs --frontend=fast")
+    if args.ir_format is not None and not args.ir:
+        parser.error("--ir-format needs -ir")
+    if args.batch is not None and args.parse_jobs > 1:
+        parser.error("--parse-jobs cannot be used with --batch, whose files are already spread over --jobs")
+    if args.infile is None and args.batch is None and args.serve is None and not args.cache_stats:
+        parser.error("an input file, --batch DIR or --serve is required")
+    try:
+        args.pass_manager = pass_manager(args)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def split_list(values):
+    """
+    ["a,b", "c"] -> ["a", "b", "c"]
+    """
+    return [name for value in values for name in value.split(",") if name]
+
+
+def pass_manager(args):
+    """
+    :return: the PassManager of the -O, --passes, --disable-pass, --print-after and --ssa options, None when
+        they ask for nothing but the asm of the stack IR
+    """
+    if args.opt_level == 0 and args.passes is None and not args.print_after and not args.ssa:
+        if args.disable_pass:  # nothing to leave out, but the names are checked as at the other levels
+            from minidecaf.passes import PASSES
+            unknown = [name for name in split_list(args.disable_pass) if name not in PASSES]
+            if unknown:
+                raise ValueError(f"unknown pass {unknown[0]}, the passes are {', '.join(PASSES)}")
+        return None
+    from minidecaf.passes import PassManager
+    passes = None if args.passes is None else split_list([args.passes])
+    return PassManager.for_level(args.opt_level, passes, split_list(args.disable_pass), split_list(args.print_after),
+                                 args.ssa)
 
 
-def my_parser(token_stream):
+def my_parser(token_stream, mode="sll"):
     """
     Parser function with call to auto generated parser
 
+    in sll mode the parser first predicts with SLL, which does not look at the calling context and so is much
+    cheaper on the left recursive expression rules. SLL never accepts an invalid input, but it can bail on a
+    valid one, then the input is parsed again with full LL prediction; either way the tree is the same as
+    in ll mode. See parse_counters.
+    the generated parser recurses once per nesting level of the source, so a nesting deeper than the recursion
+    limit is reported as an error, which --frontend=fast does not have
+
     :param token_stream:
+    :param mode: one of PARSE_MODES
     :return ast_tree:
     """
-    parser = MiniDecafParser(token_stream)
+    import antlr4
+    parser = parser_classes()[1](token_stream)
     parser._errHandler = antlr4.BailErrorStrategy()
-    tree = parser.prog()
-    return tree
+    try:
+        return _predict(parser, mode)
+    except RecursionError:
+        raise Exception("nesting too deep for the antlr frontend, try --frontend=fast") from None
+
+
+def _predict(parser, mode: str):
+    from antlr4.atn.PredictionMode import PredictionMode
+    from antlr4.error.Errors import ParseCancellationException
+    if mode == "sll":
+        parser._interp.predictionMode = PredictionMode.SLL
+        try:
+            tree = parser.prog()
+            parse_counters["sll"] += 1
+            return tree
+        except ParseCancellationException:
+            parse_counters["ll_fallback"] += 1
+        parser.reset()  # rewinds the token stream too
+        parser._interp.predictionMode = PredictionMode.LL
+    else:
+        parse_counters["ll"] += 1
+    try:
+        return parser.prog()
+    except ParseCancellationException:
+        parse_counters["errors"] += 1
+        raise
 
 
 def my_lexer(input_stream):
@@ -50,65 +201,248 @@ def my_lexer(input_stream):
     :param input_stream:
     :return token_stream:
     """
-    lexer = MiniDecafLexer(input_stream)
+    import antlr4
+    lexer = parser_classes()[0](input_stream)
     token_stream = antlr4.CommonTokenStream(lexer)
     return token_stream
 
 
-def gen_ir(tree, name_manager, type_info):
+def gen_ir(program, name_manager, type_info, instrument=NullInstrument(), on_function=None, release=False,
+           compact=False):
     """
     generate intermediate representation for the input C file
 
-    :param tree:
+    :param program: the syntax tree, see syntax.py
     :param name_manager:
     :param type_info:
+    :param instrument:
+    :param on_function: see IRContainer, the functions are kept in the container when None
+    :param release: free every function of program, name_manager and type_info once its IR is generated,
+        which leaves them unusable afterwards
+    :param compact: pack the instructions of every function kept, see IRContainer
     :return ir_container:
     """
-    ir_container = IRContainer()
-    IRGenerator(ir_container, name_manager, type_info).visit(tree)
+    from minidecaf.IRContainer import IRContainer
+    from minidecaf.IRGenerator import IRGenerator
+    ir_container = IRContainer(on_function, compact)
+    ir_generator = IRGenerator(ir_container, name_manager, type_info, release)
+    watch_functions(instrument, "gen_ir", ir_generator)
+    ir_generator.visit(program)
     return ir_container
 
 
-def gen_asm(ir: IRContainer, output_file):
+def gen_asm(ir, output_file, instrument=NullInstrument(), passes=None):
     """
     Assembly generator from IR
     :param ir:
-    :param output_file:
+    :param output_file: None for stdout, a file name, or an opened file which is left open
+    :param instrument:
+    :param passes: see AsmGenerator
+    """
+    from minidecaf.AsmGenerator import AsmGenerator
+    from minidecaf.AsmWriter import AsmWriter
+
+    def generate(out_file):
+        asm_generator = AsmGenerator(AsmWriter(out_file), passes)
+        instrument.watch("gen_asm", asm_generator, "generate_function", lambda func: func.name)
+        asm_generator.generate(ir)
+
+    with_output_file(output_file, generate)
+
+
+def with_output_file(output_file, write):
+    """
+    call write with the opened output_file: None for stdout, a file name, or an opened file which is left open
     """
     if output_file is None:  # >out.S as command line instruction
-        asm_writer = AsmWriter(sys.stdout)
-    else:  # out.S as command line instruction
+        write(sys.stdout)
+    elif isinstance(output_file, str):  # out.S as command line instruction
         with open(output_file, 'w') as out_file:
-            asm_writer = AsmWriter(out_file)
+            write(out_file)
+    else:  # file object handed in by the caller
+        write(output_file)
+
+
+def render_asm(ir, passes=None):
+    """
+    generate the assembly for ir into a string
+    """
+    buf = io.StringIO()
+    gen_asm(ir, buf, passes=passes)
+    return buf.getvalue()
 
-    asm_generator = AsmGenerator(asm_writer)
-    asm_generator.generate(ir)
-    asm_writer.close()
 
+def render_tac(ir, passes=None):
+    """
+    the three-address IR in SSA form of every function of ir, after the ir and ssa passes, what -ir prints with
+    --ssa
+    """
+    from minidecaf.passes import PassManager
+    passes = passes or PassManager(ssa=True)
+    texts = []
+    for func in ir.funcs:
+        tac_func = passes.lower(passes.run_ir(func), destruct=False)
+        if tac_func is None:
+            texts.append(f"{func.name}: not lowered, its stack depth differs between paths\n")
+        else:
+            texts.append(str(tac_func))
+    return "".join(texts)
+
+
+def watch_functions(instrument, phase, visitor):
+    """
+    let the instrument measure every function definition the visitor goes through
+    """
+    instrument.watch(phase, visitor, "visitFuncDef", lambda node: node.name)
 
-def name_parse(tree):
+
+def name_parse(program, instrument=NullInstrument()):
     """
     name parsing for AST
-    :param tree:
+    :param program: the syntax tree, see syntax.py
+    :param instrument:
     :return:
     """
+    from minidecaf.NameParser import NameParser
     name_parser = NameParser()
-    name_parser.visit(tree)
+    watch_functions(instrument, "name_parse", name_parser)
+    name_parser.visit(program)
     return name_parser.funcNameManager
 
 
-def check_type(tree, name_info):
+def check_type(program, name_info, instrument=NullInstrument()):
     """
     type check for ast
-    :param tree:
+    :param program: the syntax tree, see syntax.py
     :param name_info:
+    :param instrument:
     :return:
     """
+    from minidecaf.typer import Typer
     type_checker = Typer(name_info)
-    type_checker.visit(tree)
+    watch_functions(instrument, "check_type", type_checker)
+    type_checker.visit(program)
     return type_checker.typeInfo
 
 
+def check_semantics(program, instrument=NullInstrument()):
+    """
+    name parsing and type checking in one traversal, see semantic.py
+    :param program: the syntax tree, see syntax.py
+    :param instrument:
+    :return: (the result of name_parse, the result of check_type)
+    """
+    from minidecaf.semantic import SemanticChecker
+    checker = SemanticChecker()
+    watch_functions(instrument, "semantic", checker)
+    checker.visit(program)
+    return checker.funcNameManager, checker.typeInfo
+
+
+def parse_tree(input_stream, instrument=NullInstrument(), parse_mode="sll", frontend="antlr"):
+    """
+    lex and parse an input stream
+
+    :param input_stream:
+    :param instrument:
+    :param parse_mode: see my_parser
+    :param frontend: one of FRONTENDS, the trees of both are the same
+    :return ast_tree:
+    """
+    if frontend == "fast":
+        with instrument.phase("startup"):
+            from minidecaf.fastparser import FastParser, tokenize
+        with instrument.phase("lex"):
+            tokens = tokenize(input_stream.strdata)
+        with instrument.phase("parse"):
+            return FastParser(tokens).parse()
+    with instrument.phase("startup"):  # lazy imports and the warm parser cache
+        parser_classes()
+    with instrument.phase("lex"):
+        token_stream = my_lexer(input_stream)
+        token_stream.fill()
+    with instrument.phase("parse"):
+        return my_parser(token_stream, parse_mode)
+
+
+def lower_tree(tree, instrument=NullInstrument()):
+    """
+    lower a parse tree to the syntax tree the passes run on, see syntax.py
+    the parse tree is not referred to afterwards, so it is freed once the caller drops it
+
+    :param tree:
+    :param instrument:
+    :return program:
+    """
+    with instrument.phase("lower"):
+        from minidecaf.syntax import lower
+        return lower(tree)
+
+
+def compile_ir(input_stream, instrument=NullInstrument(), on_function=None, parse_mode="sll", frontend="antlr",
+               semantic="split", parse_jobs=1, compact_ir=False):
+    """
+    run the whole frontend on an input stream
+    every call builds its own passes, so it can be called many times in one process
+
+    :param input_stream:
+    :param instrument: measures each phase, see instrument.py
+    :param on_function: see IRContainer
+    :param parse_mode: see my_parser
+    :param frontend: see parse_tree
+    :param semantic: one of SEMANTIC_MODES
+    :param parse_jobs: with the fast frontend, parse in this many worker processes, see parallel.py
+    :param compact_ir: see gen_ir
+    :return ir_container:
+    """
+    if frontend == "fast" and parse_jobs > 1:
+        with instrument.phase("startup"):
+            from minidecaf.parallel import parse_parallel
+        program = parse_parallel(input_stream.strdata, parse_jobs, instrument)
+    else:
+        program = lower_tree(parse_tree(input_stream, instrument, parse_mode, frontend), instrument)
+    if semantic == "fused":
+        with instrument.phase("semantic"):
+            name_manager, type_info = check_semantics(program, instrument)
+    else:
+        with instrument.phase("name_parse"):
+            name_manager = name_parse(program, instrument)
+        with instrument.phase("check_type"):
+            type_info = check_type(program, name_manager, instrument)
+    with instrument.phase("gen_ir"):
+        return gen_ir(program, name_manager, type_info, instrument, on_function, release=True, compact=compact_ir)
+
+
+def compile_asm(input_stream, output_file, instrument=NullInstrument(), parse_mode="sll", frontend="antlr",
+                semantic="split", parse_jobs=1, passes=None):
+    """
+    compile an input stream to assembly, writing every function out as soon as its IR is generated
+    so the IR of the whole program is never held in memory; the output is the same as gen_asm(compile_ir(...))
+    the gen_asm records of the functions are taken inside the gen_ir phase, whose time includes them
+
+    :param input_stream:
+    :param output_file: as for gen_asm
+    :param instrument:
+    :param parse_mode: see my_parser
+    :param frontend: see parse_tree
+    :param semantic: see compile_ir
+    :param parse_jobs: see compile_ir
+    :param passes: see AsmGenerator
+    """
+    from minidecaf.AsmGenerator import AsmGenerator
+    from minidecaf.AsmWriter import AsmWriter
+
+    def generate(out_file):
+        asm_generator = AsmGenerator(AsmWriter(out_file), passes)
+        instrument.watch("gen_asm", asm_generator, "generate_function", lambda func: func.name)
+        ir = compile_ir(input_stream, instrument, asm_generator.stream_function, parse_mode, frontend, semantic,
+                        parse_jobs)
+        with instrument.phase("gen_asm"):
+            asm_generator.finish_stream(ir)
+
+    with_output_file(output_file, generate)
+
+
 def main():
     """
     Main entry for minidecaf parser
@@ -116,13 +450,186 @@ def main():
     :return:
     """
     args = parse_args()
-    input_stream = antlr4.FileStream(args.infile)
-    token_stream = my_lexer(input_stream)
-    tree = my_parser(token_stream)
-    name_manager = name_parse(tree)
-    type_info = check_type(tree, name_manager)
-    ir = gen_ir(tree, name_manager, type_info)
-    if args.ir:
-        print(ir)  # easy for debugging using intermediate representation
+    if args.startup_report:
+        from minidecaf.startup import ImportTimer
+        timer = ImportTimer()
+        timer.install()
+        try:
+            run(args)
+        finally:
+            timer.uninstall()
+            timer.report()
+    else:
+        run(args)
+
+
+def run(args):
+    """
+    do what the command line asks for
+    """
+    use_parser_cache(None if args.no_parser_cache else default_parser_cache_dir())
+    if args.batch is not None:
+        from minidecaf.batch import run_batch
+        sys.exit(run_batch(args.batch, args.jobs, args.ir, passes=args.pass_manager, frontend=args.frontend,
+                           semantic=args.semantic, parse_mode=args.parse_mode, ssa=args.ssa))
+    if args.serve is not None:
+        from minidecaf.server import serve
+        serve(args.serve or None)
+        return
+    if args.from_ir:
+        from_ir_main(args)
+        return
+    # what is reused does not go through the passes, so there would be nothing for --print-after to print
+    reuse = not args.run_ir and args.ir_format is None and not args.print_after
+    if args.incremental is not None and reuse:
+        incremental_main(args)
+        return
+    if args.cache_dir is not None and reuse:
+        cached_main(args)
+        return
+    import antlr4
+    instrument = make_instrument(args)
+    if args.run_ir:
+        from minidecaf.irexec import run_ir
+        ir = compile_ir(antlr4.FileStream(args.infile), instrument, parse_mode=args.parse_mode,
+                        frontend=args.frontend, semantic=args.semantic, parse_jobs=args.parse_jobs,
+                        compact_ir=args.compact_ir)
+        save_parser_cache()
+        sys.exit(run_ir(ir) & 0xff)
+    try:
+        if args.ir:
+            ir = compile_ir(antlr4.FileStream(args.infile), instrument, parse_mode=args.parse_mode,
+                            frontend=args.frontend, semantic=args.semantic, parse_jobs=args.parse_jobs,
+                            compact_ir=args.compact_ir)
+            if args.ssa:
+                sys.stdout.write(render_tac(ir, args.pass_manager))
+            elif args.ir_format is not None:
+                from minidecaf.irfile import write_ir
+                write_ir(ir, args.outfile, args.ir_format)
+            else:
+                print(ir)  # easy for debugging using intermediate representation
+        else:
+            compile_asm(antlr4.FileStream(args.infile), args.outfile, instrument, args.parse_mode, args.frontend,
+                        args.semantic, args.parse_jobs, args.pass_manager)
+    finally:
+        print_stats(args)
+    save_parser_cache()
+    report_instrument(args, instrument)
+
+
+def print_stats(args):
+    """
+    print the counters asked for by --parse-stats and --analysis-stats to stderr
+    """
+    if args.parse_stats:
+        for name, value in parse_counters.items():
+            print(f"minidecaf_parse_{name} {value}", file=sys.stderr)
+    if args.analysis_stats:
+        from minidecaf.analysis import print_counters
+        print_counters()
+
+
+def make_instrument(args):
+    """
+    :return: the Instrument asked for by --time-passes, --mem-report, --time-passes-json or --profile-phase
+    """
+    if args.time_passes or args.mem_report or args.time_passes_json or args.profile_phase:
+        from minidecaf.instrument import Instrument
+        return Instrument(args.mem_report, args.profile_phase, args.profile_out)
+    return NullInstrument()
+
+
+def report_instrument(args, instrument):
+    if args.time_passes or args.mem_report:
+        instrument.report()
+    if args.time_passes_json:
+        instrument.dump_json(args.time_passes_json)
+
+
+def from_ir_main(args):
+    """
+    main() on an IR file (see irfile.py): the backend runs on the IR read from it, the frontend not at all
+    """
+    from minidecaf.irfile import read_ir, write_ir
+    instrument = make_instrument(args)
+    with instrument.phase("read_ir"):
+        ir = read_ir(args.infile)
+    if args.run_ir:
+        from minidecaf.irexec import run_ir
+        sys.exit(run_ir(ir) & 0xff)
+    try:
+        if args.ir and args.ssa:
+            sys.stdout.write(render_tac(ir, args.pass_manager))
+        elif args.ir:  # convert between the forms
+            write_ir(ir, args.outfile, args.ir_format or "text")
+        else:
+            with instrument.phase("gen_asm"):
+                gen_asm(ir, args.outfile, instrument, args.pass_manager)
+    finally:
+        if args.analysis_stats:
+            from minidecaf.analysis import print_counters
+            print_counters()
+    report_instrument(args, instrument)
+
+
+def cached_main(args):
+    """
+    main() going through the on-disk cache, the ANTLR tree is only built on a miss; the key holds every option
+    the output may depend on, and the instrument and the counters only see the phases of a miss
+    """
+    from minidecaf.cache import CompileCache
+    cache = CompileCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    if args.cache_stats:
+        for name, value in cache.stats().items():
+            print(f"minidecaf_cache_{name} {value}")
+        return
+    with open(args.infile, 'rb') as f:
+        source = f.read()
+    passes = args.pass_manager
+    key = cache.key(source, ir=args.ir, passes=None if passes is None else passes.signature(),
+                    frontend=args.frontend, semantic=args.semantic, parse_mode=args.parse_mode)
+    text = cache.get(key)
+    instrument = make_instrument(args)
+    if text is None:
+        import antlr4
+        try:
+            ir = compile_ir(antlr4.InputStream(source.decode()), instrument, parse_mode=args.parse_mode,
+                            frontend=args.frontend, semantic=args.semantic, parse_jobs=args.parse_jobs)
+            with instrument.phase("gen_asm"):
+                if args.ir:
+                    text = render_tac(ir, passes) if args.ssa else f"{ir}\n"
+                else:
+                    text = render_asm(ir, passes)
+        finally:
+            print_stats(args)
+        cache.put(key, text)
+        save_parser_cache()
+    if args.ir or args.outfile is None:
+        sys.stdout.write(text)
+    else:
+        with open(args.outfile, 'w') as f:
+            f.write(text)
+    report_instrument(args, instrument)
+
+
+def incremental_main(args):
+    """
+    main() compiling only the functions changed since the last run, see incremental.py
+    """
+    from minidecaf.cache import CompileCache
+    from minidecaf.incremental import compile_incremental, print_counters
+    store = CompileCache(args.incremental, args.cache_size * 1024 * 1024)
+    with open(args.infile) as f:
+        source = f.read()
+    try:
+        text = compile_incremental(source, store, args.ir, args.parse_mode, args.frontend, args.semantic,
+                                   args.pass_manager)
+    finally:
+        if args.incremental_stats:
+            print_counters()
+    save_parser_cache()
+    if args.ir or args.outfile is None:
+        sys.stdout.write(text)
     else:
-        gen_asm(ir, args.outfile)
+        with open(args.outfile, 'w') as f:
+            f.write(text)
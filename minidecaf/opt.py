@@ -0,0 +1,317 @@
+"""
+Optimizations of the three-address IR (see tac.py), the ssa and tac passes of passes.py
+the ones on SSA form count on every register being defined once, so a use can be replaced by what its
+definition computes wherever it is in the function. The values are computed as the assembly computes them,
+see rvsim.s32/div32/rem32.
+
+every pass takes the AnalysisManager of the function and returns the analyses it preserved, see analysis.py
+"""
+from minidecaf.analysis import ALL_ANALYSES, CFG_ANALYSES, NO_ANALYSES, AnalysisManager, reverse_postorder
+from minidecaf.rvsim import div32, rem32, s32
+from minidecaf.tac import Binary, CondJump, Const, Copy, FrameAddr, GlobalAddr, Jump, Load, LoadSlot, Phi, Unary
+
+BINARY = {
+    '+': lambda x, y: s32(x + y), '-': lambda x, y: s32(x - y), '*': lambda x, y: s32(x * y),
+    '/': div32, '%': rem32,
+    '==': lambda x, y: int(x == y), '!=': lambda x, y: int(x != y), '<': lambda x, y: int(x < y),
+    '<=': lambda x, y: int(x <= y), '>': lambda x, y: int(x > y), '>=': lambda x, y: int(x >= y),
+    '&&': lambda x, y: int(x != 0 and y != 0), '||': lambda x, y: int(x != 0 or y != 0),
+}
+UNARY = {'-': lambda x: s32(-x), '~': lambda x: ~x, '!': lambda x: int(x == 0)}
+COMMUTATIVE = {'+', '*', '==', '!=', '&&', '||'}
+
+PURE = (Const, Copy, Unary, Binary, FrameAddr, GlobalAddr, Load, LoadSlot, Phi)  # nothing but their value
+NUMBERED = (Const, Unary, Binary, FrameAddr, GlobalAddr)  # the same value for the same operands, see gvn
+
+
+def fold_binary(op: str, x: int, y: int):
+    return BINARY[op](s32(x), s32(y))
+
+
+def fold_unary(op: str, x: int):
+    return UNARY[op](s32(x))
+
+
+def remove_unreachable(func):
+    """
+    after terminators changed: drop the blocks the entry no longer reaches, keeping the order of the others,
+    and the incoming values of the phis for the edges that are gone
+    """
+    func.link()
+    reachable = set(reverse_postorder(func))
+    if len(reachable) < len(func.blocks):
+        func.blocks = [block for block in func.blocks if block in reachable]
+        func.link()
+    for block in func.blocks:
+        phis = block.phis()
+        if phis:
+            preds = set(block.preds)
+            for phi in phis:
+                phi.incoming = {pred: reg for pred, reg in phi.incoming.items() if pred in preds}
+
+
+def copy_prop(func, analyses=None):
+    """
+    replace the uses of a copy, and of a phi whose incoming values are all the same, by its source
+    """
+    preserved = ALL_ANALYSES
+    while True:
+        source = {}
+        for block in func.blocks:
+            for instr in block.instrs:
+                if instr.__class__ is Copy:
+                    source[instr.dst] = instr.args[0]
+                elif instr.__class__ is Phi:
+                    values = set(instr.incoming.values())
+                    values.discard(instr.dst)
+                    if len(values) == 1:
+                        source[instr.dst] = values.pop()
+        if not source:
+            return preserved
+
+        def find(reg):
+            seen = set()
+            while reg in source:
+                if reg in seen:  # phis only taking each other's values, which are never defined
+                    return None
+                seen.add(reg)
+                reg = source[reg]
+            return reg
+
+        resolved = {}
+        for reg in source:
+            root = find(reg)
+            if root is not None:
+                resolved[reg] = root
+        if not resolved:
+            return preserved
+        preserved = CFG_ANALYSES
+        for block in func.blocks:
+            block.instrs = [instr for instr in block.instrs if instr.dst not in resolved]
+            for instr in block.instrs:
+                instr.replace_uses(lambda reg: resolved.get(reg, reg))
+
+
+def const_prop(func, analyses=None):
+    """
+    fold the operations on constants, and the conditional jumps on them, which can leave blocks unreachable
+    """
+    values = {}
+    jumps_changed = folded = False
+    changed = True
+    while changed:
+        changed = False
+        for block in func.blocks:
+            instrs = block.instrs
+            for i, instr in enumerate(instrs):
+                cls = instr.__class__
+                if cls is Const:
+                    values[instr.dst] = instr.v
+                    continue
+                if cls is Phi or not instr.args or any(arg not in values for arg in instr.args):
+                    continue
+                if cls is Binary:
+                    v = fold_binary(instr.op, values[instr.args[0]], values[instr.args[1]])
+                elif cls is Unary:
+                    v = fold_unary(instr.op, values[instr.args[0]])
+                elif cls is Copy:
+                    v = values[instr.args[0]]
+                elif cls is CondJump:
+                    taken = (values[instr.args[0]] == 0) == (instr.op == "beqz")
+                    instrs[i] = Jump(instr.target if taken else instr.fallthrough)
+                    jumps_changed = True
+                    continue
+                else:
+                    continue
+                instrs[i] = Const(instr.dst, v)
+                values[instr.dst] = v
+                changed = folded = True
+    if jumps_changed:
+        remove_unreachable(func)
+        return NO_ANALYSES
+    return CFG_ANALYSES if folded else ALL_ANALYSES
+
+
+def dce(func, analyses=None):
+    """
+    drop the instructions whose value is never used and that do nothing else
+    """
+    defs = {}
+    work = []
+    for block in func.blocks:
+        for instr in block.instrs:
+            if instr.__class__ in PURE:
+                defs[instr.dst] = instr
+            else:
+                work.extend(instr.uses())
+    live = set()
+    while work:
+        reg = work.pop()
+        if reg not in live:
+            live.add(reg)
+            if reg in defs:
+                work.extend(defs[reg].uses())
+    preserved = ALL_ANALYSES
+    for block in func.blocks:
+        instrs = [instr for instr in block.instrs if instr.__class__ not in PURE or instr.dst in live]
+        if len(instrs) < len(block.instrs):
+            block.instrs = instrs
+            preserved = CFG_ANALYSES
+    return preserved
+
+
+def _value_key(instr):
+    cls = instr.__class__
+    if cls is Const:
+        return cls, instr.v
+    if cls is Unary:
+        return cls, instr.op, instr.args[0]
+    if cls is Binary:
+        lhs, rhs = instr.args
+        if instr.op in COMMUTATIVE and lhs.n > rhs.n:
+            lhs, rhs = rhs, lhs
+        return cls, instr.op, lhs, rhs
+    if cls is FrameAddr:
+        return cls, instr.offset
+    return cls, instr.sym
+
+
+def gvn(func, analyses=None):
+    """
+    value numbering over the dominator tree: an instruction computing what one dominating it computed already
+    is dropped, and its uses take the value of that one
+    """
+    dom = (analyses or AnalysisManager(func)).get("dominators")
+    order, children = dom.order, dom.children
+    table = {}
+    replaced = {}
+
+    def current(reg):
+        return replaced.get(reg, reg)
+
+    work = [(order[0], None)]
+    while work:
+        block, added = work.pop()
+        if added is not None:  # leaving block
+            for key in added:
+                del table[key]
+            continue
+        added = []
+        for instr in block.instrs:
+            if instr.__class__ not in NUMBERED:
+                continue
+            instr.replace_uses(current)
+            key = _value_key(instr)
+            if key in table:
+                replaced[instr.dst] = table[key]
+            else:
+                table[key] = instr.dst
+                added.append(key)
+        work.append((block, added))
+        work.extend((child, None) for child in reversed(children[block]))
+    if not replaced:
+        return ALL_ANALYSES
+    for block in func.blocks:
+        block.instrs = [instr for instr in block.instrs if instr.dst not in replaced]
+        for instr in block.instrs:
+            instr.replace_uses(current)
+    return CFG_ANALYSES
+
+
+def simplify_cfg(func, analyses=None):
+    """
+    once the phis are gone: a jump to a block holding nothing but a jump goes where that one jumps, a block
+    only reached by a jump from the block before it is merged into that, and the blocks no longer reached
+    are dropped
+    """
+    def forward(block):
+        seen = set()
+        while len(block.instrs) == 1 and block.instrs[0].__class__ is Jump and block not in seen:
+            seen.add(block)
+            block = block.instrs[0].target
+        return block
+
+    count = len(func.blocks)
+    changed = False
+    for block in func.blocks:
+        last = block.terminator()
+        for target in set(last.targets()):
+            final = forward(target)
+            if final is not target:
+                last.retarget(target, final)
+                changed = True
+        if last.__class__ is CondJump and last.target is last.fallthrough:  # the condition does nothing else
+            block.instrs[-1] = Jump(last.target)
+            changed = True
+    remove_unreachable(func)
+
+    merged = set()
+    for block in func.blocks:
+        if block in merged:
+            continue
+        while True:
+            last = block.terminator()
+            if last.__class__ is not Jump:
+                break
+            succ = last.target
+            if succ is block or len(succ.preds) != 1:
+                break
+            block.instrs[-1:] = succ.instrs
+            block.succs = succ.succs
+            for after in succ.succs:
+                after.preds = [block if pred is succ else pred for pred in after.preds]
+            merged.add(succ)
+    if merged:
+        func.blocks = [block for block in func.blocks if block not in merged]
+    return NO_ANALYSES if changed or len(func.blocks) < count else ALL_ANALYSES
+
+
+def share_slots(func, analyses=None):
+    """
+    give registers that are never live at the same time the same frame slot (see tac.Frame), a copy the slot
+    of its source where it can: two registers interfere if one is defined while the other is live, but for the
+    source of a copy, which holds the same value
+    """
+    liveness = (analyses or AnalysisManager(func)).get("liveness")
+    interfere = {}  # register number -> the bitset of the registers live where it is defined
+    hints = {}
+    regs = []
+    for block in func.blocks:
+        live = liveness.liveOut.get(block, 0)  # nothing is live in a block never reached
+        for instr in reversed(block.instrs):
+            dst = instr.dst
+            if dst is not None:
+                bit = 1 << dst.n
+                others = live & ~bit
+                if instr.__class__ is Copy:
+                    others &= ~(1 << instr.args[0].n)
+                    hints[dst] = instr.args[0]
+                if dst.n not in interfere:
+                    interfere[dst.n] = 0
+                    regs.append(dst)
+                interfere[dst.n] |= others
+                live &= ~bit
+            for reg in instr.uses():
+                live |= 1 << reg.n
+    regs.sort(key=lambda reg: reg.n)
+    members = []  # slot -> the bitset of its registers
+    conflicts = []  # slot -> the bitset of the registers interfering with one of them
+    slots = {}
+    for reg in regs:
+        mine = interfere[reg.n]
+        candidates = range(len(members))
+        hint = slots.get(hints.get(reg))
+        if hint is not None:
+            candidates = [hint, *candidates]
+        for slot in candidates:
+            if not members[slot] & mine and not conflicts[slot] >> reg.n & 1:
+                break
+        else:
+            slot = len(members)
+            members.append(0)
+            conflicts.append(0)
+        members[slot] |= 1 << reg.n
+        conflicts[slot] |= mine
+        slots[reg] = slot
+    func.slots = slots
+    return ALL_ANALYSES
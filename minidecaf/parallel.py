@@ -0,0 +1,115 @@
+"""
+Parallel parsing, used with --frontend=fast --parse-jobs N
+the top-level declarations of a program do not depend on each other syntactically, so the tokens are cut into
+chunks of whole declarations, and a pool of worker processes parses (with fastparser.py) and lowers (see
+syntax.py) the chunks; the nodes they send back are put together into the Program. The nids of the nodes are
+counted per top-level declaration, so they come out the same as on the serial path.
+
+The cuts are made only after a '}' or ';' outside of any braces that is followed by 'int', which always ends
+a declaration. Whatever goes wrong in the chunks (a syntax error, no main or two of them, a tree too deep to be
+sent back) is left to the serial parser, which gives the same result or error as without --parse-jobs.
+"""
+import io
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from minidecaf.fastparser import INT, LBRACE, RBRACE, SEMI, FastParser, tokenize
+from minidecaf.instrument import NullInstrument
+from minidecaf.syntax import FuncDef, Program, lower, without_gc
+
+MIN_CHUNK_TOKENS = 2000  # smaller chunks cost more to send around than to parse
+CHUNKS_PER_JOB = 4  # so that the workers are kept busy when the declarations differ in size
+
+_pools = {}  # jobs -> ProcessPoolExecutor, kept for the next compilation
+
+
+def _pool(jobs: int):
+    pool = _pools.get(jobs)
+    if pool is None:
+        # forked workers start with the parser already imported
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        pool = _pools[jobs] = ProcessPoolExecutor(jobs, mp_context=context)
+    return pool
+
+
+def cut_points(types):
+    """
+    :param types: the token types, ending with EOF
+    :return: the indices of the tokens a top-level declaration starts at, but for the first one
+    """
+    points = []
+    depth = 0
+    for i, ttype in enumerate(types):
+        if ttype == LBRACE:
+            depth += 1
+        elif ttype == RBRACE:
+            depth -= 1
+            if depth == 0 and types[i + 1] == INT:
+                points.append(i + 1)
+        elif ttype == SEMI and depth == 0 and types[i + 1] == INT:
+            points.append(i + 1)
+    return points
+
+
+def split_chunks(tokens, jobs: int):
+    """
+    :return: [(first token, token after the last)] of the chunks, of about the same number of tokens
+    """
+    end = len(tokens) - 1  # EOF
+    n_chunks = min(jobs * CHUNKS_PER_JOB, end // MIN_CHUNK_TOKENS)
+    if n_chunks < 2:
+        return [(0, end)]
+    chunks = []
+    first = 0
+    for point in cut_points([token.type for token in tokens]):
+        if point - first >= end // n_chunks:
+            chunks.append((first, point))
+            first = point
+    if first < end:
+        chunks.append((first, end))
+    return chunks
+
+
+def parse_chunk(text: str):
+    """
+    run in the workers
+
+    :param text: source of whole top-level declarations
+    :return: their nodes, pickled
+    """
+    # a character no token starts with has been reported by the tokenize of the whole source
+    tokens = tokenize(text, io.StringIO())
+    nodes = [lower(ctx) for ctx in FastParser(tokens).parse_decls()]
+    return without_gc(pickle.dumps, nodes, pickle.HIGHEST_PROTOCOL)
+
+
+def parse_parallel(text: str, jobs: int, instrument=NullInstrument()):
+    """
+    :return: the Program of text, the same as lower(fast_parse(text))
+    """
+    with instrument.phase("lex"):
+        tokens = tokenize(text)
+        chunks = split_chunks(tokens, jobs)
+    with instrument.phase("parse"):
+        decls = None
+        if len(chunks) > 1:
+            texts = [text[tokens[first].start:tokens[last].start] for first, last in chunks]
+            decls = []
+            try:
+                for nodes in _pool(jobs).map(parse_chunk, texts):
+                    decls += without_gc(pickle.loads, nodes)
+            except BrokenProcessPool:
+                del _pools[jobs]  # a worker died, the next compilation starts new ones
+                decls = None
+            except Exception:
+                decls = None  # the serial parser reports it
+            if decls is not None and sum(decl.__class__ is FuncDef and decl.name == 'main' for decl in decls) != 1:
+                decls = None
+        if decls is not None:
+            return Program(decls)
+        tree = FastParser(tokens).parse()
+    with instrument.phase("lower"):
+        return lower(tree)
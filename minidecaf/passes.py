@@ -0,0 +1,152 @@
+"""
+Pass manager, used with -O1/-O2, --passes, --disable-pass and --print-after
+a pass rewrites one function at one of the levels the backend goes through, in this order:
+
+- ir: the stack IR of the IRFunc (IRStr.py), a list of instructions
+- ssa: the three-address IR (tac.py) in SSA form, see ssa.to_ssa
+- tac: the three-address IR once the phis are gone, see ssa.from_ssa
+- asm: the assembly lines of the function
+
+the passes of a pipeline run level by level, and in the order they are given within a level; a pass can be
+given more than once. The ssa and tac passes need the function to be lowered to the three-address IR (see
+tac.lower), a function that cannot be lowered skips them and gets the assembly of its stack IR. They share
+the analyses of the function through an AnalysisManager (see analysis.py), which drops the ones a pass did
+not preserve. -O0 has no passes and does not lower, so its output is the one of the stack IR (AsmGenerator
+without passes).
+"""
+import sys
+
+from minidecaf.IRContainer import IRFunc
+from minidecaf.opt import const_prop, copy_prop, dce, gvn, share_slots, simplify_cfg
+from minidecaf.peephole import fold_ir, peephole
+
+LEVELS = ["ir", "ssa", "tac", "asm"]
+
+
+class Pass:
+    def __init__(self, name: str, level: str, run, description: str):
+        """
+        :param run: for the ir and asm levels, run(unit) returns the unit rewritten; for the ssa and tac levels
+            run(func, analyses) rewrites the TACFunc in place and returns the analyses it preserved
+        """
+        self.name = name
+        self.level = level
+        self.run = run
+        self.description = description
+
+
+PASSES = {p.name: p for p in [
+    Pass("fold-ir", "ir", fold_ir, "fold the operations on constants of the stack IR"),
+    Pass("copy-prop", "ssa", copy_prop, "replace the uses of copies and of trivial phis by their source"),
+    Pass("const-prop", "ssa", const_prop, "fold the operations and conditional jumps on constants"),
+    Pass("gvn", "ssa", gvn, "drop the computations done before on every path, over the dominator tree"),
+    Pass("dce", "ssa", dce, "drop the instructions whose value is never used"),
+    Pass("simplify-cfg", "tac", simplify_cfg, "thread jumps to jumps and merge straight-line blocks"),
+    Pass("share-slots", "tac", share_slots, "give registers never live at the same time the same frame slot"),
+    Pass("peephole", "asm", peephole, "drop reloads of a word just stored, pushes popped again, jumps to the next line"),
+]}
+
+PIPELINES = {
+    0: [],
+    1: ["fold-ir", "copy-prop", "const-prop", "copy-prop", "dce", "simplify-cfg", "peephole"],
+    2: ["fold-ir", "copy-prop", "const-prop", "copy-prop", "gvn", "copy-prop", "const-prop", "dce", "simplify-cfg",
+        "share-slots", "peephole"],
+}
+
+
+class PassManager:
+    """
+    a pipeline of passes, run on every function by AsmGenerator.generate_function
+    """
+
+    def __init__(self, names=(), print_after=(), ssa=False, out=None):
+        """
+        :param names: the passes, in order, see PASSES
+        :param print_after: print the function after each of these passes ("all" for every pass) to out
+        :param ssa: lower every function to the three-address IR even if no pass needs it
+        :param out: where print_after goes, stderr if None
+        """
+        unknown = [name for name in list(names) + list(print_after) if name not in PASSES and name != "all"]
+        if unknown:
+            raise ValueError(f"unknown pass {unknown[0]}, the passes are {', '.join(PASSES)}")
+        self.names = list(names)
+        self.passes = {level: [PASSES[name] for name in self.names if PASSES[name].level == level]
+                       for level in LEVELS}
+        self.printAfter = set(print_after)
+        self.ssa = ssa
+        self.lowers = ssa or bool(self.passes["ssa"] or self.passes["tac"])
+        self.out = out
+
+    @classmethod
+    def for_level(cls, level: int, passes=None, disable=(), print_after=(), ssa=False):
+        """
+        :param level: the -O level, its pipeline is taken unless passes is given
+        :param disable: passes left out of the pipeline
+        """
+        names = PIPELINES[level] if passes is None else passes
+        unknown = [name for name in disable if name not in PASSES]
+        if unknown:
+            raise ValueError(f"unknown pass {unknown[0]}, the passes are {', '.join(PASSES)}")
+        return cls([name for name in names if name not in disable], print_after, ssa)
+
+    def signature(self):
+        """
+        :return: what the output depends on, for the keys of the cache
+        """
+        return f"{','.join(self.names)};lowers={int(self.lowers)};ssa={int(self.ssa)}"
+
+    def has(self, level: str):
+        return bool(self.passes[level])
+
+    def run(self, level: str, func_name: str, unit, analyses=None):
+        """
+        run the passes of level on unit, of the function func_name
+        :param analyses: the AnalysisManager of unit, for the ssa and tac levels
+        :return: the unit rewritten
+        """
+        for p in self.passes[level]:
+            if analyses is None:
+                unit = p.run(unit)
+            else:
+                analyses.invalidate(p.run(unit, analyses))
+            if p.name in self.printAfter or "all" in self.printAfter:
+                self._print(p.name, func_name, level, unit)
+        return unit
+
+    def _print(self, name: str, func_name: str, level: str, unit):
+        if level == "ir":
+            text = "".join(f"\t{ir}\n" for ir in unit)
+        elif level == "asm":
+            text = "".join(f"{line}\n" for line in unit)
+        else:
+            text = str(unit).split("\n", 1)[1]
+        print(f"; after {name} on {func_name}\n{func_name}:\n{text}", end="", file=self.out or sys.stderr)
+
+    def run_ir(self, func):
+        """
+        :return: the IRFunc func after the ir passes, func itself if there are none
+        """
+        if not self.passes["ir"]:
+            return func
+        return IRFunc(func.name, func.paramInfo, self.run("ir", func.name, func.instructions))
+
+    def lower(self, func, destruct=True):
+        """
+        :param func: an IRFunc, after the ir passes
+        :param destruct: take the function out of SSA form and run the tac passes
+        :return: its TACFunc after the ssa passes (and the tac passes), or None if it cannot be lowered
+        """
+        from minidecaf.analysis import CFG_ANALYSES, NO_ANALYSES, AnalysisManager
+        from minidecaf.ssa import from_ssa, to_ssa
+        from minidecaf.tac import lower
+        tac_func = lower(func)
+        if tac_func is not None:
+            analyses = AnalysisManager(tac_func)
+            to_ssa(tac_func, analyses)
+            analyses.invalidate(CFG_ANALYSES)
+            self.run("ssa", func.name, tac_func, analyses)
+            if destruct:
+                from_ssa(tac_func)
+                analyses.invalidate(NO_ANALYSES)  # the critical edges are split
+                self.run("tac", func.name, tac_func, analyses)
+        return tac_func
@@ -0,0 +1,122 @@
+"""
+Peephole passes of passes.py, on the stack IR of a function and on its assembly
+both look at a few instructions at the end of what has been rewritten so far, so a rewrite can enable
+another one with the instructions before it.
+"""
+import re
+
+from minidecaf.IRStr import Binary, Branch, Const, Pop, Unary
+from minidecaf.opt import fold_binary, fold_unary
+from minidecaf.tac import IMM_MAX, IMM_MIN
+
+
+def fold_ir(instructions):
+    """
+    fold the operations on constants pushed right before them, and the conditional branches on them
+    :return: the new instructions, the ones handed in are left as they are
+    """
+    result = []
+    for ir in instructions:
+        cls = ir.__class__
+        if cls is Binary and len(result) >= 2 and result[-1].__class__ is Const and result[-2].__class__ is Const:
+            y = result.pop().v
+            x = result.pop().v
+            result.append(Const(fold_binary(ir.op, x, y)))
+        elif cls is Unary and result and result[-1].__class__ is Const:
+            result.append(Const(fold_unary(ir.op, result.pop().v)))
+        elif cls is Branch and ir.op != "br" and result and result[-1].__class__ is Const:
+            if (result.pop().v == 0) == (ir.op == "beqz"):
+                result.append(Branch("br", ir.label))
+        elif cls is Pop and result and result[-1].__class__ is Const:
+            result.pop()
+        else:
+            result.append(ir)
+    return result
+
+
+_MEMORY = re.compile(r"\t(lw|sw) (\w+), (-?\d+)\((\w+)\)$")
+_MOVE = re.compile(r"\tmv (\w+), (\w+)$")
+_SP = re.compile(r"\taddi sp, sp, (-?\d+)$")
+_JUMP = re.compile(r"\tj (\S+)$")
+
+
+def _memory(line: str):
+    """
+    :return: (op, register, offset, base) of a lw or sw, None for any other line
+    """
+    match = _MEMORY.match(line)
+    return match and match.groups()
+
+
+def _move(dst: str, src: str):
+    return [] if dst == src else [f"\tmv {dst}, {src}"]
+
+
+def _is_sp(line: str, amount: str):
+    match = _SP.match(line)
+    return match is not None and match.group(1) == amount
+
+
+def _rewrite(out):
+    """
+    rewrite the end of out in place
+    :return: whether it changed
+    """
+    last = out[-1]
+    match = _MOVE.match(last)
+    if match and match.group(1) == match.group(2):
+        del out[-1]
+        return True
+    if len(out) < 2:
+        return False
+    before = out[-2]
+    match = _SP.match(last)
+    if match:
+        if match.group(1) == "4":
+            # a push popped again: the word stored under sp is never read, the load of it became a mv
+            moved = out[-2:-1] if _MOVE.match(before) else []
+            push = -3 - len(moved)
+            if len(out) >= -push and _is_sp(out[push], "-4") and _memory(out[push + 1]) is not None \
+                    and _memory(out[push + 1])[0] == "sw" and _memory(out[push + 1])[2:] == ("0", "sp"):
+                out[push:] = moved
+                return True
+        other = _SP.match(before)
+        total = other and int(other.group(1)) + int(match.group(1))
+        if other and IMM_MIN <= total <= IMM_MAX:
+            out[-2:] = [f"\taddi sp, sp, {total}"] if total else []
+            return True
+        return False
+    match = _JUMP.match(before)
+    if match and last == f"{match.group(1)}:":
+        del out[-2]
+        return True
+    load = _memory(last)
+    if load is None or load[0] != "lw":
+        return False
+    _, reg, offset, base = load
+    previous = _memory(before)
+    if previous is None:
+        return False
+    if previous[0] == "sw" and previous[2:] == (offset, base):
+        out[-1:] = _move(reg, previous[1])  # the word just stored
+        return True
+    if len(out) >= 3 and previous[0] == "lw" and previous[3] == base and previous[2] != offset:
+        store = _memory(out[-3])
+        if store is not None and store[0] == "sw" and store[2:] == (offset, base) \
+                and previous[1] not in (store[1], base):
+            out[-1:] = _move(reg, store[1])  # stored before the load of another word
+            return True
+    return False
+
+
+def peephole(lines):
+    """
+    :param lines: the assembly lines of a function, without the newlines
+    :return: the lines rewritten
+    """
+    out = []
+    for line in lines:
+        out.append(line)
+        while out and _rewrite(out):
+            pass
+    return out
@@ -0,0 +1,583 @@
+"""
+RV32IM simulator for the assembly this compiler writes
+runs the text of AsmGenerator/AsmWriter directly, no assembler, linker or qemu needed:
+
+    python -m minidecaf.rvsim prog.S             # exit status is the one of the program
+    python -m minidecaf.rvsim --report prog.S    # plus instruction / load / store counts per function
+
+- .text is decoded once into one closure per instruction, a closure does its work and returns the next pc
+  (pcs are indices into the decoded program, ra holds such an index after a call)
+- .data/.comm globals are laid out from DATA_BASE on, the stack grows down from the top of the memory
+- memory is a list of 32-bit words, so lw/sw cost a list access; byte and half word accesses are
+  emulated on top of the words
+- instruction counts are in machine instructions: a pseudo instruction counts for every instruction
+  it assembles to without linker relaxation (la and call are 2, li is 1 or 2 depending on the constant)
+
+main is called with ra pointing past the program, the run ends when it returns (or on an exit ecall).
+lines are counted in the function they are written in, so the shared main_exit epilogue every return
+jumps to (see Ret.gen_asm) is counted in main.
+"""
+import argparse
+import sys
+
+DATA_BASE = 0x1000  # below this is the null page, any access to it is an error
+DEFAULT_MEM_SIZE = 4 * 1024 * 1024
+DEFAULT_MAX_STEPS = 500 * 1000 * 1000
+
+REG_NAMES = ["zero", "ra", "sp", "gp", "tp", "t0", "t1", "t2", "s0", "s1"] + \
+            [f"a{i}" for i in range(8)] + [f"s{i}" for i in range(2, 12)] + [f"t{i}" for i in range(3, 7)]
+REGS = dict({name: i for i, name in enumerate(REG_NAMES)}, fp=8, **{f"x{i}": i for i in range(32)})
+
+LOADS = {"lw", "lh", "lhu", "lb", "lbu"}
+STORES = {"sw", "sh", "sb"}
+
+
+class SimulatorError(Exception):
+    """
+    the program did something the simulator (or a real hart) cannot do, the message names the line
+    """
+
+
+class Instruction:
+    """
+    one line of .text: mnemonic and operands, with the line it came from
+    """
+
+    def __init__(self, op: str, args, lineno: int, text: str):
+        self.op = op
+        self.args = args
+        self.lineno = lineno
+        self.text = text
+
+    def __str__(self):
+        return f"{self.lineno}: {self.text}"
+
+
+class SimResult:
+    """
+    what one run did
+
+    exit_code   the value main returned (a0), as a signed 32-bit int
+    steps       executed assembly lines, instructions the same in machine instructions
+    loads, stores
+    functions   name -> {"calls", "instructions", "loads", "stores"}
+    hot_spots   runs of consecutive lines executed the same number of times (straight line code), those
+                that ran the most instructions first: dicts of runs, instructions, lines (first, last),
+                function and label (the last label at or before the first line)
+    """
+
+    def __init__(self, exit_code, program, hits):
+        self.exit_code = exit_code
+        self.steps = sum(hits)
+        self.instructions = sum(h * program.sizes[pc] for pc, h in enumerate(hits))
+        self.loads = sum(h for pc, h in enumerate(hits) if program.text[pc].op in LOADS)
+        self.stores = sum(h for pc, h in enumerate(hits) if program.text[pc].op in STORES)
+        self.functions = {}
+        for pc, h in enumerate(hits):
+            if not h:
+                continue
+            stats = self.functions.setdefault(program.funcOf[pc],
+                                              {"calls": 0, "instructions": 0, "loads": 0, "stores": 0})
+            if pc in program.funcEntries:
+                stats["calls"] += h
+            stats["instructions"] += h * program.sizes[pc]
+            stats["loads"] += h if program.text[pc].op in LOADS else 0
+            stats["stores"] += h if program.text[pc].op in STORES else 0
+        spots = []
+        for pc, h in enumerate(hits):
+            if h and spots and spots[-1][0] == h and spots[-1][2] == pc - 1 and program.funcOf[pc - 1] == program.funcOf[pc]:
+                spots[-1][2] = pc
+            elif h:
+                spots.append([h, pc, pc])
+        spots.sort(key=lambda spot: -spot[0] * sum(program.sizes[spot[1]:spot[2] + 1]))
+        self.hot_spots = [{"runs": h, "instructions": h * sum(program.sizes[first:last + 1]),
+                           "lines": (program.text[first].lineno, program.text[last].lineno),
+                           "function": program.funcOf[first], "label": program.labelOf[first]}
+                          for h, first, last in spots]
+
+    def report(self, out=sys.stderr, spots=10):
+        print(f"exit code {self.exit_code}, {self.instructions} instructions ({self.steps} asm lines), "
+              f"{self.loads} loads, {self.stores} stores", file=out)
+        print(f"{'function':<24}{'calls':>10}{'instrs':>14}{'%':>7}{'loads':>12}{'stores':>12}", file=out)
+        for name, stats in sorted(self.functions.items(), key=lambda x: -x[1]["instructions"]):
+            share = 100 * stats["instructions"] / max(self.instructions, 1)
+            print(f"{name:<24}{stats['calls']:>10}{stats['instructions']:>14}{share:>7.1f}"
+                  f"{stats['loads']:>12}{stats['stores']:>12}", file=out)
+        print(f"hot spots:", file=out)
+        print(f"{'runs':>12}{'instrs':>14}  {'lines':<16}{'function':<24}label", file=out)
+        for spot in self.hot_spots[:spots]:
+            lines = "{}-{}".format(*spot["lines"])
+            print(f"{spot['runs']:>12}{spot['instructions']:>14}  {lines:<16}{spot['function']:<24}{spot['label']}",
+                  file=out)
+
+
+class Program:
+    """
+    the assembly text parsed and laid out in memory, can be run many times
+    """
+
+    def __init__(self, asm: str):
+        self.text = []  # Instruction
+        self.labels = {}  # text label -> pc
+        self.symbols = {}  # data label -> address
+        self.globl = set()
+        self.data = []  # (address, word) initial values
+        self._parse(asm)
+        self.sizes = [self._size(inst) for inst in self.text]
+        self._find_functions()
+
+    def _parse(self, asm: str):
+        section = ".text"
+        data_items = {".data": [], ".bss": []}  # (label or None, bytes, alignment)
+        pending_labels = []
+        for lineno, line in enumerate(asm.splitlines(), 1):
+            line = line.split("#", 1)[0].strip()
+            while ":" in line and not line.startswith("."):
+                label, line = line.split(":", 1)
+                pending_labels.append(label.strip())
+                line = line.strip()
+            for label in pending_labels:
+                if section == ".text":
+                    self.labels[label] = len(self.text)
+                else:
+                    data_items[section].append((label, b"", 1))
+            pending_labels = []
+            if not line:
+                continue
+            op, _, rest = line.partition(" ")
+            args = [a.strip() for a in rest.split(",")] if rest.strip() else []
+            if op in (".text", ".data", ".bss"):
+                section = op
+            elif op == ".section":
+                section = ".text" if args[0].startswith(".text") else \
+                    ".bss" if args[0].startswith(".bss") else ".data"
+            elif op in (".globl", ".global"):
+                self.globl.add(args[0])
+            elif op == ".comm":
+                size = int(args[1], 0)
+                align = int(args[2], 0) if len(args) > 2 else 4
+                data_items[".bss"].append((args[0], bytes(size), align))
+            elif op in (".align", ".p2align", ".balign"):
+                align = int(args[0], 0) if op == ".balign" else 1 << int(args[0], 0)
+                if section != ".text":
+                    data_items[section].append((None, b"", align))
+            elif op in (".word", ".quad", ".half", ".short", ".byte", ".zero", ".space"):
+                if section == ".text":
+                    raise SimulatorError(f"line {lineno}: data in .text is not supported")
+                data_items[section].append((None, self._data_bytes(op, args), 1))
+            elif op.startswith("."):
+                pass  # .size, .type, .file, ...
+            elif section != ".text":
+                raise SimulatorError(f"line {lineno}: instruction outside of .text: {line}")
+            else:
+                self.text.append(Instruction(op, args, lineno, line))
+        self._layout(data_items[".data"] + data_items[".bss"])
+
+    @staticmethod
+    def _data_bytes(op: str, args):
+        if op in (".zero", ".space"):
+            return bytes(int(args[0], 0))
+        width = {".word": 4, ".quad": 8, ".half": 2, ".short": 2, ".byte": 1}[op]
+        return b"".join((int(a, 0) & ((1 << 8 * width) - 1)).to_bytes(width, "little") for a in args)
+
+    def _layout(self, items):
+        address = DATA_BASE
+        image = {}  # byte address -> byte
+        for label, value, align in items:
+            address = (address + align - 1) // align * align
+            if label is not None:
+                self.symbols[label] = address
+            for i, byte in enumerate(value):
+                image[address + i] = byte
+            address += len(value)
+        self.dataEnd = address
+        words = {}
+        for byte_addr, byte in image.items():
+            words[byte_addr & ~3] = words.get(byte_addr & ~3, 0) | byte << 8 * (byte_addr & 3)
+        self.data = [(addr, word - (1 << 32) if word & 0x80000000 else word) for addr, word in words.items()]
+
+    def _size(self, inst: Instruction):
+        if inst.op in ("la", "call", "tail"):
+            return 2
+        if inst.op == "li":
+            value = self.immediate(inst, inst.args[1])
+            return 1 if -2048 <= value < 2048 or value & 0xfff == 0 else 2
+        return 1
+
+    def _find_functions(self):
+        """
+        a function is a .globl text label or a call target, it owns the lines up to the next function
+        """
+        names = {label for label in self.labels if label in self.globl}
+        names |= {inst.args[0] for inst in self.text if inst.op in ("call", "tail") and inst.args[0] in self.labels}
+        starts = sorted((self.labels[name], name) for name in names)
+        self.funcEntries = {pc for pc, _ in starts}
+        self.funcOf = self._owners(starts)
+        self.labelOf = self._owners(sorted((pc, label) for label, pc in self.labels.items()))
+
+    def _owners(self, starts):
+        """
+        :param starts: sorted [(pc, name)]
+        :return: for every pc, the name of the last start at or before it
+        """
+        owners = []
+        current = "(none)"
+        nxt = 0
+        for pc in range(len(self.text)):
+            while nxt < len(starts) and starts[nxt][0] == pc:
+                current = starts[nxt][1]
+                nxt += 1
+            owners.append(current)
+        return owners
+
+    def immediate(self, inst: Instruction, text: str):
+        try:
+            return int(text, 0)
+        except ValueError:
+            raise SimulatorError(f"line {inst}: bad immediate {text!r}")
+
+    def reg(self, inst: Instruction, name: str):
+        if name not in REGS:
+            raise SimulatorError(f"line {inst}: unknown register {name!r}")
+        return REGS[name]
+
+    def target(self, inst: Instruction, label: str):
+        if label not in self.labels:
+            raise SimulatorError(f"line {inst}: undefined label {label!r}")
+        return self.labels[label]
+
+    def address_of(self, inst: Instruction, sym: str):
+        if sym in self.symbols:
+            return self.symbols[sym]
+        raise SimulatorError(f"line {inst}: undefined symbol {sym!r}")
+
+    def mem_operand(self, inst: Instruction, operand: str):
+        """
+        'off(reg)' -> (reg number, offset)
+        """
+        off, _, reg = operand.partition("(")
+        if not reg.endswith(")"):
+            raise SimulatorError(f"line {inst}: bad memory operand {operand!r}")
+        return self.reg(inst, reg[:-1].strip()), self.immediate(inst, off.strip() or "0")
+
+
+def s32(v):
+    """
+    wrap v to a signed 32-bit int
+    """
+    return ((v + 0x80000000) & 0xffffffff) - 0x80000000
+
+
+def div32(a, b):
+    """
+    RISC-V div: rounds toward zero, x / 0 is -1 and INT_MIN / -1 overflows to INT_MIN
+    """
+    if b == 0:
+        return -1
+    if a == -0x80000000 and b == -1:
+        return a
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def rem32(a, b):
+    """
+    RISC-V rem: has the sign of a, x % 0 is x
+    """
+    if b == 0:
+        return a
+    if a == -0x80000000 and b == -1:
+        return 0
+    return a - div32(a, b) * b
+
+
+def _u32(v):
+    return v & 0xffffffff
+
+
+# register-register operations, on signed 32-bit values
+_ALU = {
+    "add": lambda a, b: s32(a + b),
+    "sub": lambda a, b: s32(a - b),
+    "sll": lambda a, b: s32(a << (b & 31)),
+    "srl": lambda a, b: s32(_u32(a) >> (b & 31)),
+    "sra": lambda a, b: a >> (b & 31),
+    "slt": lambda a, b: int(a < b),
+    "sltu": lambda a, b: int(_u32(a) < _u32(b)),
+    "xor": lambda a, b: a ^ b,
+    "or": lambda a, b: a | b,
+    "and": lambda a, b: a & b,
+    "mul": lambda a, b: s32(a * b),
+    "mulh": lambda a, b: s32((a * b) >> 32),
+    "mulhsu": lambda a, b: s32((a * _u32(b)) >> 32),
+    "mulhu": lambda a, b: s32((_u32(a) * _u32(b)) >> 32),
+    "div": div32,
+    "divu": lambda a, b: s32(_u32(a) // _u32(b)) if b else -1,
+    "rem": rem32,
+    "remu": lambda a, b: s32(_u32(a) % _u32(b)) if b else a,
+    "sgt": lambda a, b: int(a > b),  # pseudo, slt with swapped operands
+    "sgtu": lambda a, b: int(_u32(a) > _u32(b)),
+}
+_ALU_IMM = {"addi": "add", "slti": "slt", "sltiu": "sltu", "xori": "xor", "ori": "or", "andi": "and",
+            "slli": "sll", "srli": "srl", "srai": "sra"}
+_UNARY = {
+    "mv": lambda a: a,
+    "not": lambda a: ~a,
+    "neg": lambda a: s32(-a),
+    "seqz": lambda a: int(a == 0),
+    "snez": lambda a: int(a != 0),
+    "sltz": lambda a: int(a < 0),
+    "sgtz": lambda a: int(a > 0),
+}
+_BRANCH = {
+    "beq": lambda a, b: a == b, "bne": lambda a, b: a != b,
+    "blt": lambda a, b: a < b, "bge": lambda a, b: a >= b,
+    "bltu": lambda a, b: _u32(a) < _u32(b), "bgeu": lambda a, b: _u32(a) >= _u32(b),
+    "bgt": lambda a, b: a > b, "ble": lambda a, b: a <= b,
+    "bgtu": lambda a, b: _u32(a) > _u32(b), "bleu": lambda a, b: _u32(a) <= _u32(b),
+}
+_BRANCH_ZERO = {"beqz": "beq", "bnez": "bne", "bltz": "blt", "bgez": "bge", "blez": "ble", "bgtz": "bgt"}
+
+
+class Machine:
+    """
+    registers and memory of one run of a Program
+    """
+
+    def __init__(self, program: Program, mem_size=DEFAULT_MEM_SIZE):
+        if program.dataEnd >= mem_size:
+            raise SimulatorError("the globals do not fit in the memory")
+        self.program = program
+        self.memSize = mem_size
+        self.R = [0] * 32
+        self.M = [0] * (mem_size // 4)
+        for addr, word in program.data:
+            self.M[addr >> 2] = word
+        self.exitPc = len(program.text)
+        self.R[REGS["sp"]] = mem_size
+        self.R[REGS["ra"]] = self.exitPc
+        self.code = [self._decode(pc, inst) for pc, inst in enumerate(program.text)]
+
+    def _fault(self, inst, what):
+        raise SimulatorError(f"line {inst}: {what}")
+
+    def _word_index(self, inst, addr, align=4):
+        if addr & (align - 1):
+            self._fault(inst, f"misaligned access at {addr:#x}")
+        if not DATA_BASE <= addr < self.memSize:
+            self._fault(inst, f"access out of memory at {addr:#x}")
+        return addr >> 2
+
+    def _decode(self, pc: int, inst: Instruction):
+        """
+        the closure running inst, it returns the next pc
+        """
+        R, M, p, op, args = self.R, self.M, self.program, inst.op, inst.args
+        nxt = pc + 1
+        word_index, top = self._word_index, self.memSize
+        try:
+            if op in _ALU or op in _ALU_IMM:
+                fn = _ALU[_ALU_IMM.get(op, op)]
+                rd, rs1 = p.reg(inst, args[0]), p.reg(inst, args[1])
+                if op in _ALU_IMM:
+                    imm = p.immediate(inst, args[2])
+                    if op == "addi":
+                        def run():
+                            R[rd] = s32(R[rs1] + imm)
+                            return nxt
+                    else:
+                        def run():
+                            R[rd] = fn(R[rs1], imm)
+                            return nxt
+                else:
+                    rs2 = p.reg(inst, args[2])
+
+                    def run():
+                        R[rd] = fn(R[rs1], R[rs2])
+                        return nxt
+                return self._no_x0(rd, run, nxt)
+            if op in _UNARY:
+                fn = _UNARY[op]
+                rd, rs = p.reg(inst, args[0]), p.reg(inst, args[1])
+
+                def run():
+                    R[rd] = fn(R[rs])
+                    return nxt
+                return self._no_x0(rd, run, nxt)
+            if op == "lw":
+                rd, (base, off) = p.reg(inst, args[0]), p.mem_operand(inst, args[1])
+
+                def run():
+                    addr = R[base] + off
+                    if addr & 3 or not DATA_BASE <= addr < top:
+                        word_index(inst, addr)
+                    R[rd] = M[addr >> 2]
+                    return nxt
+                return self._no_x0(rd, run, nxt)
+            if op == "sw":
+                rs, (base, off) = p.reg(inst, args[0]), p.mem_operand(inst, args[1])
+
+                def run():
+                    addr = R[base] + off
+                    if addr & 3 or not DATA_BASE <= addr < top:
+                        word_index(inst, addr)
+                    M[addr >> 2] = R[rs]
+                    return nxt
+                return run
+            if op in ("lh", "lhu", "lb", "lbu"):
+                width = 2 if op[1] == "h" else 1
+                signed = not op.endswith("u")
+                rd, (base, off) = p.reg(inst, args[0]), p.mem_operand(inst, args[1])
+
+                def run():
+                    addr = R[base] + off
+                    shift = 8 * (addr & 3)
+                    v = (_u32(M[word_index(inst, addr, width)]) >> shift) & ((1 << 8 * width) - 1)
+                    if signed and v >> (8 * width - 1):
+                        v -= 1 << 8 * width
+                    R[rd] = v
+                    return nxt
+                return self._no_x0(rd, run, nxt)
+            if op in ("sh", "sb"):
+                width = 2 if op == "sh" else 1
+                rs, (base, off) = p.reg(inst, args[0]), p.mem_operand(inst, args[1])
+
+                def run():
+                    addr = R[base] + off
+                    i = word_index(inst, addr, width)
+                    shift = 8 * (addr & 3)
+                    mask = ((1 << 8 * width) - 1) << shift
+                    M[i] = s32((_u32(M[i]) & ~mask) | ((R[rs] << shift) & mask))
+                    return nxt
+                return run
+            if op == "li":
+                rd, imm = p.reg(inst, args[0]), s32(p.immediate(inst, args[1]))
+
+                def run():
+                    R[rd] = imm
+                    return nxt
+                return self._no_x0(rd, run, nxt)
+            if op == "lui":
+                rd, imm = p.reg(inst, args[0]), s32(p.immediate(inst, args[1]) << 12)
+
+                def run():
+                    R[rd] = imm
+                    return nxt
+                return self._no_x0(rd, run, nxt)
+            if op == "la":
+                rd, addr = p.reg(inst, args[0]), p.address_of(inst, args[1])
+
+                def run():
+                    R[rd] = addr
+                    return nxt
+                return self._no_x0(rd, run, nxt)
+            if op in _BRANCH or op in _BRANCH_ZERO:
+                fn = _BRANCH[_BRANCH_ZERO.get(op, op)]
+                rs1 = p.reg(inst, args[0])
+                rs2 = 0 if op in _BRANCH_ZERO else p.reg(inst, args[1])
+                dest = p.target(inst, args[-1])
+
+                def run():
+                    return dest if fn(R[rs1], R[rs2]) else nxt
+                return run
+            if op == "j":
+                dest = p.target(inst, args[0])
+                return lambda: dest
+            if op in ("jal", "call"):
+                rd = REGS["ra"] if len(args) == 1 else p.reg(inst, args[0])
+                dest = p.target(inst, args[-1])
+
+                def run():
+                    R[rd] = nxt
+                    return dest
+                return self._no_x0(rd, run, dest) if rd == 0 else run
+            if op in ("jr", "ret", "jalr"):
+                if op == "ret":
+                    rd, rs, off = 0, REGS["ra"], 0
+                elif op == "jr":
+                    rd, rs, off = 0, p.reg(inst, args[0]), 0
+                elif len(args) == 1:
+                    rd, rs, off = REGS["ra"], p.reg(inst, args[0]), 0
+                elif "(" in args[-1]:
+                    rd, (rs, off) = p.reg(inst, args[0]), p.mem_operand(inst, args[1])
+                else:
+                    rd, rs, off = p.reg(inst, args[0]), p.reg(inst, args[1]), p.immediate(inst, args[2])
+                code_size = len(p.text)
+
+                def run():
+                    dest = R[rs] + off
+                    if rd:
+                        R[rd] = nxt
+                    if not 0 <= dest <= code_size:
+                        self._fault(inst, f"jump to a bad address {dest:#x}")
+                    return dest
+                return run
+            if op == "nop":
+                return lambda: nxt
+            if op == "ecall":
+                def run():
+                    if R[REGS["a7"]] not in (93, 94):  # exit, exit_group
+                        self._fault(inst, f"unsupported ecall {R[REGS['a7']]}")
+                    return self.exitPc
+                return run
+        except IndexError:
+            raise SimulatorError(f"line {inst}: missing operand")
+        raise SimulatorError(f"line {inst}: unsupported instruction {op!r}")
+
+    @staticmethod
+    def _no_x0(rd, run, nxt):
+        """
+        writes to x0 are dropped
+        """
+        return run if rd != 0 else (lambda: nxt)
+
+    def run(self, entry="main", max_steps=DEFAULT_MAX_STEPS):
+        """
+        :return: SimResult
+        """
+        code, hits, exit_pc = self.code, [0] * (len(self.code) + 1), self.exitPc
+        pc = self.program.target(Instruction("call", [entry], 0, f"call {entry}"), entry)
+        steps = 0
+        while pc != exit_pc:
+            hits[pc] += 1
+            pc = code[pc]()
+            steps += 1
+            if steps > max_steps:
+                raise SimulatorError(f"gave up after {max_steps} steps, at line {self.program.text[pc]}")
+        hits.pop()
+        return SimResult(self.R[REGS["a0"]], self.program, hits)
+
+
+def run_asm(asm: str, max_steps=DEFAULT_MAX_STEPS, mem_size=DEFAULT_MEM_SIZE):
+    """
+    parse and run the assembly text asm from main
+
+    :return: SimResult
+    """
+    return Machine(Program(asm), mem_size).run(max_steps=max_steps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run the RISC-V assembly written by minidecaf")
+    parser.add_argument("asm", nargs="?", help="assembly file (default: stdin)")
+    parser.add_argument("--report", action="store_true", help="print counts per function and the hottest lines")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS)
+    parser.add_argument("--mem-size", type=int, default=DEFAULT_MEM_SIZE, help="bytes of memory")
+    args = parser.parse_args()
+    if args.asm is None:
+        asm = sys.stdin.read()
+    else:
+        with open(args.asm) as f:
+            asm = f.read()
+    try:
+        result = run_asm(asm, args.max_steps, args.mem_size)
+    except SimulatorError as e:
+        print(f"rvsim: {e}", file=sys.stderr)
+        sys.exit(255)
+    if args.report:
+        result.report()
+    sys.exit(result.exit_code & 0xff)
+
+
+if __name__ == "__main__":
+    main()
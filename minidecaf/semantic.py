@@ -0,0 +1,182 @@
+"""
+Fused semantic pass, used with --semantic=fused
+name resolution (NameParser), type checking (Typer) and lvalue analysis (Locator) done in one traversal of
+the syntax tree: every identifier is bound to its Variable and typed as soon as it is met, and every
+expression hands its location up together with its type, so an lvalue is located without walking it again.
+The FuncInfo and TypeInfo it leaves behind are the same as the ones of the separate passes.
+"""
+from minidecaf.IRStr import Binary, Const, FrameSlot, GlobalSymbol
+from minidecaf.NameParser import NameManager, NameParser, ParamInfo, Variable
+from minidecaf.syntax import Declaration
+from minidecaf.typer import Typer
+from minidecaf.types import INT, ZERO, arrayRule, asgnRule, condRule, retRule, stmtCondRule
+
+
+class SemanticChecker(NameParser):
+    """
+    NameParser doing the work of Typer on the way
+    the visit methods of expressions return (type, location), the location being None when the expression
+    does not locate anything, the Variable of an identifier, or a location of Locator otherwise
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.typer = Typer(self.funcNameManager)  # the type rules and the types of variables and functions
+        self.typeInfo = self.typer.typeInfo
+
+    def _typed(self, node, ty):
+        self.typeInfo.term2type[node] = ty
+        return ty
+
+    def record_loc(self, node, loc):
+        """
+        note down the location of an expression used as an lvalue
+        """
+        if loc is None:
+            raise Exception(node, "lvalue expected")
+        if isinstance(loc, Variable):
+            loc = [GlobalSymbol(loc.name)] if loc.offset is None else [FrameSlot(loc.offset)]
+        self.typeInfo.setLvalueLoc(node, loc)
+
+    # declarations
+
+    def func(self, node, type_name="def"):
+        func = node.name
+        is_main = func == 'main'  # main is a keyword, no other function can have that name
+
+        if type_name == "def":
+            if func in self.funcNameManager.nameManager:  # redefinition of functions is prohibited
+                raise Exception(f"redefinition of function {func}")
+        current_scope = self.currentScopeInfo = NameManager(node.size)
+        self.typeInfo.enter(node)
+        self.enter_scope(node, is_func=True, isMain=is_main)
+        paramInfo = ParamInfo(self.param_list(node.params))  # types the parameters too
+        if func in self.funcNameManager.paramInfos: # the function has been declared before
+            if not paramInfo.compatible(self.funcNameManager.paramInfos[func]):
+                raise Exception(f"conflicting type for {func}")
+        self.typer.curFunc = func
+        self.typer.checkFunc(node)
+        if type_name == "def":
+            self.funcNameManager.enter_function(func, current_scope, paramInfo)
+            self.visit(node.body)
+        elif type_name == "decl":
+            if func not in self.funcNameManager.nameManager:
+                self.funcNameManager.paramInfos[func] = paramInfo
+        self.typer.curFunc = None
+        self.exit_scope(node)
+
+    def visitGlobalDecl(self, node):
+        self.typeInfo.enter(node)
+        super().visitGlobalDecl(node)
+        var = self.funcNameManager.globs[node.name].var
+        ty = self.typer._declTyp(node)
+        if var in self.typer.var2type:
+            if self.typer.var2type[var] != ty:
+                raise Exception(node, f"conflicting types for {var.ident}")
+        else:
+            self.typer.var2type[var] = ty
+        if node.init is not None:
+            initTyp, _ = self.visit(node.init)
+            asgnRule(node, ty, initTyp)
+
+    def visitDeclaration(self, node):
+        initTyp = None
+        if node.init is not None:
+            initTyp, _ = yield node.init
+        var = node.name
+        if self.variableScope.defined_in_current(var):
+            raise Exception(f"redefinition of {var}")  # redefinition of vars
+        self.def_var(node, self.decl_n_elems(node))
+        ty = self.typer.var2type[self.currentScopeInfo[node]] = self.typer._declTyp(node)
+        if node.init is not None:
+            asgnRule(node, ty, initTyp)
+
+    # statements
+
+    def visitReturn(self, node):
+        ty, _ = yield node.expr
+        retRule(node, self.typeInfo.funcs[self.typer.curFunc].retTy, ty)
+
+    def visitIf(self, node):
+        condTy, _ = yield node.cond
+        yield node.th
+        if node.el is not None:
+            yield node.el
+        stmtCondRule(node, condTy)
+
+    def visitFor(self, node):
+        scoped = isinstance(node.init, Declaration)
+        if scoped:
+            self.enter_scope(node)
+        if node.init is not None:
+            yield node.init
+        if node.ctrl is not None:
+            ctrlTy, _ = yield node.ctrl
+        if node.post is not None:
+            yield node.post
+        yield node.body
+        if scoped:
+            self.exit_scope(node)
+        if node.ctrl is not None: stmtCondRule(node, ctrlTy)
+
+    def visitWhile(self, node):
+        condTy, _ = yield node.cond
+        yield node.body
+        stmtCondRule(node, condTy)
+
+    def visitDoWhile(self, node):
+        yield node.body
+        condTy, _ = yield node.cond
+        stmtCondRule(node, condTy)
+
+    # expressions
+
+    def visitIntLit(self, node):
+        return self._typed(node, ZERO if node.value == 0 else INT), None
+
+    def visitIdent(self, node):
+        super().visitIdent(node)
+        var = self.variableScope[node.name]
+        return self._typed(node, self.typer.var2type[var]), var
+
+    def visitUnary(self, node):
+        ty, loc = yield node.operand
+        res = self.typer.checkUnary(node, node.op, ty)
+        if node.op == '&':
+            self.record_loc(node.operand, loc)
+        return self._typed(node, res), [node.operand] if node.op == '*' else None
+
+    def visitCast(self, node):
+        _, loc = yield node.operand
+        return self._typed(node, self.typer._ty(node.ptrs)), loc
+
+    def visitBinary(self, node):
+        lhsTy, _ = yield node.lhs
+        rhsTy, loc = yield node.rhs
+        return self._typed(node, self.typer.checkBinary(node, node.op, lhsTy, rhsTy)), loc
+
+    def visitAssign(self, node):
+        lhsTy, lhsLoc = yield node.lhs
+        rhsTy, loc = yield node.rhs
+        res = self.typer.checkBinary(node, '=', lhsTy, rhsTy)
+        self.record_loc(node.lhs, lhsLoc)
+        return self._typed(node, res), loc
+
+    def visitCond(self, node):
+        condTy, _ = yield node.cond
+        thTy, _ = yield node.th
+        elTy, loc = yield node.el
+        return self._typed(node, condRule(node, condTy, thTy, elTy)), loc
+
+    def visitCall(self, node):
+        argTy = []
+        for arg in node.args:
+            ty, _ = yield arg
+            argTy.append(ty)
+        return self._typed(node, self.typeInfo.funcs[node.name].call()(node, argTy)), None
+
+    def visitIndex(self, node):
+        baseTy, _ = yield node.base
+        indexTy, _ = yield node.index
+        res = self._typed(node, arrayRule(node, baseTy, indexTy))
+        return res, [node.base, node.index, Const(baseTy.base.sizeof()), Binary('*'), Binary('+')]
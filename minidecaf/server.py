@@ -0,0 +1,66 @@
+"""
+Persistent compile server
+listens on a local unix socket and compiles the sources it is sent with the same pipeline as main(),
+so antlr4 and the generated parser are only loaded (and their DFA caches warmed) once.
+
+protocol: one json line per connection each way
+    request:  {"source": str, "ir": bool, "opt": int}, opt being the -O level (see passes.py), 0 if left out
+    response: {"ok": true, "output": str} or {"ok": false, "error": str}
+"""
+import json
+import os
+import signal
+import socketserver
+import sys
+
+from minidecaf.client import default_socket_path
+from minidecaf.compiler import Compiler
+
+
+def compile_source(compiler: Compiler, source: str, emit_ir=False, opt_level=0):
+    """
+    compile source text into assembly (or ir) text, exactly what main() would print
+    """
+    if emit_ir:
+        return f"{compiler.compile_to_ir(source)}\n"
+    if opt_level == 0:
+        return compiler.compile_string(source)
+    from minidecaf.passes import PassManager
+    return compiler.compile_string(source, PassManager.for_level(opt_level))
+
+
+class CompileHandler(socketserver.StreamRequestHandler):
+    """
+    handle a single compile request
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            output = compile_source(self.server.compiler, request["source"], request.get("ir", False),
+                                    request.get("opt", 0))
+            response = {"ok": True, "output": output}
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}" if str(e) else type(e).__name__}
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+def serve(socket_path=None):
+    """
+    serve compile requests on socket_path until interrupted, one thread per connection
+    """
+    socket_path = socket_path or default_socket_path()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # so the socket is cleaned up on kill
+    if os.path.exists(socket_path):  # stale socket of a previous server
+        os.remove(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, CompileHandler) as server:
+        server.compiler = Compiler()
+        try:
+            server.serve_forever()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            os.remove(socket_path)
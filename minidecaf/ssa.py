@@ -0,0 +1,153 @@
+"""
+SSA construction and destruction for the three-address IR of tac.py
+
+to_ssa() renames the register variables of a TACFunc so that every register is defined once: phis go to the
+iterated dominance frontier of the blocks defining a variable (Cytron et al.), the uses are renamed along
+the dominator tree, and the phis whose value is never used are dropped again.
+
+from_ssa() replaces the phis by copies at the end of the predecessors, splitting the edges from a block with
+several successors first, and orders every parallel copy so that no copy overwrites a value another copy
+still has to read.
+"""
+from minidecaf.analysis import AnalysisManager
+from minidecaf.tac import Const, Copy, Jump, Phi
+
+
+def to_ssa(func, analyses=None):
+    """
+    bring func into SSA form, in place
+
+    :param analyses: the AnalysisManager of func, its analyses of the graph stay valid
+    """
+    analyses = analyses or AnalysisManager(func)
+    dom = analyses.get("dominators")
+    order, idom = dom.order, dom.idom
+    func.blocks = list(order)  # the unreachable blocks go, which leaves the analyses as they are
+    func.link()
+    frontiers = analyses.get("frontiers")
+    variables = func.variables
+
+    # phis
+    def_blocks = {var: {} for var in sorted(variables, key=lambda reg: reg.n)}
+    for block in order:
+        for instr in block.instrs:
+            if instr.dst in variables:
+                def_blocks[instr.dst][block] = None
+    for var, blocks in def_blocks.items():
+        work = list(blocks)
+        placed = set()
+        while work:
+            for frontier in frontiers[work.pop()]:
+                if frontier not in placed:
+                    placed.add(frontier)
+                    frontier.instrs.insert(0, Phi(var, var))
+                    if frontier not in blocks:
+                        work.append(frontier)
+
+    # renaming
+    children = dom.children
+    stacks = {var: [] for var in variables}
+    undefined = []
+
+    def current(reg):
+        if reg not in variables:
+            return reg
+        if stacks[reg]:
+            return stacks[reg][-1]
+        if not undefined:  # read on a path it is not defined on, only by a phi no one uses
+            undefined.append(func.new_reg())
+        return undefined[0]
+
+    work = [(order[0], None)]
+    while work:
+        block, pushed = work.pop()
+        if pushed is not None:  # leaving block
+            for var in pushed:
+                stacks[var].pop()
+            continue
+        pushed = []
+        for instr in block.instrs:
+            if instr.__class__ is not Phi:
+                instr.replace_uses(current)
+            if instr.dst in variables:
+                var = instr.dst
+                instr.dst = func.new_reg()
+                stacks[var].append(instr.dst)
+                pushed.append(var)
+        for succ in block.succs:
+            for phi in succ.phis():
+                phi.incoming[block] = current(phi.var)
+        work.append((block, pushed))
+        work.extend((child, None) for child in reversed(children[block]))
+    func.variables = set()
+    remove_dead_phis(func)
+    if undefined and any(undefined[0] in instr.uses() for block in order for instr in block.instrs):
+        order[0].instrs.insert(0, Const(undefined[0], 0))
+
+
+def remove_dead_phis(func):
+    """
+    drop the phis whose value no instruction but a dead phi uses
+    """
+    live = set()
+    work = []
+    phis = {}
+    for block in func.blocks:
+        for instr in block.instrs:
+            if instr.__class__ is Phi:
+                phis[instr.dst] = instr
+            else:
+                work.extend(instr.uses())
+    while work:
+        reg = work.pop()
+        if reg not in live:
+            live.add(reg)
+            if reg in phis:
+                work.extend(phis[reg].uses())
+    for block in func.blocks:
+        block.instrs = [instr for instr in block.instrs if instr.__class__ is not Phi or instr.dst in live]
+
+
+def sequentialize(copies, new_reg):
+    """
+    :param copies: [(dst, src)] to be done at the same time
+    :param new_reg: makes a temporary, for a cycle of copies
+    :return: [Copy] doing them one after another
+    """
+    pending = [(dst, src) for dst, src in copies if dst is not src]
+    result = []
+    while pending:
+        sources = {src for _, src in pending}
+        for i, (dst, src) in enumerate(pending):
+            if dst not in sources:
+                result.append(Copy(dst, src))
+                del pending[i]
+                break
+        else:  # every destination is still to be read, save one of them
+            saved = pending[0][0]
+            temp = new_reg()
+            result.append(Copy(temp, saved))
+            pending = [(dst, temp if src is saved else src) for dst, src in pending]
+    return result
+
+
+def from_ssa(func):
+    """
+    replace the phis of func by copies, in place
+    """
+    for block in list(func.blocks):
+        phis = block.phis()
+        if not phis:
+            continue
+        for pred in block.preds:
+            if len(pred.succs) > 1:  # a critical edge, the copies go to a block of their own
+                edge = func.new_block()
+                edge.instrs.append(Jump(block))
+                pred.terminator().retarget(block, edge)
+                for phi in phis:
+                    phi.incoming[edge] = phi.incoming.pop(pred)
+                pred = edge
+            copies = sequentialize([(phi.dst, phi.incoming[pred]) for phi in phis], func.new_reg)
+            pred.instrs[-1:-1] = copies
+        block.instrs = block.instrs[len(phis):]
+    func.link()
@@ -0,0 +1,246 @@
+"""
+Startup helpers
+for a single small file, most of the compile time is spent before the first pass runs: importing antlr4
+and the generated parser, then warming up the DFA caches of the generated lexer/parser on the first parse.
+
+- parser_classes() imports the generated lexer/parser lazily, and replaces their ATN/DFA class attributes by
+  an already warm copy pickled on disk by an earlier run (see save_parser_cache). The pickle is keyed by a hash
+  of the grammar and of the generated code, so it is invalidated whenever MiniDecaf.g4/CommonLex.g4 change.
+- ImportTimer records the time spent importing each module for --startup-report.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+PKG_DIR = os.path.dirname(os.path.abspath(__file__))
+GRAMMAR_FILES = ["MiniDecaf.g4", "CommonLex.g4",
+                 os.path.join("generated", "MiniDecafLexer.py"), os.path.join("generated", "MiniDecafParser.py")]
+PICKLE_RECURSION_LIMIT = 100000  # the ATN is a deeply linked graph
+# full-context predictions on deeply nested expressions add DFA states by the thousand, past this many
+# the pickle loads slower than the DFA warms up cold, so it is not saved
+MAX_CACHED_DFA_STATES = 5000
+
+_parser_classes = None
+_parser_cache = {"dir": None, "key": None, "states": 0, "loadTime": 0.0}
+
+
+def default_parser_cache_dir():
+    """
+    $MINIDECAF_PARSER_CACHE, otherwise $XDG_CACHE_HOME/minidecaf (~/.cache/minidecaf)
+    an empty $MINIDECAF_PARSER_CACHE turns the cache off
+    """
+    if "MINIDECAF_PARSER_CACHE" in os.environ:
+        return os.environ["MINIDECAF_PARSER_CACHE"] or None
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "minidecaf")
+
+
+def grammar_hash():
+    """
+    hash of the grammar, the generated code and the python version the pickle is made with
+    """
+    h = hashlib.sha256(sys.version.encode())
+    for name in GRAMMAR_FILES:
+        try:
+            with open(os.path.join(PKG_DIR, name), 'rb') as f:
+                h.update(name.encode() + b'\0' + f.read())
+        except OSError:
+            pass
+    return h.hexdigest()[:16]
+
+
+def _runtime_singletons():
+    """
+    objects of the antlr4 runtime that are compared by identity, they must not be copied by the pickle
+    """
+    from antlr4.PredictionContext import PredictionContext
+    from antlr4.atn.ATNSimulator import ATNSimulator
+    from antlr4.atn.LexerATNSimulator import LexerATNSimulator
+    from antlr4.atn.LexerAction import LexerSkipAction, LexerMoreAction, LexerPopModeAction
+    from antlr4.atn.SemanticContext import SemanticContext
+    return {"PredictionContext.EMPTY": PredictionContext.EMPTY,
+            "SemanticContext.NONE": SemanticContext.NONE,
+            "ATNSimulator.ERROR": ATNSimulator.ERROR,
+            "LexerATNSimulator.ERROR": LexerATNSimulator.ERROR,
+            "LexerSkipAction.INSTANCE": LexerSkipAction.INSTANCE,
+            "LexerMoreAction.INSTANCE": LexerMoreAction.INSTANCE,
+            "LexerPopModeAction.INSTANCE": LexerPopModeAction.INSTANCE}
+
+
+class _StatePickler(pickle.Pickler):
+    def __init__(self, f):
+        super().__init__(f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.singletonIds = {id(obj): name for name, obj in _runtime_singletons().items()}
+
+    def persistent_id(self, obj):
+        return self.singletonIds.get(id(obj))
+
+
+class _StateUnpickler(pickle.Unpickler):
+    def __init__(self, f):
+        super().__init__(f)
+        self.singletons = _runtime_singletons()
+
+    def persistent_load(self, pid):
+        return self.singletons[pid]
+
+
+def _dfa_states(lexer_cls, parser_cls):
+    return sum(len(dfa._states) for dfa in lexer_cls.decisionsToDFA + parser_cls.decisionsToDFA)
+
+
+def _cache_path():
+    return os.path.join(_parser_cache["dir"], f"parser-{_parser_cache['key']}.pickle")
+
+
+def use_parser_cache(cache_dir):
+    """
+    select the dir of the warm parser cache (None turns it off), must be called before parser_classes()
+    """
+    _parser_cache["dir"] = cache_dir
+
+
+def parser_classes():
+    """
+    import the generated lexer and parser on first use
+
+    :return: (MiniDecafLexer, MiniDecafParser)
+    """
+    global _parser_classes
+    if _parser_classes is None:
+        from minidecaf.generated.MiniDecafLexer import MiniDecafLexer
+        from minidecaf.generated.MiniDecafParser import MiniDecafParser
+        if _parser_cache["dir"] is not None:
+            _load_parser_cache(MiniDecafLexer, MiniDecafParser)
+        _parser_classes = (MiniDecafLexer, MiniDecafParser)
+    return _parser_classes
+
+
+def _load_parser_cache(lexer_cls, parser_cls):
+    start = time.perf_counter()
+    _parser_cache["key"] = grammar_hash()
+    try:
+        with open(_cache_path(), 'rb') as f:
+            limit = sys.getrecursionlimit()
+            sys.setrecursionlimit(max(limit, PICKLE_RECURSION_LIMIT))
+            try:
+                state = _StateUnpickler(f).load()
+            finally:
+                sys.setrecursionlimit(limit)
+    except Exception:
+        return  # missing or unreadable, just start cold
+    lexer_cls.atn, lexer_cls.decisionsToDFA = state["lexer"]
+    parser_cls.atn, parser_cls.decisionsToDFA, parser_cls.sharedContextCache = state["parser"]
+    _parser_cache["states"] = _dfa_states(lexer_cls, parser_cls)
+    _parser_cache["loadTime"] = time.perf_counter() - start
+
+
+def reset_parser_dfa():
+    """
+    throw away what the DFA caches of the generated lexer/parser learned, e.g. to time a cold parse
+    """
+    from antlr4.PredictionContext import PredictionContextCache
+    from antlr4.dfa.DFA import DFA
+    lexer_cls, parser_cls = parser_classes()
+    for cls in (lexer_cls, parser_cls):
+        cls.decisionsToDFA = [DFA(state, i) for i, state in enumerate(cls.atn.decisionToState)]
+    parser_cls.sharedContextCache = PredictionContextCache()
+
+
+def save_parser_cache():
+    """
+    pickle the DFA caches of the generated lexer/parser if they learned something new during this run
+    """
+    if _parser_classes is None or _parser_cache["dir"] is None:
+        return
+    lexer_cls, parser_cls = _parser_classes
+    states = _dfa_states(lexer_cls, parser_cls)
+    if states <= _parser_cache["states"] or states > MAX_CACHED_DFA_STATES:
+        return
+    state = {"lexer": (lexer_cls.atn, lexer_cls.decisionsToDFA),
+             "parser": (parser_cls.atn, parser_cls.decisionsToDFA, parser_cls.sharedContextCache)}
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, PICKLE_RECURSION_LIMIT))
+    try:
+        os.makedirs(_parser_cache["dir"], exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=_parser_cache["dir"], prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                _StatePickler(f).dump(state)
+            os.replace(tmp, _cache_path())
+        except BaseException:
+            os.remove(tmp)
+            raise
+    except Exception:
+        pass  # the cache is only an optimization, e.g. the dir may be read-only
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+class ImportTimer:
+    """
+    meta path hook timing every module imported while it is installed
+    """
+
+    def __init__(self):
+        self.times = {}  # module name -> [self time, cumulative time]
+        self._stack = []
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        self.start = time.perf_counter()
+
+    def uninstall(self):
+        sys.meta_path.remove(self)
+        self.total = time.perf_counter() - self.start
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def report(self, out=sys.stderr, limit=25):
+        print(f"{'module':<50}{'self ms':>10}{'cumul ms':>10}", file=out)
+        for name, (self_t, cum_t) in sorted(self.times.items(), key=lambda x: -x[1][1])[:limit]:
+            print(f"{name:<50}{self_t * 1000:>10.2f}{cum_t * 1000:>10.2f}", file=out)
+        if _parser_cache["key"] is not None:
+            print(f"{'(warm parser cache load)':<50}{_parser_cache['loadTime'] * 1000:>10.2f}", file=out)
+        print(f"{'(total, imports and compilation)':<50}{'':>10}{self.total * 1000:>10.2f}", file=out)
+
+
+class _TimedLoader:
+    """
+    wraps the loader of a module so its exec_module is timed
+    """
+
+    def __init__(self, loader, timer: ImportTimer):
+        self._loader = loader
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = self._timer._stack
+        stack.append(0.0)  # time spent in nested imports
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cum = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += cum
+            self._timer.times[module.__name__] = [cum - children, cum]
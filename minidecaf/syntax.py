@@ -0,0 +1,557 @@
+"""
+Syntax tree the passes run on
+the parse tree of ANTLR (or of fastparser.py) is lowered once, right after parsing, into these nodes: one
+__slots__ object per construct, with the identifiers, operators and integers already taken out of the tokens,
+and without the chain rules of the grammar (tAdd, tMul, noCond, atomParen, ...), which only pass their single
+child on. After lower() nothing refers to the parse tree any more, so it can be freed before the passes run.
+
+The nodes of every top-level declaration (FuncDef, FuncDecl, GlobalDecl) are numbered densely from 0 by lower(),
+the number being the nid of the node and the count the size of the declaration. The passes keep what they find
+out about the nodes in SideTables indexed by nid, one per declaration, which refer to none of the nodes: the
+subtree of a function and its tables can be dropped as soon as its IR is generated.
+
+NodeVisitor dispatches on a table from node class to visit method, built once per visitor class. The visit
+methods (and the builders of lower()) are generators that yield the children they need and get back what
+visiting them returned; the generators are run on an explicit stack (see drive()), so the depth of a tree,
+e.g. a+a+...+a with 100k terms, is not bounded by the recursion limit of python.
+"""
+import gc
+import threading
+from types import GeneratorType
+
+
+class Node:
+    __slots__ = ('nid',)  # see lower()
+
+
+class Expr(Node):
+    __slots__ = ()
+
+
+class Stmt(Node):
+    __slots__ = ()
+
+
+# declarations
+
+class Program(Node):
+    __slots__ = ('decls',)
+
+    def __init__(self, decls):
+        self.decls = decls  # FuncDef, FuncDecl and GlobalDecl in source order
+
+
+class FuncDef(Node):
+    __slots__ = ('name', 'ptrs', 'params', 'body', 'size')
+
+    def __init__(self, name: str, ptrs: int, params, body):
+        self.name = name
+        self.ptrs = ptrs  # the return type is int with this many '*'
+        self.params = params  # [Declaration]
+        self.body = body  # Compound
+
+
+class FuncDecl(Node):
+    __slots__ = ('name', 'ptrs', 'params', 'size')
+
+    def __init__(self, name: str, ptrs: int, params):
+        self.name = name
+        self.ptrs = ptrs
+        self.params = params
+
+
+class Declaration(Node):
+    __slots__ = ('ptrs', 'name', 'dims', 'init')
+
+    def __init__(self, ptrs: int, name: str, dims, init):
+        self.ptrs = ptrs
+        self.name = name
+        self.dims = dims  # [int], the array dimensions from the outermost
+        self.init = init  # Expr or None
+
+
+class GlobalDecl(Declaration):
+    __slots__ = ('initText', 'size')
+
+    def __init__(self, ptrs: int, name: str, dims, init, init_text):
+        super().__init__(ptrs, name, dims, init)
+        self.initText = init_text  # the source of init, the initial value is computed from it
+
+
+# statements
+
+class Compound(Stmt):
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items  # Stmt and Declaration
+
+
+class Return(Stmt):
+    __slots__ = ('expr',)
+
+    def __init__(self, expr):
+        self.expr = expr
+
+
+class ExprStmt(Stmt):
+    __slots__ = ('expr',)
+
+    def __init__(self, expr):
+        self.expr = expr  # None for ';'
+
+
+class If(Stmt):
+    __slots__ = ('cond', 'th', 'el')
+
+    def __init__(self, cond, th, el):
+        self.cond = cond
+        self.th = th
+        self.el = el  # None without else
+
+
+class For(Stmt):
+    __slots__ = ('init', 'ctrl', 'post', 'body')
+
+    def __init__(self, init, ctrl, post, body):
+        self.init = init  # Declaration (then the loop is a scope), Expr or None
+        self.ctrl = ctrl
+        self.post = post
+        self.body = body
+
+
+class While(Stmt):
+    __slots__ = ('cond', 'body')
+
+    def __init__(self, cond, body):
+        self.cond = cond
+        self.body = body
+
+
+class DoWhile(Stmt):
+    __slots__ = ('body', 'cond')
+
+    def __init__(self, body, cond):
+        self.body = body
+        self.cond = cond
+
+
+class Break(Stmt):
+    __slots__ = ()
+
+
+class Continue(Stmt):
+    __slots__ = ()
+
+
+# expressions
+
+class IntLit(Expr):
+    __slots__ = ('value',)
+
+    def __init__(self, value: int):
+        self.value = value
+
+
+class Ident(Expr):
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class Unary(Expr):
+    __slots__ = ('op', 'operand')
+
+    def __init__(self, op: str, operand):
+        self.op = op  # - ! ~ * &
+        self.operand = operand
+
+
+class Binary(Expr):
+    __slots__ = ('op', 'lhs', 'rhs')
+
+    def __init__(self, op: str, lhs, rhs):
+        self.op = op
+        self.lhs = lhs
+        self.rhs = rhs
+
+
+class Assign(Expr):
+    __slots__ = ('lhs', 'rhs')
+
+    def __init__(self, lhs, rhs):
+        self.lhs = lhs
+        self.rhs = rhs
+
+
+class Cond(Expr):
+    __slots__ = ('cond', 'th', 'el')
+
+    def __init__(self, cond, th, el):
+        self.cond = cond
+        self.th = th
+        self.el = el
+
+
+class Cast(Expr):
+    __slots__ = ('ptrs', 'operand')
+
+    def __init__(self, ptrs: int, operand):
+        self.ptrs = ptrs
+        self.operand = operand
+
+
+class Call(Expr):
+    __slots__ = ('name', 'args')
+
+    def __init__(self, name: str, args):
+        self.name = name
+        self.args = args
+
+
+class Index(Expr):
+    __slots__ = ('base', 'index')
+
+    def __init__(self, base, index):
+        self.base = base
+        self.index = index
+
+
+NODE_CLASSES = [Program, FuncDef, FuncDecl, Declaration, GlobalDecl, Compound, Return, ExprStmt, If, For, While,
+                DoWhile, Break, Continue, IntLit, Ident, Unary, Binary, Assign, Cond, Cast, Call, Index]
+
+
+class SideTable:
+    """
+    what a pass found out about the nodes of one top-level declaration, a list indexed by the nid of the node;
+    used like a dict keyed by the nodes, None meaning no entry
+    """
+    __slots__ = ('values',)
+
+    def __init__(self, size: int):
+        self.values = [None] * size
+
+    def __getitem__(self, node):
+        value = self.values[node.nid]
+        if value is None:
+            raise KeyError(node)
+        return value
+
+    def __setitem__(self, node, value):
+        self.values[node.nid] = value
+
+    def __contains__(self, node):
+        return self.values[node.nid] is not None
+
+    def __len__(self):
+        return len(self.values) - self.values.count(None)
+
+    def items(self):
+        """
+        :return: (nid, value) of every entry
+        """
+        return [(nid, value) for nid, value in enumerate(self.values) if value is not None]
+
+
+def drive(result, call):
+    """
+    run a visit without recursion
+
+    :param result: what a visit method returned; if it is a generator, every value it yields is a child to
+        visit, which is sent back to it as the result of the yield, and the value it returns is the result
+    :param call: child -> what the visit method of the child returns, which is driven the same way
+    :return: the result of the visit
+    """
+    if result.__class__ is not GeneratorType:
+        return result
+    stack = []
+    top = result
+    value = None
+    while True:
+        try:
+            child = top.send(value)
+        except StopIteration as stop:
+            if not stack:
+                return stop.value
+            top = stack.pop()
+            value = stop.value
+            continue
+        result = call(child)
+        if result.__class__ is GeneratorType:
+            stack.append(top)
+            top = result
+            value = None
+        else:
+            value = result
+
+
+class NodeVisitor:
+    """
+    visit(node) calls the method visit<class name of node>, through a table from node class to function that
+    is made when the visitor class is defined; a class without a method cannot be visited
+    a visit method is either a plain function, or a generator that does `yield child` to visit a child, see drive()
+    """
+    _table = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._table = {node_cls: getattr(cls, "visit" + node_cls.__name__) for node_cls in NODE_CLASSES
+                      if hasattr(cls, "visit" + node_cls.__name__)}
+
+    def visit(self, node):
+        table = self._table
+        return drive(table[node.__class__](self, node), lambda child: table[child.__class__](self, child))
+
+
+def _ptrs(ty):
+    ptrs = 0
+    while ty.getChildCount() == 2:  # ty '*'
+        ty = ty.getChild(0)
+        ptrs += 1
+    return ptrs
+
+
+def _text(ctx):
+    """
+    ctx.getText(), which recurses once per level of the tree, on an explicit stack
+    """
+    parts = []
+    stack = [ctx]
+    while stack:
+        node = stack.pop()
+        if hasattr(node, "symbol"):  # a terminal
+            parts.append(node.symbol.text)
+        elif node.children:
+            stack.extend(reversed(node.children))
+    return "".join(parts)
+
+
+def _params(param_list):
+    params = []
+    for decl in param_list.declaration():
+        params.append((yield decl))
+    return params
+
+
+def without_gc(f, *args):
+    """
+    f(*args) with the cycle collector off, for f building a large tree of new objects linked both ways, none of
+    which can be garbage yet, which would get the collector to go over the growing tree again and again.
+    gc.disable() is for the whole process, so it is only done on the main thread: on another thread it could
+    enable the collector again while the main thread still has it off, or the other way round
+    """
+    if threading.current_thread() is not threading.main_thread() or not gc.isenabled():
+        return f(*args)
+    gc.disable()
+    try:
+        return f(*args)
+    finally:
+        gc.enable()
+
+
+class _Numbering:
+    """
+    the nids of one lower() call, see the module docstring
+    """
+    __slots__ = ('next',)
+
+    def __init__(self):
+        self.next = 0  # the nid of the next node of the current top-level declaration
+
+    def new(self, node):
+        node.nid = self.next
+        self.next += 1
+        return node
+
+    def top(self, node):
+        """
+        node is a top-level declaration, the last node numbered in it
+        """
+        self.new(node)
+        node.size = self.next
+        self.next = 0
+        return node
+
+
+class _Lowering:
+    """
+    ParserRuleContext class -> function building the node of a context of that class, which yields the child
+    contexts to lower (see drive()); the functions are called with the _Numbering of the lower() call as well,
+    so the table can be shared by every thread
+    """
+
+    def __init__(self):
+        from minidecaf.generated.MiniDecafParser import MiniDecafParser as P
+        self.table = table = {}
+
+        def rule(*classes):
+            def register(f):
+                for cls in classes:
+                    table[cls] = f
+                return f
+
+            return register
+
+        @rule(P.ProgContext)
+        def prog(ctx, ids):
+            decls = []
+            for child in ctx.children[:-1]:  # the last child is EOF
+                decls.append((yield child))
+            return Program(decls)
+
+        @rule(P.FuncExternalDeclContext, P.ExprContext, P.NoAsgnContext, P.NoCondContext, P.TLorContext,
+              P.TLandContext, P.TEqContext, P.TRelContext, P.TAddContext, P.TMulContext, P.TCastContext,
+              P.TUnaryContext, P.TPostfixContext, P.BlockItemContext, P.CmpdStmtContext)
+        def chain(ctx, ids):
+            return (yield ctx.getChild(0))
+
+        @rule(P.AtomParenContext)
+        def paren(ctx, ids):
+            return (yield ctx.expr())
+
+        @rule(P.DeclExternalDeclContext)
+        def global_decl(ctx, ids):
+            decl = ctx.declaration()
+            init = decl.expr()
+            return ids.top(GlobalDecl(_ptrs(decl.ty()), decl.Ident().getText(), [int(x.getText()) for x in decl.Integer()],
+                                  None if init is None else (yield init), None if init is None else _text(init)))
+
+        @rule(P.MainFuncContext)
+        def main_func(ctx, ids):
+            params = yield from _params(ctx.paramList())
+            return ids.top(FuncDef('main', _ptrs(ctx.ty()), params, (yield ctx.compound())))
+
+        @rule(P.FuncDefContext)
+        def func_def(ctx, ids):
+            params = yield from _params(ctx.paramList())
+            return ids.top(FuncDef(ctx.Ident().getText(), _ptrs(ctx.ty()), params, (yield ctx.compound())))
+
+        @rule(P.FuncDeclContext)
+        def func_decl(ctx, ids):
+            params = yield from _params(ctx.paramList())
+            return ids.top(FuncDecl(ctx.Ident().getText(), _ptrs(ctx.ty()), params))
+
+        @rule(P.DeclarationContext)
+        def declaration(ctx, ids):
+            init = ctx.expr()
+            return ids.new(Declaration(_ptrs(ctx.ty()), ctx.Ident().getText(), [int(x.getText()) for x in ctx.Integer()],
+                                   None if init is None else (yield init)))
+
+        @rule(P.CompoundContext)
+        def compound(ctx, ids):
+            items = []
+            for item in ctx.blockItem():
+                items.append((yield item))
+            return ids.new(Compound(items))
+
+        @rule(P.ReturnStmtContext)
+        def return_stmt(ctx, ids):
+            return ids.new(Return((yield ctx.expr())))
+
+        @rule(P.ExprStmtContext)
+        def expr_stmt(ctx, ids):
+            expr = ctx.expr()
+            return ids.new(ExprStmt(None if expr is None else (yield expr)))
+
+        @rule(P.NullStmtContext)
+        def null_stmt(ctx, ids):
+            return ids.new(ExprStmt(None))
+
+        @rule(P.IfStmtContext)
+        def if_stmt(ctx, ids):
+            return ids.new(If((yield ctx.expr()), (yield ctx.th), None if ctx.el is None else (yield ctx.el)))
+
+        @rule(P.ForDeclStmtContext, P.ForStmtContext)
+        def for_stmt(ctx, ids):
+            parts = []
+            for part in (ctx.init, ctx.ctrl, ctx.post):
+                parts.append(None if part is None else (yield part))
+            return ids.new(For(*parts, (yield ctx.stmt())))
+
+        @rule(P.WhileStmtContext)
+        def while_stmt(ctx, ids):
+            return ids.new(While((yield ctx.expr()), (yield ctx.stmt())))
+
+        @rule(P.DoWhileStmtContext)
+        def do_while_stmt(ctx, ids):
+            return ids.new(DoWhile((yield ctx.stmt()), (yield ctx.expr())))
+
+        @rule(P.BreakStmtContext)
+        def break_stmt(ctx, ids):
+            return ids.new(Break())
+
+        @rule(P.ContinueStmtContext)
+        def continue_stmt(ctx, ids):
+            return ids.new(Continue())
+
+        @rule(P.WithAsgnContext)
+        def assignment(ctx, ids):
+            return ids.new(Assign((yield ctx.unary()), (yield ctx.assignment())))
+
+        @rule(P.WithCondContext)
+        def conditional(ctx, ids):
+            return ids.new(Cond((yield ctx.logicalOr()), (yield ctx.expr()), (yield ctx.conditional())))
+
+        @rule(P.CLorContext, P.CLandContext, P.CEqContext, P.CRelContext, P.CAddContext, P.CMulContext)
+        def binary(ctx, ids):
+            lhs, op, rhs = ctx.children
+            return ids.new(Binary(op.getText(), (yield lhs), (yield rhs)))
+
+        @rule(P.CCastContext)
+        def cast(ctx, ids):
+            return ids.new(Cast(_ptrs(ctx.ty()), (yield ctx.cast())))
+
+        @rule(P.CUnaryContext)
+        def unary(ctx, ids):
+            return ids.new(Unary(ctx.unaryOp().getText(), (yield ctx.cast())))
+
+        @rule(P.PostfixCallContext)
+        def call(ctx, ids):
+            args = []
+            for arg in ctx.argList().expr():
+                args.append((yield arg))
+            return ids.new(Call(ctx.Ident().getText(), args))
+
+        @rule(P.PostfixArrayContext)
+        def index(ctx, ids):
+            return ids.new(Index((yield ctx.postfix()), (yield ctx.expr())))
+
+        @rule(P.AtomIntegerContext)
+        def integer(ctx, ids):
+            return ids.new(IntLit(int(ctx.getText())))
+
+        @rule(P.AtomIdentContext)
+        def ident(ctx, ids):
+            return ids.new(Ident(ctx.getText()))
+
+
+_lowering = None
+
+
+def lower(ctx):
+    """
+    the links from the children of the parse tree to their parents are cut on the way out, so that the tree is
+    freed as soon as the caller drops it, instead of by a full run of the cycle collector over all of it
+
+    :return: the node of a parse tree context, e.g. the Program of a ProgContext
+    """
+    global _lowering
+    if _lowering is None:
+        _lowering = _Lowering()
+    table = _lowering.table
+    ids = _Numbering()
+    try:
+        return without_gc(drive, table[ctx.__class__](ctx, ids), lambda child: table[child.__class__](child, ids))
+    finally:
+        _unlink(ctx)
+
+
+def _unlink(tree):
+    stack = [tree]
+    while stack:
+        ctx = stack.pop()
+        ctx.parentCtx = None
+        children = getattr(ctx, "children", None)  # terminals have none
+        if children:
+            stack.extend(children)
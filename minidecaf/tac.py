@@ -0,0 +1,634 @@
+"""
+Three-address IR, used with --ssa and by the passes of -O1/-O2 (see passes.py)
+every function is a control-flow graph of basic blocks, every block a list of three-address instructions on
+virtual registers (Reg) ending with a terminator (Jump, CondJump, Return), with the edges kept in the
+preds/succs of the blocks. It is lowered from the stack IR of an IRFunc (see lower()), brought into SSA
+form and out of it again by ssa.py, and turned into assembly by AsmGenerator.generate_tac_function.
+
+lowering keeps the memory layout of the stack IR: the cell at depth d of the IR stack is the frame slot
+fp - 4 * d, which is where the variables live (see NameParser.def_var). A cell whose address is taken (a
+frameslot not directly loaded from or stored to, like the base of an array), and every cell below it, which
+can be reached from that address, stays in memory: pushing to it is a StoreSlot and popping from it a
+LoadSlot. Every other cell becomes a register variable, defined by every push to it and by every store
+to its frameslot; these are the variables ssa.py renames.
+
+A function whose stack depth at some label depends on the path it is reached by (a break or continue out
+of a block with variables leaves them on the stack) is not lowered, it keeps the assembly of its stack IR.
+"""
+import minidecaf.IRStr as IRStr
+
+IMM_MIN, IMM_MAX = -2048, 2047  # range of the 12 bit immediates of RV32I
+
+
+class Reg:
+    """
+    a virtual register, the number is unique in its function
+    """
+    __slots__ = ('n',)
+
+    def __init__(self, n: int):
+        self.n = n
+
+    def __str__(self):
+        return f"%{self.n}"
+
+    __repr__ = __str__
+
+
+def fp_load(reg: str, offset: int):
+    if IMM_MIN <= offset <= IMM_MAX:
+        return [f"lw {reg}, {offset}(fp)"]
+    return [f"li t0, {offset}", "add t0, t0, fp", f"lw {reg}, 0(t0)"]
+
+
+def fp_store(reg: str, offset: int):
+    if IMM_MIN <= offset <= IMM_MAX:
+        return [f"sw {reg}, {offset}(fp)"]
+    return [f"li t0, {offset}", "add t0, t0, fp", f"sw {reg}, 0(t0)"]
+
+
+def fp_addr(reg: str, offset: int):
+    if IMM_MIN <= offset <= IMM_MAX:
+        return [f"addi {reg}, fp, {offset}"]
+    return [f"li {reg}, {offset}", f"add {reg}, {reg}, fp"]
+
+
+class Instr:
+    """
+    base class of the three-address instructions
+    dst is the register defined (None if nothing is), args the registers used
+    gen_asm(frame) returns the asm lines, with every register in its frame slot, see Frame
+    """
+    dst = None
+
+    def __repr__(self):
+        return self.__str__()
+
+    def uses(self):
+        return self.args
+
+    def replace_uses(self, f):
+        """
+        replace every register r used by f(r)
+        """
+        self.args = [f(arg) for arg in self.args]
+
+    def _load_args(self, frame):
+        lines = []
+        for reg, arg in zip(("t1", "t2"), self.args):
+            lines += fp_load(reg, frame[arg])
+        return lines
+
+    def _def(self, frame):
+        return fp_store("t1", frame[self.dst])
+
+
+class Const(Instr):
+    def __init__(self, dst: Reg, v: int):
+        self.dst = dst
+        self.args = []
+        self.v = v
+
+    def __str__(self):
+        return f"{self.dst} = const {self.v}"
+
+    def gen_asm(self, frame):
+        return [f"li t1, {self.v}"] + self._def(frame)
+
+
+class Copy(Instr):
+    def __init__(self, dst: Reg, src: Reg):
+        self.dst = dst
+        self.args = [src]
+
+    def __str__(self):
+        return f"{self.dst} = copy {self.args[0]}"
+
+    def gen_asm(self, frame):
+        if frame[self.dst] == frame[self.args[0]]:
+            return []
+        return self._load_args(frame) + self._def(frame)
+
+
+class Unary(Instr):
+    def __init__(self, dst: Reg, op: str, src: Reg):
+        self.dst = dst
+        self.op = op
+        self.args = [src]
+
+    def __str__(self):
+        return f"{self.dst} = {IRStr.Unary.ir_unary_ops[self.op]} {self.args[0]}"
+
+    def gen_asm(self, frame):
+        return self._load_args(frame) + IRStr.Unary(self.op).reg_asm() + self._def(frame)
+
+
+class Binary(Instr):
+    def __init__(self, dst: Reg, op: str, lhs: Reg, rhs: Reg):
+        self.dst = dst
+        self.op = op
+        self.args = [lhs, rhs]
+
+    def __str__(self):
+        return f"{self.dst} = {IRStr.Binary.binary_ops[self.op]} {self.args[0]}, {self.args[1]}"
+
+    def gen_asm(self, frame):
+        return self._load_args(frame) + IRStr.Binary(self.op).reg_asm() + self._def(frame)
+
+
+class FrameAddr(Instr):
+    """
+    the address of a frame slot, fp + offset
+    """
+
+    def __init__(self, dst: Reg, offset: int):
+        self.dst = dst
+        self.args = []
+        self.offset = offset
+
+    def __str__(self):
+        return f"{self.dst} = frameaddr {self.offset}"
+
+    def gen_asm(self, frame):
+        return fp_addr("t1", self.offset) + self._def(frame)
+
+
+class GlobalAddr(Instr):
+    def __init__(self, dst: Reg, sym: str):
+        self.dst = dst
+        self.args = []
+        self.sym = sym
+
+    def __str__(self):
+        return f"{self.dst} = globaladdr {self.sym}"
+
+    def gen_asm(self, frame):
+        return [f"la t1, {self.sym}"] + self._def(frame)
+
+
+class Load(Instr):
+    def __init__(self, dst: Reg, addr: Reg):
+        self.dst = dst
+        self.args = [addr]
+
+    def __str__(self):
+        return f"{self.dst} = load {self.args[0]}"
+
+    def gen_asm(self, frame):
+        return self._load_args(frame) + ["lw t1, 0(t1)"] + self._def(frame)
+
+
+class Store(Instr):
+    def __init__(self, addr: Reg, value: Reg):
+        self.args = [addr, value]
+
+    def __str__(self):
+        return f"store {self.args[0]}, {self.args[1]}"
+
+    def gen_asm(self, frame):
+        return self._load_args(frame) + ["sw t2, 0(t1)"]
+
+
+class LoadSlot(Instr):
+    """
+    load the frame slot fp + offset, a cell kept in memory
+    """
+
+    def __init__(self, dst: Reg, offset: int):
+        self.dst = dst
+        self.args = []
+        self.offset = offset
+
+    def __str__(self):
+        return f"{self.dst} = loadslot {self.offset}"
+
+    def gen_asm(self, frame):
+        return fp_load("t1", self.offset) + self._def(frame)
+
+
+class StoreSlot(Instr):
+    def __init__(self, offset: int, value: Reg):
+        self.args = [value]
+        self.offset = offset
+
+    def __str__(self):
+        return f"storeslot {self.offset}, {self.args[0]}"
+
+    def gen_asm(self, frame):
+        return self._load_args(frame) + fp_store("t1", self.offset)
+
+
+class Call(Instr):
+    """
+    the arguments are pushed from the last to the first, as in the stack IR
+    """
+
+    def __init__(self, dst: Reg, func: str, args):
+        self.dst = dst
+        self.func = func
+        self.args = list(args)
+
+    def __str__(self):
+        return f"{self.dst} = call {self.func}({', '.join(map(str, self.args))})"
+
+    def gen_asm(self, frame):
+        lines = []
+        for arg in reversed(self.args):
+            lines += fp_load("t1", frame[arg]) + ["addi sp, sp, -4", "sw t1, 0(sp)"]
+        lines.append(f"call {self.func}")
+        if self.args:
+            lines.append(f"addi sp, sp, {4 * len(self.args)}")
+        return lines + fp_store("a0", frame[self.dst])
+
+
+class Phi(Instr):
+    """
+    dst = the value of incoming[pred] when coming from the block pred
+    var is the register variable dst is a version of, see ssa.py
+    """
+
+    def __init__(self, dst: Reg, var: Reg):
+        self.dst = dst
+        self.var = var
+        self.incoming = {}  # BasicBlock -> Reg
+
+    def __str__(self):
+        return f"{self.dst} = phi " + ", ".join(f"[{reg}, {block.label}]" for block, reg in self.incoming.items())
+
+    def uses(self):
+        return list(self.incoming.values())
+
+    def replace_uses(self, f):
+        self.incoming = {block: f(reg) for block, reg in self.incoming.items()}
+
+
+class Jump(Instr):
+    def __init__(self, target):
+        self.args = []
+        self.target = target
+
+    def __str__(self):
+        return f"br {self.target.label}"
+
+    def targets(self):
+        return [self.target]
+
+    def retarget(self, old, new):
+        self.target = new
+
+    def gen_asm(self, frame, next_block=None):
+        return [] if self.target is next_block else [f"j {self.target.label}"]
+
+
+class CondJump(Instr):
+    """
+    beqz/bnez cond to target, going on to fallthrough otherwise
+    """
+
+    def __init__(self, op: str, cond: Reg, target, fallthrough):
+        self.op = op
+        self.args = [cond]
+        self.target = target
+        self.fallthrough = fallthrough
+
+    def __str__(self):
+        return f"{self.op} {self.args[0]}, {self.target.label}, {self.fallthrough.label}"
+
+    def targets(self):
+        return [self.target, self.fallthrough]
+
+    def retarget(self, old, new):
+        if self.target is old:
+            self.target = new
+        if self.fallthrough is old:
+            self.fallthrough = new
+
+    def gen_asm(self, frame, next_block=None):
+        lines = self._load_args(frame) + [f"{self.op} t1, {self.target.label}"]
+        if self.fallthrough is not next_block:
+            lines.append(f"j {self.fallthrough.label}")
+        return lines
+
+
+class Return(Instr):
+    def __init__(self, value: Reg):
+        self.args = [value]
+
+    def __str__(self):
+        return f"ret {self.args[0]}"
+
+    def targets(self):
+        return []
+
+    def gen_asm(self, frame, next_block=None):
+        # the value goes on the stack top, where the epilogue takes it from, see AsmGenerator.generate_epilogue
+        return self._load_args(frame) + ["addi sp, sp, -4", "sw t1, 0(sp)", f"j {frame.func.name}_exit"]
+
+
+TERMINATORS = (Jump, CondJump, Return)
+
+
+class BasicBlock:
+    def __init__(self, label: str):
+        self.label = label
+        self.instrs = []  # the phis first, a terminator last
+        self.preds = []
+        self.succs = []
+
+    def __str__(self):
+        return f"{self.label}:\n" + "".join(f"\t{instr}\n" for instr in self.instrs)
+
+    def phis(self):
+        return [instr for instr in self.instrs if instr.__class__ is Phi]
+
+    def terminator(self):
+        return self.instrs[-1]
+
+
+class TACFunc:
+    """
+    the control-flow graph of a function, blocks[0] is the entry, which no block jumps to
+    """
+
+    def __init__(self, name: str, param_info, depth: int):
+        """
+        :param depth: the number of frame slots kept for the cells of the IR stack, see Frame
+        """
+        self.name = name
+        self.paramInfo = param_info
+        self.depth = depth
+        self.blocks = []
+        self.blockCount = 0
+        self.regCount = 0
+        self.variables = set()  # the register variables of the cells, see the module docstring
+        self.slots = None  # register -> its frame slot when they share them, see opt.share_slots
+
+    def __str__(self):
+        return f"{self.name}:\n" + "".join(map(str, self.blocks))
+
+    def new_reg(self):
+        self.regCount += 1
+        return Reg(self.regCount)
+
+    def new_block(self, label=None):
+        if label is None:
+            label = f"{self.name}.{self.blockCount}"  # '.' keeps it apart from identifiers
+            self.blockCount += 1
+        block = BasicBlock(label)
+        self.blocks.append(block)
+        return block
+
+    def link(self):
+        """
+        compute the preds and succs of every block from the terminators
+        """
+        for block in self.blocks:
+            block.preds = []
+        for block in self.blocks:
+            block.succs = list(dict.fromkeys(block.terminator().targets()))
+            for succ in block.succs:
+                succ.preds.append(block)
+
+
+class Frame:
+    """
+    the frame of a TACFunc: the frame slots of the IR stack under fp, then one slot for every register, or the
+    slots of func.slots
+    """
+
+    def __init__(self, func: TACFunc):
+        self.func = func
+        self.offsets = {}
+        words = func.depth
+        if func.slots is not None:
+            for reg, slot in func.slots.items():
+                self.offsets[reg] = -4 * (func.depth + slot + 1)
+            words += max(func.slots.values(), default=-1) + 1
+        else:
+            for block in func.blocks:
+                for instr in block.instrs:
+                    if instr.dst is not None and instr.dst not in self.offsets:
+                        words += 1
+                        self.offsets[instr.dst] = -4 * words
+        self.size = 4 * words
+
+    def __getitem__(self, reg: Reg):
+        return self.offsets[reg]
+
+
+def lower(func):
+    """
+    :param func: an IRFunc
+    :return: its TACFunc, not in SSA form, or None if its stack depth is not the same on every path
+    """
+    return _Lowering(func).run()
+
+
+class _Lowering:
+    def __init__(self, func):
+        self.irFunc = func
+        self.chunks = []  # [label or None, [IR]], as in irexec.FunctionLowering
+        self.chunkOf = {}  # label -> chunk number
+        current = [None, []]
+        self.chunks.append(current)
+        for ir in func.instructions:
+            if ir.__class__ is IRStr.Label:
+                current = [ir.label, []]
+                self.chunks.append(current)
+                self.chunkOf[ir.label] = len(self.chunks) - 1
+                continue
+            current[1].append(ir)
+            if ir.__class__ in (IRStr.Branch, IRStr.Ret):
+                current = [None, []]
+                self.chunks.append(current)
+
+    def _successors(self, number: int):
+        irs = self.chunks[number][1]
+        last = irs[-1] if irs else None
+        if last.__class__ is IRStr.Ret:
+            return []
+        if last.__class__ is IRStr.Branch:
+            target = self.chunkOf[last.label]
+            return [target] if last.op == "br" else [target, number + 1]
+        return [number + 1] if number + 1 < len(self.chunks) else []
+
+    @staticmethod
+    def _effect(ir):
+        """
+        :return: the change of the stack depth by ir
+        """
+        cls = ir.__class__
+        if cls in (IRStr.Const, IRStr.FrameSlot, IRStr.GlobalSymbol):
+            return 1
+        if cls in (IRStr.Pop, IRStr.Binary, IRStr.Store):
+            return -1
+        if cls is IRStr.Call:
+            return 1 - ir.para_cnt
+        if cls is IRStr.Branch and ir.op != "br":
+            return -1
+        return 0
+
+    def _depths(self):
+        """
+        :return: the stack depth at the start of every reachable chunk, or None if it is not the same on every
+            path
+        """
+        depths = {0: self.irFunc.paramInfo.paramNum}
+        work = [0]
+        while work:
+            number = work.pop()
+            depth = depths[number]
+            for ir in self.chunks[number][1]:
+                depth += self._effect(ir)
+            for succ in self._successors(number):
+                if succ not in depths:
+                    depths[succ] = depth
+                    work.append(succ)
+                elif depths[succ] != depth:
+                    return None
+        return depths
+
+    def _in_memory(self):
+        """
+        :return: the deepest cell whose address is taken, the cells down to it stay in memory
+        """
+        deepest = 0
+        instructions = self.irFunc.instructions
+        for i, ir in enumerate(instructions):
+            if ir.__class__ is IRStr.FrameSlot:
+                follower = instructions[i + 1].__class__ if i + 1 < len(instructions) else None
+                if follower is not IRStr.Load and follower is not IRStr.Store:
+                    deepest = max(deepest, -ir.offset // 4)
+        return deepest
+
+    def run(self):
+        depths = self._depths()
+        if depths is None:
+            return None
+        self.memory = self._in_memory()
+        params = self.irFunc.paramInfo.paramNum
+        func = self.func = TACFunc(self.irFunc.name, self.irFunc.paramInfo, max(self.memory, params))
+        self.cells = {}  # depth -> register variable
+        entry = func.new_block()
+        blocks = {number: func.new_block(self.chunks[number][0]) for number in sorted(depths)}
+        self.block = entry
+        for depth in range(self.memory + 1, params + 1):  # the header stored them
+            self.emit(LoadSlot(self.cell(depth), -4 * depth))
+        self.emit(Jump(blocks[0]))
+        for number, block in blocks.items():
+            self.block = block
+            self.depth = depths[number]
+            irs = self.chunks[number][1]
+            i = 0
+            while i < len(irs):
+                i = self.lower_ir(irs, i, blocks, number)
+            if not irs or irs[-1].__class__ not in (IRStr.Branch, IRStr.Ret):
+                if number + 1 < len(self.chunks):
+                    self.emit(Jump(blocks[number + 1]))
+                else:  # the end of the function: the epilogue returns 0
+                    zero = func.new_reg()
+                    self.emit(Const(zero, 0))
+                    self.emit(Return(zero))
+        func.variables = set(self.cells.values())
+        func.link()
+        return func
+
+    def emit(self, instr):
+        self.block.instrs.append(instr)
+
+    def cell(self, depth: int):
+        reg = self.cells.get(depth)
+        if reg is None:
+            reg = self.cells[depth] = self.func.new_reg()
+        return reg
+
+    def push(self, make):
+        """
+        push the value of the instruction make(dst)
+        """
+        self.depth += 1
+        if self.depth > self.memory:
+            self.emit(make(self.cell(self.depth)))
+        else:
+            reg = self.func.new_reg()
+            self.emit(make(reg))
+            self.emit(StoreSlot(-4 * self.depth, reg))
+
+    def top(self, below=0):
+        """
+        :return: a register holding the value of the cell below entries under the stack top
+        """
+        depth = self.depth - below
+        if depth > self.memory:
+            return self.cell(depth)
+        reg = self.func.new_reg()
+        self.emit(LoadSlot(reg, -4 * depth))
+        return reg
+
+    def lower_ir(self, irs, i: int, blocks, number: int):
+        """
+        lower irs[i], with the load or store after it if irs[i] is the frameslot of a cell
+        :return: the index of the next IR to lower
+        """
+        ir = irs[i]
+        cls = ir.__class__
+        follower = irs[i + 1].__class__ if i + 1 < len(irs) else None
+        if cls is IRStr.FrameSlot and follower in (IRStr.Load, IRStr.Store):
+            depth = -ir.offset // 4
+            if follower is IRStr.Load:
+                if depth > self.memory:
+                    self.push(lambda dst: Copy(dst, self.cell(depth)))
+                else:
+                    self.push(lambda dst: LoadSlot(dst, ir.offset))
+            else:  # the value stays on the stack
+                value = self.top()
+                if depth > self.memory:
+                    self.emit(Copy(self.cell(depth), value))
+                else:
+                    self.emit(StoreSlot(ir.offset, value))
+                if self.depth <= self.memory:
+                    self.emit(StoreSlot(-4 * self.depth, value))
+            return i + 2
+        if cls is IRStr.Const:
+            self.push(lambda dst: Const(dst, ir.v))
+        elif cls is IRStr.FrameSlot:
+            self.push(lambda dst: FrameAddr(dst, ir.offset))
+        elif cls is IRStr.GlobalSymbol:
+            self.push(lambda dst: GlobalAddr(dst, ir.sym))
+        elif cls is IRStr.Pop:
+            self.depth -= 1
+        elif cls is IRStr.Load:
+            addr = self.top()
+            self.depth -= 1
+            self.push(lambda dst: Load(dst, addr))
+        elif cls is IRStr.Store:
+            addr, value = self.top(), self.top(1)
+            self.emit(Store(addr, value))
+            self.depth -= 1
+            if self.depth <= self.memory:  # the value is pushed again
+                self.emit(StoreSlot(-4 * self.depth, value))
+        elif cls is IRStr.Unary:
+            operand = self.top()
+            self.depth -= 1
+            self.push(lambda dst: Unary(dst, ir.op, operand))
+        elif cls is IRStr.Binary:
+            lhs, rhs = self.top(1), self.top()
+            self.depth -= 2
+            self.push(lambda dst: Binary(dst, ir.op, lhs, rhs))
+        elif cls is IRStr.Call:
+            args = [self.top(k) for k in range(ir.para_cnt)]
+            self.depth -= ir.para_cnt
+            self.push(lambda dst: Call(dst, ir.func, args))
+        elif cls is IRStr.Ret:
+            self.emit(Return(self.top()))
+        elif cls is IRStr.Branch:
+            target = blocks[self.chunkOf[ir.label]]
+            if ir.op == "br":
+                self.emit(Jump(target))
+            else:
+                cond = self.top()
+                self.depth -= 1
+                self.emit(CondJump(ir.op, cond, target, blocks[number + 1]))
+        else:
+            raise Exception(f"cannot lower {ir}")
+        return i + 1
@@ -1,19 +1,75 @@
-from ast import literal_eval
+from array import array
+from inspect import isgeneratorfunction
 
 from minidecaf.IRStr import *
 from minidecaf.types import *
-from .generated.MiniDecafParser import MiniDecafParser
-from .generated.MiniDecafVisitor import MiniDecafVisitor
+import minidecaf.syntax as syntax
+from minidecaf.syntax import Assign, Break, Cast, Compound, Cond, Continue, Declaration, DoWhile, ExprStmt, For, \
+    FuncDecl, FuncDef, GlobalDecl, Ident, If, Index, IntLit, NodeVisitor, Program, Return, SideTable, While
+
+
+class TypeTable:
+    """
+    SideTable of types, kept as their tids (see types.py) in an array
+    """
+    __slots__ = ('tids',)
+
+    def __init__(self, size: int):
+        self.tids = array('i', [-1]) * size
+
+    def __getitem__(self, node):
+        tid = self.tids[node.nid]
+        if tid < 0:
+            raise KeyError(node)
+        return TYPES[tid]
+
+    def __setitem__(self, node, ty: Type):
+        self.tids[node.nid] = ty.tid
+
+    def __contains__(self, node):
+        return self.tids[node.nid] >= 0
+
+    def __len__(self):
+        return len(self.tids) - self.tids.count(-1)
+
+    def items(self):
+        """
+        :return: (nid, type) of every entry
+        """
+        return [(nid, TYPES[tid]) for nid, tid in enumerate(self.tids) if tid >= 0]
 
 
 class TypeInfo:
     """
     type parse only takes effect on expressions
+    the types and locations of the nodes are side tables of the top-level declaration being checked or
+    generated, see enter()
     """
     def __init__(self):
-        self.loc = {}  # ExprContext -> (IRInstr|ExprContext)+
+        self.loc = None  # Expr -> (IRInstr|Expr)+
         self.funcs = {}  # str -> FuncTypeInfo
-        self.term2type = {}  # ExprContext -> Type
+        self.term2type = None  # Expr -> Type
+        self.tables = {}  # name of a function definition -> (term2type, loc) of it
+
+    def enter(self, decl):
+        """
+        make term2type and loc the tables of a top-level declaration; the ones of a function definition are
+        kept for the IR generator, the ones of a global or a function declaration only until the next call
+        """
+        if decl.__class__ is FuncDef:
+            tables = self.tables.get(decl.name)
+            if tables is None:
+                tables = self.tables[decl.name] = (TypeTable(decl.size), SideTable(decl.size))
+        else:
+            tables = (TypeTable(decl.size), SideTable(decl.size))
+        self.term2type, self.loc = tables
+
+    def release(self, func: str):
+        """
+        drop the tables of a function definition
+        """
+        del self.tables[func]
+        self.term2type = self.loc = None
 
     def lvalueLoc(self, ctx):
         return self.loc[ctx]
@@ -33,35 +89,44 @@ class FuncTypeInfo:
     def __init__(self, retTy: Type, paramTy: list):
         self.retTy = retTy
         self.paramTy = paramTy
+        self.callRule = None
 
     def compatible(self, other):
         return self.retTy == other.retTy and self.paramTy == other.paramTy
 
     def call(self):
-        @type_rule
-        def callRule(ctx, argTy: list):
-            if self.paramTy == argTy:
-                return self.retTy
-            return f"bad argument types"
-        return callRule
+        if self.callRule is None:
+            @type_rule
+            def callRule(ctx, argTy: list):
+                if self.paramTy == argTy:
+                    return self.retTy
+                return f"bad argument types"
+            self.callRule = callRule
+        return self.callRule
 
 
 def save_type(f):
     """
     decorator mode
     note down the type information in a dict
-    :param f:
+    :param f: a visit method, plain or a generator (see syntax.NodeVisitor)
     :return:
     """
-    def g(self, ctx):
-        ty = f(self, ctx)
-        self.typeInfo.term2type[ctx] = ty
-        return ty
+    if isgeneratorfunction(f):
+        def g(self, node):
+            ty = yield from f(self, node)
+            self.typeInfo.term2type[node] = ty
+            return ty
+    else:
+        def g(self, node):
+            ty = f(self, node)
+            self.typeInfo.term2type[node] = ty
+            return ty
 
     return g
 
 
-class Typer(MiniDecafVisitor):
+class Typer(NodeVisitor):
     """
     Type checking.
     Run after name resolution, type checking computes the type of each
@@ -79,213 +144,167 @@ class Typer(MiniDecafVisitor):
         self.typeInfo = TypeInfo()
         self.locator = Locator(self.nameInfo, self.typeInfo)
 
-    def visitChildren(self, ctx):
-        ty = MiniDecafVisitor.visitChildren(self, ctx) # return the type object in types.py (visitors has been
-        # reimplemented in this class)
-        self.typeInfo.term2type[ctx] = ty
-        return ty
-
     def _var(self, term):
-        return self.nameInfo[term]
+        return self.nameInfo.nameManager[self.curFunc][term]
+
+    def _ty(self, ptrs: int):
+        """
+        :param ptrs: number of '*' after int
+        """
+        ty = INT
+        for _ in range(ptrs):
+            ty = PtrType(ty)
+        return ty
 
-    def _declTyp(self, ctx: MiniDecafParser.DeclarationContext):
+    def _declTyp(self, decl: Declaration):
         """
-        :param ctx:
+        :param decl:
         :return: corresponding type to the declaration
         """
-        base = ctx.ty().accept(self)
-        dims = [int(x.getText()) for x in reversed(ctx.Integer())]
+        base = self._ty(decl.ptrs)
+        dims = list(reversed(decl.dims))
         if len(dims) == 0:
             return base
         else:
             return ArrayType.make(base, dims)
 
-    def _funcTypeInfo(self, ctx):
+    def _funcTypeInfo(self, node):
         """
 
-        :param ctx:
+        :param node:
         :return: function type manager
         """
-        retTy = ctx.ty().accept(self)
-        paramTy = self.paramTy(ctx.paramList())
+        retTy = self._ty(node.ptrs)
+        paramTy = self.paramTy(node.params)
         return FuncTypeInfo(retTy, paramTy)
 
-    def _argTy(self, ctx: MiniDecafParser.ArgListContext):
-        return list(map(lambda x: x.accept(self), ctx.expr()))
-
-    def visitPtrType(self, ctx: MiniDecafParser.PtrTypeContext):
-        return PtrType(ctx.ty().accept(self))
-
-    def visitIntType(self, ctx: MiniDecafParser.IntTypeContext):
-        return IntType()
-
-    def locate(self, ctx):
-        loc = self.locator.locate(self.curFunc, ctx)
+    def locate(self, node):
+        loc = self.locator.locate(self.curFunc, node)
         if loc is None:
-            raise Exception(ctx, "lvalue expected")
-        self.typeInfo.setLvalueLoc(ctx, loc)
+            raise Exception(node, "lvalue expected")
+        self.typeInfo.setLvalueLoc(node, loc)
 
-    def checkUnary(self, ctx, op: str, ty: Type):
+    def checkUnary(self, node, op: str, ty: Type):
         """
-        return the op's corresponding rule
-        :param ctx:
+        the result type of the op's corresponding rule, looked up in UNARY_RESULTS once the rule has run
+        :param node:
         :param op:
-        :param lhs: left hand side type
-        :param rhs: right hand side type
+        :param ty: operand type
         """
-        rule = expandIterableKey([
-            (['-', '!', '~'], intUnaopRule),
-            (['&'], addrofRule),
-            (['*'], derefRule),
-        ])[op]
-        return rule(ctx, ty)
-
-    def checkBinary(self, ctx, op: str, lhs: Type, rhs: Type):
+        key = (op, ty.tid)
+        res = UNARY_RESULTS.get(key)
+        if res is None:
+            res = UNARY_RESULTS[key] = UNARY_RULES[op](node, ty)  # raises on a type error, which is not kept
+        return res
+
+    def checkBinary(self, node, op: str, lhs: Type, rhs: Type):
         """
-        return the op's corresponding rule
-        :param ctx:
+        the result type of the op's corresponding rule, looked up in BINARY_RESULTS once the rule has run
+        :param node:
         :param op:
         :param lhs: left hand side type
         :param rhs: right hand side type
         :return:
         """
-        rule = expandIterableKey([
-            (['*', '/', '%'] + ["&&", "||"], intBinopRule),
-            (["==", "!="], eqRule),
-            (["<", "<=", ">", ">="], relRule),
-            (['='], asgnRule),
-            (['+'], tryEach('+', intBinopRule, ptrArithRule)),
-            (['-'], tryEach('-', intBinopRule, ptrArithRule, ptrDiffRule)),
-        ])[op]
-        return rule(ctx, lhs, rhs)
-
-    @save_type
-    def visitCCast(self, ctx: MiniDecafParser.CCastContext):
-        ctx.cast().accept(self)
-        return ctx.ty().accept(self)
-
-    @save_type
-    def visitCUnary(self, ctx: MiniDecafParser.CUnaryContext):
-        res = self.checkUnary(ctx.unaryOp(), ctx.unaryOp().getText(),
-                              ctx.cast().accept(self))
-        if ctx.unaryOp().getText() == '&':
-            self.locate(ctx.cast())
+        key = (op, lhs.tid, rhs.tid)
+        res = BINARY_RESULTS.get(key)
+        if res is None:
+            res = BINARY_RESULTS[key] = BINARY_RULES[op](node, lhs, rhs)
         return res
 
     @save_type
-    def visitAtomParen(self, ctx: MiniDecafParser.AtomParenContext):
-        return ctx.expr().accept(self)
-
-    @save_type
-    def visitCAdd(self, ctx: MiniDecafParser.CAddContext):
-        return self.checkBinary(ctx.addOp(), ctx.addOp().getText(),
-                                ctx.additive().accept(self), ctx.multiplicative().accept(self))
-
-    @save_type
-    def visitCMul(self, ctx: MiniDecafParser.CMulContext):
-        return self.checkBinary(ctx.mulOp(), ctx.mulOp().getText(),
-                                ctx.multiplicative().accept(self), ctx.cast().accept(self))
+    def visitCast(self, node: Cast):
+        yield node.operand
+        return self._ty(node.ptrs)
 
     @save_type
-    def visitCRel(self, ctx: MiniDecafParser.CRelContext):
-        return self.checkBinary(ctx.relOp(), ctx.relOp().getText(),
-                                ctx.relational().accept(self), ctx.additive().accept(self))
-
-    @save_type
-    def visitCEq(self, ctx: MiniDecafParser.CEqContext):
-        return self.checkBinary(ctx.eqOp(), ctx.eqOp().getText(),
-                                ctx.equality().accept(self), ctx.relational().accept(self))
-
-    @save_type
-    def visitCLand(self, ctx: MiniDecafParser.CLandContext):
-        return self.checkBinary(ctx, "&&",
-                                ctx.logicalAnd().accept(self), ctx.equality().accept(self))
+    def visitUnary(self, node: syntax.Unary):
+        res = self.checkUnary(node, node.op, (yield node.operand))
+        if node.op == '&':
+            self.locate(node.operand)
+        return res
 
     @save_type
-    def visitCLor(self, ctx: MiniDecafParser.CLorContext):
-        return self.checkBinary(ctx, "||",
-                                ctx.logicalOr().accept(self), ctx.logicalAnd().accept(self))
+    def visitBinary(self, node: syntax.Binary):
+        return self.checkBinary(node, node.op, (yield node.lhs), (yield node.rhs))
 
     @save_type
-    def visitWithCond(self, ctx: MiniDecafParser.WithCondContext):
-        return condRule(ctx, ctx.logicalOr().accept(self),
-                        ctx.expr().accept(self), ctx.conditional().accept(self))
+    def visitCond(self, node: Cond):
+        return condRule(node, (yield node.cond), (yield node.th), (yield node.el))
 
     @save_type
-    def visitWithAsgn(self, ctx: MiniDecafParser.WithAsgnContext):
-        res = self.checkBinary(ctx.asgnOp(), ctx.asgnOp().getText(),
-                               ctx.unary().accept(self), ctx.assignment().accept(self))
-        self.locate(ctx.unary())
+    def visitAssign(self, node: Assign):
+        res = self.checkBinary(node, '=', (yield node.lhs), (yield node.rhs))
+        self.locate(node.lhs)
         return res
 
     @save_type
-    def visitPostfixCall(self, ctx: MiniDecafParser.PostfixCallContext):
-        argTy = self._argTy(ctx.argList())
-        func = ctx.Ident().getText()
-        rule = self.typeInfo.funcs[func].call()
-        return rule(ctx, argTy)
+    def visitCall(self, node: syntax.Call):
+        argTy = []
+        for arg in node.args:
+            argTy.append((yield arg))
+        rule = self.typeInfo.funcs[node.name].call()
+        return rule(node, argTy)
 
     @save_type
-    def visitPostfixArray(self, ctx: MiniDecafParser.PostfixArrayContext):
-        return arrayRule(ctx,
-                         ctx.postfix().accept(self), ctx.expr().accept(self))
+    def visitIndex(self, node: Index):
+        return arrayRule(node, (yield node.base), (yield node.index))
 
     @save_type
-    def visitAtomInteger(self, ctx: MiniDecafParser.AtomIntegerContext):
-        if literal_eval(ctx.getText()) == 0:
-            return ZeroType()
+    def visitIntLit(self, node: IntLit):
+        if node.value == 0:
+            return ZERO
         else:
-            return IntType()
+            return INT
 
     @save_type
-    def visitAtomIdent(self, ctx: MiniDecafParser.AtomIdentContext):
-        var = self._var(ctx.Ident())
+    def visitIdent(self, node: Ident):
+        var = self._var(node)
         return self.var2type[var]
 
-    def visitDeclaration(self, ctx: MiniDecafParser.DeclarationContext):
-        var = self._var(ctx.Ident())
-        ty = self._declTyp(ctx)
+    def visitDeclaration(self, node: Declaration):
+        var = self._var(node)
+        ty = self._declTyp(node)
         self.var2type[var] = ty
-        if ctx.expr() is not None:
-            initTyp = ctx.expr().accept(self)
-            asgnRule(ctx, ty, initTyp)
-
-    def checkFunc(self, ctx, isMain=False):
-        funcTypeInfo = self._funcTypeInfo(ctx)
-        if isMain:
-            func = 'main'
-        else:
-            func = ctx.Ident().getText()
+        if node.init is not None:
+            initTyp = yield node.init
+            asgnRule(node, ty, initTyp)
+
+    def checkFunc(self, node):
+        funcTypeInfo = self._funcTypeInfo(node)
+        func = node.name
         if func in self.typeInfo.funcs:
             prevFuncTypeInfo = self.typeInfo.funcs[func]
             if not funcTypeInfo.compatible(prevFuncTypeInfo):
-                raise Exception(ctx, f"conflicting types for {func}")
+                raise Exception(node, f"conflicting types for {func}")
         else:
             self.typeInfo.funcs[func] = funcTypeInfo
 
-    def visitFuncDef(self, ctx: MiniDecafParser.FuncDefContext):
-        func = ctx.Ident().getText()
-        self.curFunc = func
-        self.checkFunc(ctx)
-        self.visitChildren(ctx)
-        self.curFunc = None
-
-    def visitMainFunc(self, ctx: MiniDecafParser.MainFuncContext):
-        self.curFunc = 'main'
-        self.checkFunc(ctx, True)
-        self.visitChildren(ctx)
+    def visitProgram(self, node: Program):
+        for decl in node.decls:
+            if decl.__class__ is FuncDef:
+                self.visitFuncDef(decl)  # looked up on self, so that an instrument can watch it
+            else:
+                self.visit(decl)
+
+    def visitFuncDef(self, node: FuncDef):
+        self.curFunc = node.name
+        self.typeInfo.enter(node)
+        self.checkFunc(node)
+        for param in node.params:
+            self.visit(param)
+        self.visit(node.body)
         self.curFunc = None
 
-    def visitFuncDecl(self, ctx: MiniDecafParser.FuncDeclContext):
-        func = ctx.Ident().getText()
-        self.curFunc = func
-        self.checkFunc(ctx)
+    def visitFuncDecl(self, node: FuncDecl):
+        self.curFunc = node.name
+        self.checkFunc(node)
         self.curFunc = None
 
-    def paramTy(self, ctx: MiniDecafParser.ParamListContext):
+    def paramTy(self, params):
         res = []
-        for decl in ctx.declaration():
-            if decl.expr() is not None:
+        for decl in params:
+            if decl.init is not None:
                 raise Exception(decl, "parameter cannot have initializers")
             paramTy = self._declTyp(decl)
             if isinstance(paramTy, ArrayType):
@@ -293,83 +312,120 @@ class Typer(MiniDecafVisitor):
             res += [paramTy]
         return res
 
-    def visitDeclExternalDecl(self, ctx: MiniDecafParser.DeclExternalDeclContext):
-        ctx = ctx.declaration()
-        var = self.nameInfo.globs[ctx.Ident().getText()].var
-        ty = self._declTyp(ctx)
+    def visitGlobalDecl(self, node: GlobalDecl):
+        self.typeInfo.enter(node)
+        var = self.nameInfo.globs[node.name].var
+        ty = self._declTyp(node)
         if var in self.var2type:
             prevTy = self.var2type[var]
             if prevTy != ty:
-                raise Exception(ctx, f"conflicting types for {var.ident}")
+                raise Exception(node, f"conflicting types for {var.ident}")
         else:
             self.var2type[var] = ty
-        if ctx.expr() is not None:
-            initTyp = ctx.expr().accept(self)
-            asgnRule(ctx, ty, initTyp)
-
-    def visitReturnStmt(self, ctx: MiniDecafParser.ReturnStmtContext):
-        funcRetTy = self.typeInfo.funcs[self.curFunc].retTy
-        ty = ctx.expr().accept(self)
-        retRule(ctx, funcRetTy, ty)
-
-    def visitIfStmt(self, ctx: MiniDecafParser.IfStmtContext):
-        self.visitChildren(ctx)
-        stmtCondRule(ctx, ctx.expr().accept(self))  # idempotent
-
-    def visitForDeclStmt(self, ctx: MiniDecafParser.ForDeclStmtContext):
-        self.visitChildren(ctx)
-        if ctx.ctrl is not None: stmtCondRule(ctx, ctx.ctrl.accept(self))
-
-    def visitForStmt(self, ctx: MiniDecafParser.ForStmtContext):
-        self.visitChildren(ctx)
-        if ctx.ctrl is not None: stmtCondRule(ctx, ctx.ctrl.accept(self))
-
-    def visitWhileStmt(self, ctx: MiniDecafParser.WhileStmtContext):
-        self.visitChildren(ctx)
-        stmtCondRule(ctx, ctx.expr().accept(self))
-
-    def visitDoWhileStmt(self, ctx: MiniDecafParser.DoWhileStmtContext):
-        self.visitChildren(ctx)
-        stmtCondRule(ctx, ctx.expr().accept(self))
+        if node.init is not None:
+            initTyp = self.visit(node.init)
+            asgnRule(node, ty, initTyp)
 
+    def visitCompound(self, node: Compound):
+        for item in node.items:
+            yield item
 
-class Locator(MiniDecafVisitor):
+    def visitReturn(self, node: Return):
+        funcRetTy = self.typeInfo.funcs[self.curFunc].retTy
+        ty = yield node.expr
+        retRule(node, funcRetTy, ty)
+
+    def visitExprStmt(self, node: ExprStmt):
+        if node.expr is not None:
+            yield node.expr
+
+    def visitIf(self, node: If):
+        condTy = yield node.cond
+        yield node.th
+        if node.el is not None:
+            yield node.el
+        stmtCondRule(node, condTy)
+
+    def visitFor(self, node: For):
+        ctrlTy = None
+        if node.init is not None:
+            yield node.init
+        if node.ctrl is not None:
+            ctrlTy = yield node.ctrl
+        if node.post is not None:
+            yield node.post
+        yield node.body
+        if node.ctrl is not None: stmtCondRule(node, ctrlTy)
+
+    def visitWhile(self, node: While):
+        condTy = yield node.cond
+        yield node.body
+        stmtCondRule(node, condTy)
+
+    def visitDoWhile(self, node: DoWhile):
+        yield node.body
+        stmtCondRule(node, (yield node.cond))
+
+    def visitBreak(self, node: Break):
+        pass
+
+    def visitContinue(self, node: Continue):
+        pass
+
+
+class Locator(NodeVisitor):
     """
     visitor mode locating
+    an lvalue is located as IR to emit and expression nodes to generate in turn; as on the parse tree this was
+    written for, an expression that is not an lvalue by itself gives the location of its last operand
     """
     def __init__(self, nameInfo, typeInfo: TypeInfo):
         self.nameInfo = nameInfo
         self.typeInfo = typeInfo
 
-    def locate(self, func: str, ctx):
+    def locate(self, func: str, node):
         self.func = func
-        res = ctx.accept(self)
+        res = self.visit(node)
         self.func = None
         return res
 
-    def visitAtomIdent(self, ctx: MiniDecafParser.AtomIdentContext):
-        var = self.nameInfo[ctx.Ident()]
+    def visitIdent(self, node: Ident):
+        var = self.nameInfo.nameManager[self.func][node]
         if var.offset is None:
             return [GlobalSymbol(var.name)]
         else:
             return [FrameSlot(var.offset)]
 
-    def visitCUnary(self, ctx: MiniDecafParser.CUnaryContext):
-        op = ctx.unaryOp().getText()
-        if op == '*':
-            return [ctx.cast()]
+    def visitUnary(self, node: syntax.Unary):
+        if node.op == '*':
+            return [node.operand]
 
-    def visitPostfixArray(self, ctx: MiniDecafParser.PostfixArrayContext):
+    def visitIndex(self, node: Index):
         """
         reference to https://decaf-lang.github.io/minidecaf-tutorial/docs/ref/python-dzy.html#step11
-        :param ctx:
+        :param node:
         :return:
         """
-        fixupMult = self.typeInfo[ctx.postfix()].base.sizeof()
-        return [ctx.postfix(), ctx.expr(), Const(fixupMult), Binary('*'), Binary('+')]
+        fixupMult = self.typeInfo[node.base].base.sizeof()
+        return [node.base, node.index, Const(fixupMult), Binary('*'), Binary('+')]
+
+    def visitBinary(self, node):
+        return (yield node.rhs)
+
+    def visitAssign(self, node):
+        return (yield node.rhs)
+
+    def visitCond(self, node):
+        return (yield node.el)
 
-    def visitAtomParen(self, ctx: MiniDecafParser.AtomParenContext):
-        return ctx.expr().accept(self)
+    def visitCast(self, node):
+        return (yield node.operand)
+
+    def visitIntLit(self, node):
+        return None
+
+    def visitCall(self, node):
+        return None
 
 
 def expandIterableKey(d: list):
@@ -378,3 +434,22 @@ def expandIterableKey(d: list):
         for key in keys:
             d2[key] = val
     return d2
+
+
+UNARY_RULES = expandIterableKey([
+    (['-', '!', '~'], intUnaopRule),
+    (['&'], addrofRule),
+    (['*'], derefRule),
+])
+BINARY_RULES = expandIterableKey([
+    (['*', '/', '%'] + ["&&", "||"], intBinopRule),
+    (["==", "!="], eqRule),
+    (["<", "<=", ">", ">="], relRule),
+    (['='], asgnRule),
+    (['+'], tryEach('+', intBinopRule, ptrArithRule)),
+    (['-'], tryEach('-', intBinopRule, ptrArithRule, ptrDiffRule)),
+])
+# (op, tid of each operand type) -> result type, the types being interned (see types.py) these hold for any
+# program, so they are shared by all the compilations of the process
+UNARY_RESULTS = {}
+BINARY_RESULTS = {}
@@ -3,18 +3,56 @@ types information for check type period
 
 the types definition referenced to TA's implementation
 
+types are hash-consed: IntType(), PtrType(base), ArrayType(base, len), ZeroType() and VoidType() return the
+one object there is of that type, numbered by its tid, so equal types are the same object (but for ZeroType,
+which equals every int and pointer) and a type rule needs to run only once for every combination of input
+types, see memoized().
+
+the types are shared by every compilation of the process, and made under a lock so that threads compiling at
+the same time (see compiler.py) agree on them. They are never dropped, since the tids kept in the type tables
+and the results of memoized() refer to them: a long-running process (server.py, a Compiler) keeps one type for
+every pointer depth and array length its programs declared, a hundred bytes or so each, which only programs
+declaring arrays of ever new lengths keep adding to.
 """
+import threading
+
+TYPES = []  # tid -> type
+_interned = {}  # (class, tid of the base, len) -> type
+_intern_lock = threading.Lock()
+
+
+def _intern(cls, base=None, n=None):
+    key = (cls, None if base is None else base.tid, n)
+    ty = _interned.get(key)
+    if ty is None:
+        with _intern_lock:
+            ty = _interned.get(key)  # made by another thread meanwhile
+            if ty is None:
+                ty = object.__new__(cls)
+                ty.tid = len(TYPES)
+                if base is not None:
+                    ty.base = base
+                if n is not None:
+                    ty.len = n
+                TYPES.append(ty)
+                _interned[key] = ty  # last, so that it is only found once complete
+    return ty
+
+
 class Type:
     def __repr__(self):
         return self.__str__()
 
+    def __reduce__(self):
+        return self.__class__, ()  # a copy is interned again
+
     def sizeof(self):
         raise Exception("abstract type is unsized")
 
 
-class VoidType:
-    def __init__(self):
-        pass
+class VoidType(Type):
+    def __new__(cls):
+        return _intern(cls)
 
     def __str__(self):
         return "void"
@@ -24,8 +62,8 @@ class VoidType:
 
 
 class IntType(Type):
-    def __init__(self):
-        pass
+    def __new__(cls):
+        return _intern(cls)
 
     def __str__(self):
         return "int"
@@ -38,13 +76,18 @@ class IntType(Type):
 
 
 class PtrType(Type):
-    def __init__(self, base: Type):
-        self.base = base
+    def __new__(cls, base: Type):
+        return _intern(cls, base)
+
+    def __reduce__(self):
+        return PtrType, (self.base,)
 
     def __str__(self):
         return f"{self.base}*"
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, PtrType):
             return False
         return self.base == other.base
@@ -54,14 +97,18 @@ class PtrType(Type):
 
 
 class ArrayType(Type):
-    def __init__(self, base: Type, len: int):
-        self.base = base
-        self.len = len
+    def __new__(cls, base: Type, len: int):
+        return _intern(cls, base, len)
+
+    def __reduce__(self):
+        return ArrayType, (self.base, self.len)
 
     def __str__(self):
         return f"[{self.len}]{self.base}"
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, ArrayType):
             return False
         return self.base == other.base and self.len == other.len
@@ -81,8 +128,11 @@ class ArrayType(Type):
 
 
 class ZeroType(IntType, PtrType):
-    def __init__(self):
-        pass
+    def __new__(cls):
+        return _intern(cls)
+
+    def __reduce__(self):
+        return ZeroType, ()
 
     def __str__(self):
         return "zerotype"
@@ -91,12 +141,18 @@ class ZeroType(IntType, PtrType):
         return isinstance(other, IntType) or isinstance(other, PtrType)
 
 
+INT = IntType()
+ZERO = ZeroType()
+VOID = VoidType()
+
+
 def type_rule(f):
     """
     A type rule is a function: (ctx, *inputTypes) -> {outputType | errStr | None}.
     The ctx parameter is only used for error reporting.
 
     when the decorated functions returns a str, then the type rule reports an error according to the str
+    the undecorated function is kept as the check attribute of the rule, for trying it without raising
     """
 
     # @functools.wraps(f)
@@ -109,18 +165,33 @@ def type_rule(f):
         return res
 
     g.__name__ = f.__name__  # black magic
+    g.check = f
     return g
 
 
+def failed(res):
+    """
+    :param res: what the check of a type rule returned
+    """
+    return res is None or type(res) is str
+
+
 def tryEach(name="tryEach", *fs):
     """Combine multiple type rules `fs`, returns result the first that does not fail."""
 
     @type_rule
     def g(ctx, *inTy):
-        errs = []
         for f in fs:
             try:
-                return f(ctx, *inTy)
+                res = f.check(ctx, *inTy)
+            except Exception:
+                continue
+            if not failed(res):
+                return res
+        errs = []  # only raised on the way to the error
+        for f in fs:
+            try:
+                f(ctx, *inTy)
             except Exception as e:
                 errs += [e]
         return f"{name}:\n\t" + '\n\t'.join(map(str, errs))
@@ -129,31 +200,55 @@ def tryEach(name="tryEach", *fs):
     return g
 
 
+def memoized(rule):
+    """
+    the type rule `rule`, run only the first time it meets a combination of input types and looked up by their
+    tids afterwards; a combination it fails for is not remembered, the rule runs again to raise its error
+    """
+    results = {}
+    check = rule.check
+
+    def g(ctx, *inTy):
+        key = tuple([ty.tid for ty in inTy])
+        res = results.get(key)
+        if res is None:
+            res = check(ctx, *inTy)
+            if failed(res):
+                return rule(ctx, *inTy)
+            results[key] = res
+        return res
+
+    g.__name__ = rule.__name__
+    g.check = check
+    return g
+
+
+@memoized
 @type_rule
 def condRule(ctx, cond, tr, fal):
-    if cond == IntType() and tr == fal:
+    if cond == INT and tr == fal:
         return tr
 
 
 @type_rule
 def intBinopRule(ctx, lhs, rhs):
-    if lhs == IntType() and rhs == IntType():
-        return IntType()
+    if lhs == INT and rhs == INT:
+        return INT
     return f"integer expected, got {lhs} and {rhs}"
 
 
 @type_rule
 def intUnaopRule(ctx, ty):
-    if ty == IntType():
-        return IntType()
+    if ty == INT:
+        return INT
     return f"integer expected, got {ty}"
 
 
 @type_rule
 def ptrArithRule(ctx, lhs, rhs):
-    if lhs == IntType() and isinstance(rhs, PtrType):
+    if lhs == INT and isinstance(rhs, PtrType):
         return rhs
-    if rhs == IntType() and isinstance(lhs, PtrType):
+    if rhs == INT and isinstance(lhs, PtrType):
         return lhs
     return f"pointer and integer, got {lhs} and {rhs}"
 
@@ -161,7 +256,7 @@ def ptrArithRule(ctx, lhs, rhs):
 @type_rule
 def ptrDiffRule(ctx, lhs, rhs):
     if lhs == rhs and isinstance(rhs, PtrType):
-        return IntType()
+        return INT
     return f"two pointers of the same type, got {lhs} and {rhs}"
 
 
@@ -183,20 +278,21 @@ def addrofRule(ctx, ty):
 def eqRule(ctx, lhs, rhs):
     if lhs != rhs:
         return f"cannot equate or compare {lhs} to {rhs}"
-    if lhs != IntType() and not isinstance(lhs, PtrType):
+    if lhs != INT and not isinstance(lhs, PtrType):
         return f"expected integer or pointer types, found {lhs}"
-    return IntType()
+    return INT
 
 
 @type_rule
 def relRule(ctx, lhs, rhs):
-    if lhs != IntType():
+    if lhs != INT:
         return f"int expected as relop lhs, found {lhs}"
-    if rhs != IntType():
+    if rhs != INT:
         return f"int expected as relop rhs, found {rhs}"
-    return IntType()
+    return INT
 
 
+@memoized
 @type_rule
 def asgnRule(ctx, lhs, rhs):
     if lhs != rhs:
@@ -206,24 +302,27 @@ def asgnRule(ctx, lhs, rhs):
     return lhs
 
 
+@memoized
 @type_rule
 def retRule(ctx, funcRetTy, ty):
     if funcRetTy != ty:
         return f"return {funcRetTy} expected, {ty} found"
-    return VoidType()
+    return VOID
 
 
+@memoized
 @type_rule
 def stmtCondRule(ctx, ty):
-    if ty != IntType():
+    if ty != INT:
         return f"integer expected, {ty} found"
-    return VoidType()
+    return VOID
 
 
+@memoized
 @type_rule
 def arrayRule(ctx, arr, idx):
     if not isinstance(arr, ArrayType) and not isinstance(arr, PtrType):
         return f"array/pointer expected, {arr} found"
-    if idx != IntType():
+    if idx != INT:
         return f"index must be an integer, {idx} found"
     return arr.base